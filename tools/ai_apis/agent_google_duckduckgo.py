@@ -12,6 +12,7 @@ from langchain.chat_models import ChatOpenAI
 from retry import retry
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
+from http_client import get_session, close_session
 
 load_dotenv()
 
@@ -25,12 +26,8 @@ class SearchAgent:
     def __init__(self, engine_name: str, api_key: str = None):
         self.engine_name = engine_name
         self.api_key = api_key or os.getenv(f"{engine_name.upper()}_API_KEY")
-        self.session = aiohttp.ClientSession()
         self.logger = logging.getLogger(f"{self.engine_name}Agent")
         
-    async def close(self):
-        await self.session.close()
-
     @retry(tries=3, delay=2, backoff=2, logger=None)
     async def search_media(
         self,
@@ -43,7 +40,8 @@ class SearchAgent:
         """Search media with error handling and retry logic"""
         try:
             params = self._build_search_params(query, media_type, orientation, size, limit)
-            async with self.session.get(self._build_url(), params=params) as response:
+            session = await get_session()
+            async with session.get(self._build_url(), params=params) as response:
                 response.raise_for_status()
                 return await self._parse_results(await response.json())
         except aiohttp.ClientError as e:
@@ -107,16 +105,16 @@ class DuckDuckGoSearchAgent(SearchAgent):
 async def download_media(url: str, save_dir: str = "downloads", timeout: int = 10):
     """Async media downloader with error handling"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=timeout) as response:
-                response.raise_for_status()
-                content = await response.read()
-                
-                os.makedirs(save_dir, exist_ok=True)
-                filename = os.path.join(save_dir, url.split("/")[-1].split("?")[0])
-                with open(filename, "wb") as f:
-                    f.write(content)
-                return filename
+        session = await get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            content = await response.read()
+            
+            os.makedirs(save_dir, exist_ok=True)
+            filename = os.path.join(save_dir, url.split("/")[-1].split("?")[0])
+            with open(filename, "wb") as f:
+                f.write(content)
+            return filename
     except Exception as e:
         logging.error(f"Download failed for {url}: {str(e)}")
         return None
@@ -201,8 +199,8 @@ async def main():
         agent_executor.run("Find high-resolution portrait images of historic architecture")
         
     finally:
-        # Cleanup
-        await asyncio.gather(*[agent.close() for agent in agents])
+        # Cleanup: agents borrow the shared session, closing it releases their connections
+        await close_session()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
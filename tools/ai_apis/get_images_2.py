@@ -1,15 +1,23 @@
 import asyncio
-import aiohttp
 import logging
 import uuid
-import hashlib
 from pathlib import Path
-from typing import List, Optional, Dict, Set
-from PIL import Image
-import io, os
+from typing import List, Optional
+import os
+import sys
 
 from dotenv import load_dotenv
 
+# Run from ai_apis/: tools modules import each other by bare name
+TOOLS_DIR = str(Path(__file__).resolve().parent.parent)
+if TOOLS_DIR not in sys.path:
+    sys.path.append(TOOLS_DIR)
+
+from phash_index import PHashIndex, max_distance_for
+from image_resize import render_variants_async
+from image_providers import ProviderRegistry, create_provider
+from http_client import close_session
+
 load_dotenv()
 
 # Configure logging
@@ -63,213 +71,112 @@ async def search_and_download_images(
         download_folder.mkdir(parents=True, exist_ok=True)
         target_platforms = target_platforms or []
         
-        # Load existing hashes
-        hash_file = download_folder / "downloaded_hashes.txt"
-        existing_hashes = await _load_existing_hashes(hash_file)
-
-        async with aiohttp.ClientSession() as session:
-            # Search parameters with exact match handling
-            search_params = {
-                "exact_match": exact_match,
-                "orientation": "landscape" if exact_match else None
-            }
-
-            # Gather image URLs from APIs
-            search_tasks = []
-            if unsplash_key:
-                search_tasks.append(_search_unsplash(session, query, per_api_count, unsplash_key, **search_params))
-            if pexels_key:
-                search_tasks.append(_search_pexels(session, query, per_api_count, pexels_key, **search_params))
-            if pixabay_key:
-                search_tasks.append(_search_pixabay(session, query, per_api_count, pixabay_key, **search_params))
-
-            search_results = await asyncio.gather(*search_tasks)
-            all_urls = list(set([url for sublist in search_results for url in sublist]))
-
-            # Download images with advanced checks
-            semaphore = asyncio.Semaphore(max_concurrent_downloads)
-            download_tasks = [
-                _download_image(
-                    session, url, download_folder, semaphore,
-                    existing_hashes, hash_file, target_platforms,
-                    similarity_threshold
-                )
-                for url in all_urls
-            ]
-            await asyncio.gather(*download_tasks)
+        # Shared perceptual hash index (all users and providers)
+        hash_index = PHashIndex()
+        max_distance = max_distance_for(similarity_threshold, hash_index.bits)
+
+        registry = ProviderRegistry(
+            [
+                create_provider("unsplash", api_key=unsplash_key or "", variant="regular"),
+                create_provider("pexels", api_key=pexels_key or ""),
+                create_provider("pixabay", api_key=pixabay_key or ""),
+            ],
+            max_concurrent_downloads=max_concurrent_downloads,
+        )
+
+        # Search parameters with exact match handling
+        search_params = {
+            "exact_match": exact_match,
+            "orientation": "landscape" if exact_match else None
+        }
+
+        # Gather image URLs from APIs
+        all_images = await registry.search(query, count=per_api_count, **search_params)
+
+        async def keep_new(result, blob_path: Path) -> bool:
+            return await _is_new_image(result.url, blob_path, hash_index, max_distance)
+
+        # Duplicates are caught on the stored blob, before any view is linked
+        downloaded = await registry.download(all_images, download_folder, keep=keep_new)
+
+        # Resizing on the saved files; identical bytes share one path
+        unique_paths = {path for _, path in downloaded}
+        await asyncio.gather(*(
+            _process_download(path, download_folder, target_platforms)
+            for path in unique_paths
+        ))
+        logging.info(f"Provider stats: {registry.stats()}")
 
     except Exception as e:
         logging.error(f"Critical operation failed: {str(e)}")
         raise ImageDownloaderError(f"Image download operation failed: {str(e)}") from e
 
-async def _search_unsplash(session: aiohttp.ClientSession, query: str, count: int, 
-                         api_key: str, exact_match: bool, **kwargs) -> List[str]:
-    """Search Unsplash API with exact match handling"""
+async def _is_new_image(url: str, blob_path: Path, hash_index: PHashIndex, max_distance: int) -> bool:
+    """Record the image's perceptual hash, False when a similar one is already indexed"""
     try:
-        processed_query = f'"{query}"' if exact_match else query
-        url = "https://api.unsplash.com/search/photos"
-        params = {
-            "query": processed_query,
-            "per_page": count,
-            "client_id": api_key,
-            "orientation": kwargs.get("orientation")
-        }
-
-        async with session.get(url, params=params) as response:
-            response.raise_for_status()
-            data = await response.json()
-            return [item["urls"]["regular"] for item in data["results"]]
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, blob_path.read_bytes)
 
-    except aiohttp.ClientError as e:
-        logging.warning(f"Unsplash API request failed: {str(e)}")
-        return []
+        # Calculate perceptual hash
+        image_hash = await _calculate_phash(content, hash_index)
 
-async def _search_pexels(session: aiohttp.ClientSession, query: str, count: int,
-                       api_key: str, exact_match: bool, **kwargs) -> List[str]:
-    """Search Pexels API with exact match handling"""
-    try:
-        processed_query = f'"{query}"' if exact_match else query
-        url = "https://api.pexels.com/v1/search"
-        headers = {"Authorization": api_key}
-        params = {
-            "query": processed_query,
-            "per_page": count,
-            "orientation": kwargs.get("orientation")
-        }
+        # Check for similar hashes and record this one in a single step
+        if image_hash is not None:
+            is_new = await loop.run_in_executor(
+                None, hash_index.add_if_new, image_hash, max_distance, "get_images_2", url)
+            if not is_new:
+                logging.info(f"Skipping duplicate image: {url}")
+                return False
 
-        async with session.get(url, headers=headers, params=params) as response:
-            response.raise_for_status()
-            data = await response.json()
-            return [photo["src"]["original"] for photo in data.get("photos", [])]
-
-    except aiohttp.ClientError as e:
-        logging.warning(f"Pexels API request failed: {str(e)}")
-        return []
+    except Exception as e:
+        logging.warning(f"Error checking {url} for duplicates: {str(e)}")
+    return True
 
-async def _search_pixabay(session: aiohttp.ClientSession, query: str, count: int,
-                        api_key: str, exact_match: bool, **kwargs) -> List[str]:
-    """Search Pixabay API with exact match handling"""
+async def _process_download(path: Path, download_folder: Path, target_platforms: List[str]) -> None:
+    """Resizing for one downloaded image"""
     try:
-        processed_query = f'"{query}"' if exact_match else query
-        url = "https://pixabay.com/api/"
-        params = {
-            "key": api_key,
-            "q": processed_query,
-            "per_page": count,
-            "image_type": "photo",
-            "orientation": kwargs.get("orientation")
-        }
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, path.read_bytes)
 
-        async with session.get(url, params=params) as response:
-            response.raise_for_status()
-            data = await response.json()
-            return [item["webformatURL"] for item in data.get("hits", [])]
-
-    except aiohttp.ClientError as e:
-        logging.warning(f"Pixabay API request failed: {str(e)}")
-        return []
-
-async def _download_image(session: aiohttp.ClientSession, url: str, download_folder: Path,
-                        semaphore: asyncio.Semaphore, existing_hashes: Set[str],
-                        hash_file: Path, target_platforms: List[str],
-                        similarity_threshold: float) -> None:
-    """Enhanced download handler with duplicate checking and resizing"""
-    async with semaphore:
-        try:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                content = await response.read()
-                
-                # Calculate perceptual hash
-                image_hash = await _calculate_phash(content)
-                
-                # Check for similar hashes
-                if any(_hash_similarity(image_hash, existing_hash) >= similarity_threshold
-                      for existing_hash in existing_hashes):
-                    logging.info(f"Skipping duplicate image: {url}")
-                    return
-
-                # Save original image
-                file_name = download_folder / f"{uuid.uuid4().hex}.jpg"
-                loop = asyncio.get_running_loop()
-                await loop.run_in_executor(None, lambda: file_name.write_bytes(content))
-                
-                # Add hash to existing set and save
-                existing_hashes.add(image_hash)
-                await _save_hash(hash_file, image_hash)
-
-                # Process platform-specific sizes
-                await _process_platform_sizes(content, download_folder, target_platforms)
-
-                logging.info(f"Successfully processed: {file_name}")
+        # Process platform-specific sizes
+        await _process_platform_sizes(content, download_folder, target_platforms)
 
-        except Exception as e:
-            logging.warning(f"Error processing {url}: {str(e)}")
+        logging.info(f"Successfully processed: {path}")
+
+    except Exception as e:
+        logging.warning(f"Error processing {path}: {str(e)}")
 
-async def _calculate_phash(content: bytes) -> str:
-    """Calculate perceptual hash for duplicate detection"""
+async def _calculate_phash(content: bytes, hash_index: PHashIndex) -> Optional[int]:
+    """Calculate the DCT perceptual hash, as wide as the index stores, for duplicate detection"""
     def _phash():
         try:
-            image = Image.open(io.BytesIO(content))
-            image = image.convert("L").resize((32, 32), Image.LANCZOS)
-            pixels = list(image.getdata())
-            avg = sum(pixels) / len(pixels)
-            return ''.join(['1' if pixel > avg else '0' for pixel in pixels])
+            return hash_index.hash(content)
         except Exception as e:
             logging.warning(f"Hash calculation failed: {str(e)}")
-            return ""
+            return None
     
     loop = asyncio.get_running_loop()
     return await loop.run_in_executor(None, _phash)
 
-def _hash_similarity(hash1: str, hash2: str) -> float:
-    """Calculate similarity between two hashes"""
-    if len(hash1) != len(hash2) or not hash1:
-        return 0.0
-    return sum(1 for a, b in zip(hash1, hash2) if a == b) / len(hash1)
-
 async def _process_platform_sizes(content: bytes, base_folder: Path, platforms: List[str]) -> None:
-    """Resize image for target platforms"""
-    def _resize():
-        try:
-            original_image = Image.open(io.BytesIO(content))
-            for platform in platforms:
-                size = TARGET_SIZE.get(platform)
-                if not size:
-                    continue
-                
-                # Create platform folder
-                platform_folder = base_folder / platform
-                platform_folder.mkdir(exist_ok=True)
-                
-                # Resize and save
-                resized = original_image.resize(size, Image.LANCZOS)
-                resized_path = platform_folder / f"{uuid.uuid4().hex}.jpg"
-                resized.save(resized_path, "JPEG", quality=85)
-        except Exception as e:
-            logging.warning(f"Resizing failed: {str(e)}")
-    
-    if platforms:
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, _resize)
-
-async def _load_existing_hashes(hash_file: Path) -> Set[str]:
-    """Load existing hashes from file"""
+    """Cover-crop the image for target platforms, decoding it only once"""
+    sizes = {platform: TARGET_SIZE[platform] for platform in platforms if platform in TARGET_SIZE}
+    if not sizes:
+        return
     try:
-        if hash_file.exists():
-            return set(hash_file.read_text().splitlines())
-        return set()
+        variants = await render_variants_async(content, sizes)
     except Exception as e:
-        logging.warning(f"Hash loading failed: {str(e)}")
-        return set()
+        logging.warning(f"Resizing failed: {str(e)}")
+        return
 
-async def _save_hash(hash_file: Path, image_hash: str) -> None:
-    """Append new hash to file"""
-    try:
-        with open(hash_file, 'a') as f:
-            f.write(f"{image_hash}\n")
-    except Exception as e:
-        logging.warning(f"Hash saving failed: {str(e)}")
+    def _save():
+        for platform, data in variants.items():
+            platform_folder = base_folder / platform
+            platform_folder.mkdir(exist_ok=True)
+            (platform_folder / f"{uuid.uuid4().hex}.jpg").write_bytes(data)
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _save)
 
 # Example usage
 if __name__ == "__main__":
@@ -287,5 +194,7 @@ if __name__ == "__main__":
             )
         except ImageDownloaderError as e:
             logging.error(f"Image download process failed: {str(e)}")
+        finally:
+            await close_session()
 
     asyncio.run(main())
\ No newline at end of file
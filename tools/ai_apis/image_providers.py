@@ -0,0 +1,592 @@
+"""
+Image provider registry: one search/download path for every stock-photo API
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+import aiohttp
+from dotenv import load_dotenv
+
+# Same module names the rest of tools uses, so searches and downloads share one session
+from http_client import get_session
+from download_scheduler import DownloadScheduler, parse_retry_after
+from http_cache import CachedDownloader
+from image_probe import ImageRejected, ImageRequirements
+from rate_limits import RateLimited, RateLimiter, get_rate_limiter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderError(Exception):
+    """Base class for provider failures"""
+    pass
+
+
+class QuotaExceeded(ProviderError):
+    """Raised when a provider's request budget is used up for longer than we wait"""
+    pass
+
+
+@dataclass(frozen=True)
+class ImageResult:
+    """A search hit normalised across providers. Width/height are 0 when unknown."""
+    url: str
+    width: int
+    height: int
+    provider: str
+    license: str = ""
+    page_url: str = ""
+    title: str = ""
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+
+@dataclass
+class ProviderStats:
+    requests: int = 0
+    results: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "results": self.results,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def _clean_params(params: Dict) -> Dict[str, str]:
+    """Drop unset values and flatten lists, aiohttp accepts neither."""
+    cleaned = {}
+    for key, value in params.items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ",".join(str(v) for v in value)
+        elif isinstance(value, bool):
+            value = str(value).lower()
+        cleaned[key] = str(value)
+    return cleaned
+
+
+# ------------------------------
+# Provider interface
+# ------------------------------
+
+class ImageProvider:
+    """Base class for image search APIs.
+
+    Subclasses set `name`, `endpoint` and the default quota, and implement
+    `_request` / `_parse`. `endpoint` can be overridden per instance, which
+    is how the benchmark points providers at local stub servers.
+
+    Several API keys may be given (a list, or comma separated in the env
+    variable). Calls are paced per key by the RateLimiter, which follows the
+    X-Ratelimit headers and rotates to another key when one runs dry. The
+    class quota is only the starting budget until the server reports one.
+    """
+    name = ""
+    endpoint = ""
+    license = ""
+    api_key_env = ""
+    max_per_page = 30
+    quota_requests = 50
+    quota_period = 3600.0
+
+    def __init__(
+        self,
+        api_key: Union[str, List[str], None] = None,
+        endpoint: Optional[str] = None,
+        limiter: Optional[RateLimiter] = None,
+        quota: Optional[Tuple[int, float]] = None,
+        **defaults,
+    ):
+        if api_key is None:
+            api_key = os.getenv(self.api_key_env, "")
+        if isinstance(api_key, str):
+            api_key = api_key.split(",")
+        self.api_keys = [key.strip() for key in api_key if key and key.strip()]
+        self.endpoint = endpoint or self.endpoint
+        self.limiter = limiter or get_rate_limiter()
+        if quota is not None:
+            self.quota_requests, self.quota_period = quota
+        self.defaults = defaults
+        self.stats = ProviderStats()
+
+    @property
+    def api_key(self) -> str:
+        return self.api_keys[0] if self.api_keys else ""
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_keys)
+
+    def _request(self, query: str, count: int, options: Dict, api_key: str) -> Tuple[Dict[str, str], Dict]:
+        """Return (headers, params) for one search call made with `api_key`."""
+        raise NotImplementedError("Provider must implement _request()")
+
+    def _parse(self, data: Dict, options: Dict) -> List[ImageResult]:
+        raise NotImplementedError("Provider must implement _parse()")
+
+    async def search(self, query: str, count: int = 30, **options) -> List[ImageResult]:
+        """Run one search call and return normalised results.
+
+        A `per_page` option overrides `count`, matching the providers' own naming.
+        """
+        options = {**self.defaults, **options}
+        count = int(options.pop("per_page", count))
+        if not self.api_keys:
+            raise ProviderError(f"No API key configured for {self.name} (set {self.api_key_env})")
+        session = await get_session()
+
+        # One retry per key, plus one for a short Retry-After on a single key
+        for _ in range(len(self.api_keys) + 1):
+            try:
+                api_key = await self.limiter.acquire(
+                    self.name, self.api_keys, self.quota_requests, self.quota_period)
+            except RateLimited as e:
+                raise QuotaExceeded(str(e)) from e
+            headers, params = self._request(query, min(count, self.max_per_page), options, api_key)
+            started = time.monotonic()
+            self.stats.requests += 1
+            try:
+                async with session.get(self.endpoint, headers=headers, params=_clean_params(params)) as response:
+                    if response.status == 429:
+                        self.limiter.exhaust(
+                            self.name, api_key, response.headers,
+                            parse_retry_after(response.headers.get("Retry-After")))
+                        continue
+                    self.limiter.observe(self.name, api_key, response.headers)
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+                results = self._parse(data, options)[:count]
+            except KeyError as e:
+                raise ProviderError(f"Unexpected response format from {self.name} API: {str(e)}") from e
+            finally:
+                self.stats.seconds += time.monotonic() - started
+            self.stats.results += len(results)
+            return results
+        raise QuotaExceeded(f"{self.name} API rate limit exceeded on every key")
+
+
+PROVIDERS: Dict[str, Type[ImageProvider]] = {}
+
+
+def register_provider(cls: Type[ImageProvider]) -> Type[ImageProvider]:
+    """Class decorator adding a provider to the registry under `cls.name`."""
+    PROVIDERS[cls.name] = cls
+    return cls
+
+
+def create_provider(name: str, **kwargs) -> ImageProvider:
+    if name not in PROVIDERS:
+        raise ProviderError(f"Unknown image provider: {name}")
+    return PROVIDERS[name](**kwargs)
+
+
+# ------------------------------
+# Providers
+# ------------------------------
+
+@register_provider
+class UnsplashProvider(ImageProvider):
+    name = "unsplash"
+    endpoint = "https://api.unsplash.com/search/photos"
+    license = "Unsplash License"
+    api_key_env = "UNSPLASH_API_KEY"
+    max_per_page = 30
+    quota_requests = 50  # demo applications
+
+    def _request(self, query, count, options, api_key):
+        query = f'"{query}"' if options.get("exact_match") else query
+        return {}, {
+            "query": query,
+            "per_page": count,
+            "page": options.get("page", 1),
+            "orientation": options.get("orientation"),
+            "client_id": api_key,
+        }
+
+    def _parse(self, data, options):
+        # "raw" keeps the original dimensions, the sized variants do not
+        variant = options.get("variant", "raw")
+        exact = variant == "raw"
+        return [
+            ImageResult(
+                url=item["urls"][variant],
+                width=item["width"] if exact else 0,
+                height=item["height"] if exact else 0,
+                provider=self.name,
+                license=self.license,
+                page_url=item.get("links", {}).get("html", ""),
+                title=item.get("alt_description") or "",
+            )
+            for item in data["results"]
+        ]
+
+
+@register_provider
+class PexelsProvider(ImageProvider):
+    name = "pexels"
+    endpoint = "https://api.pexels.com/v1/search"
+    license = "Pexels License"
+    api_key_env = "PEXELS_API_KEY"
+    max_per_page = 80
+    quota_requests = 200
+
+    def _request(self, query, count, options, api_key):
+        query = f'"{query}"' if options.get("exact_match") else query
+        return {"Authorization": api_key}, {
+            "query": query,
+            "per_page": count,
+            "page": options.get("page", 1),
+            "orientation": options.get("orientation"),
+            "size": options.get("size"),
+            "color": options.get("color"),
+            "locale": options.get("locale"),
+        }
+
+    def _parse(self, data, options):
+        variant = options.get("variant", "original")
+        exact = variant == "original"
+        return [
+            ImageResult(
+                url=photo["src"][variant],
+                width=photo["width"] if exact else 0,
+                height=photo["height"] if exact else 0,
+                provider=self.name,
+                license=self.license,
+                page_url=photo.get("url", ""),
+                title=photo.get("alt") or "",
+            )
+            for photo in data.get("photos", [])
+        ]
+
+
+@register_provider
+class PixabayProvider(ImageProvider):
+    name = "pixabay"
+    endpoint = "https://pixabay.com/api/"
+    license = "Pixabay Content License"
+    api_key_env = "PIXABAY_API_KEY"
+    max_per_page = 200
+    quota_requests = 100
+    quota_period = 60.0
+
+    # url field -> (width field, height field) of that rendition
+    VARIANTS = {
+        "webformatURL": ("webformatWidth", "webformatHeight"),
+        "largeImageURL": (None, None),
+        "imageURL": ("imageWidth", "imageHeight"),
+    }
+
+    def _request(self, query, count, options, api_key):
+        query = f'"{query}"' if options.get("exact_match") else query
+        params = {
+            "key": api_key,
+            "q": query,
+            # Pixabay rejects per_page below 3
+            "per_page": max(3, count),
+            "page": options.get("page", 1),
+            "image_type": options.get("image_type", "photo"),
+            "orientation": {"landscape": "horizontal", "portrait": "vertical"}.get(
+                options.get("orientation"), options.get("orientation")),
+        }
+        for key in ("category", "min_width", "min_height", "colors", "editors_choice",
+                    "safesearch", "order", "lang"):
+            params[key] = options.get(key)
+        return {}, params
+
+    def _parse(self, data, options):
+        variant = options.get("variant", "webformatURL")
+        width_key, height_key = self.VARIANTS.get(variant, (None, None))
+        return [
+            ImageResult(
+                url=item[variant],
+                width=item[width_key] if width_key else 0,
+                height=item[height_key] if height_key else 0,
+                provider=self.name,
+                license=self.license,
+                page_url=item.get("pageURL", ""),
+                title=item.get("tags", ""),
+            )
+            for item in data.get("hits", [])
+        ]
+
+
+@register_provider
+class GoogleImageProvider(ImageProvider):
+    """Google Programmable Search, image mode. Needs an API key and engine id (cx)."""
+    name = "google"
+    endpoint = "https://www.googleapis.com/customsearch/v1"
+    api_key_env = "GOOGLE_API_SEARCH_ENGINE"
+    max_per_page = 10
+    quota_requests = 100
+    quota_period = 86400.0
+
+    def __init__(self, api_key: Union[str, List[str], None] = None, search_engine: Optional[str] = None, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.search_engine = search_engine or os.getenv("GOOGLE_SEARCH_ENGINE")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key and self.search_engine)
+
+    def _request(self, query, count, options, api_key):
+        return {}, {
+            "key": api_key,
+            "cx": self.search_engine,
+            "q": query,
+            "searchType": "image",
+            "num": count,
+            "start": (options.get("page", 1) - 1) * self.max_per_page + 1,
+            "imgSize": options.get("size"),
+            "rights": options.get("rights"),
+        }
+
+    def _parse(self, data, options):
+        return [
+            ImageResult(
+                url=item["link"],
+                width=int(item.get("image", {}).get("width", 0)),
+                height=int(item.get("image", {}).get("height", 0)),
+                provider=self.name,
+                page_url=item.get("image", {}).get("contextLink", ""),
+                title=item.get("title", ""),
+            )
+            for item in data.get("items", [])
+        ]
+
+
+# ------------------------------
+# Merging and filtering
+# ------------------------------
+
+def merge_results(result_lists: Iterable[List[ImageResult]], limit: Optional[int] = None) -> List[ImageResult]:
+    """Interleave provider lists round-robin, dropping repeated URLs.
+
+    Round-robin keeps every provider represented when `limit` cuts the list.
+    """
+    merged: List[ImageResult] = []
+    seen = set()
+    queues = [deque(results) for results in result_lists]
+    while any(queues):
+        for queue in queues:
+            if not queue:
+                continue
+            result = queue.popleft()
+            if result.url in seen:
+                continue
+            seen.add(result.url)
+            merged.append(result)
+            if limit is not None and len(merged) >= limit:
+                return merged
+    return merged
+
+
+def match_target_sizes(
+    results: Iterable[ImageResult], target_sizes: Dict[str, Tuple[int, int]]
+) -> List[Tuple[ImageResult, str]]:
+    """Pair each result whose reported size equals a target with that platform."""
+    matched = []
+    for result in results:
+        for platform, size in target_sizes.items():
+            if result.size == tuple(size):
+                matched.append((result, platform))
+                break
+    return matched
+
+
+# ------------------------------
+# Registry
+# ------------------------------
+
+class ProviderRegistry:
+    """Fans a query out to several providers and downloads through one scheduler.
+
+    Downloads go through the shared CachedDownloader, so the connection pool,
+    per-host limits, retries, header probe and blob store are the same for
+    every provider.
+    """
+
+    def __init__(
+        self,
+        providers: Iterable[ImageProvider],
+        max_concurrent_downloads: int = 10,
+        per_host_limit: int = 4,
+        downloader: Optional[CachedDownloader] = None,
+    ):
+        self.providers = [provider for provider in providers if provider.enabled]
+        self.downloader = downloader or CachedDownloader(
+            DownloadScheduler(max_concurrency=max_concurrent_downloads, per_host_limit=per_host_limit))
+
+    @classmethod
+    def from_names(cls, names: Iterable[str], api_keys: Optional[Dict[str, Optional[str]]] = None, **kwargs):
+        """Build from provider names; `api_keys` overrides the environment per provider."""
+        api_keys = api_keys or {}
+        return cls([create_provider(name, api_key=api_keys.get(name)) for name in names], **kwargs)
+
+    async def _search_one(self, provider: ImageProvider, query: str, count: int, options: Dict) -> List[ImageResult]:
+        try:
+            results = await provider.search(query, count, **options)
+            logger.info(f"Received {len(results)} results from {provider.name.capitalize()} API")
+            return results
+        except (ProviderError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            provider.stats.errors += 1
+            logger.warning(f"{provider.name.capitalize()} API request failed: {str(e)}")
+            return []
+
+    async def search(
+        self,
+        query: str,
+        count: int = 30,
+        limit: Optional[int] = None,
+        options: Optional[Dict[str, Dict]] = None,
+        **common_options,
+    ) -> List[ImageResult]:
+        """Query every enabled provider concurrently and merge the results.
+
+        `options` holds per-provider overrides keyed by provider name, on top
+        of `common_options` shared by all of them.
+        """
+        options = options or {}
+        result_lists = await asyncio.gather(*(
+            self._search_one(provider, query, count, {**common_options, **options.get(provider.name, {})})
+            for provider in self.providers
+        ))
+        return merge_results(result_lists, limit)
+
+    async def download(
+        self,
+        results: Iterable[ImageResult],
+        download_folder: Union[str, Path],
+        folder_for: Optional[Callable[[ImageResult], str]] = None,
+        requirements: Optional[ImageRequirements] = None,
+        keep: Optional[Callable[[ImageResult, Path], Awaitable[bool]]] = None,
+    ) -> List[Tuple[ImageResult, Path]]:
+        """Download results into `download_folder` (or a sub folder per result).
+
+        Files are named after their content hash; failures are logged and skipped.
+        `keep` is given each stored blob before it is linked into the folder;
+        returning False skips the result, so rejected files never get a view.
+        """
+        download_folder = Path(download_folder)
+        requirements = requirements or ImageRequirements()
+
+        async def fetch(result: ImageResult) -> Optional[Tuple[ImageResult, Path]]:
+            target = download_folder / folder_for(result) if folder_for else download_folder
+            try:
+                downloaded = await self.downloader.download(result.url, requirements=requirements)
+                if keep is not None and not await keep(result, downloaded.path):
+                    logger.info(f"Skipped {result.url}: not kept")
+                    return None
+                path = self.downloader.blob_store.link_into(downloaded.path, target)
+                logger.info(f"Downloaded from {result.provider}: {path}")
+                return result, path
+            except ImageRejected as e:
+                logger.info(f"Skipped {result.url}: {str(e)}")
+            except Exception as e:
+                logger.warning(f"Error downloading from {result.provider} ({result.url}): {str(e)}")
+            return None
+
+        downloaded = await asyncio.gather(*(fetch(result) for result in results))
+        return [item for item in downloaded if item is not None]
+
+    def stats(self) -> Dict[str, Dict]:
+        limiters = {id(provider.limiter): provider.limiter for provider in self.providers}
+        return {
+            "providers": {provider.name: provider.stats.snapshot() for provider in self.providers},
+            "quotas": {name: quota for limiter in limiters.values() for name, quota in limiter.snapshot().items()},
+            "downloads": self.downloader.scheduler.metrics.snapshot(),
+        }
+
+
+# ------------------------------
+# Stub-server benchmark
+# ------------------------------
+
+async def benchmark_providers(
+    providers: Iterable[ImageProvider], query: str = "benchmark", rounds: int = 3, count: int = 10
+) -> Dict[str, float]:
+    """Time sequential per-provider search against the registry's fan-out."""
+    providers = list(providers)
+    registry = ProviderRegistry(providers)
+
+    started = time.monotonic()
+    for _ in range(rounds):
+        for provider in registry.providers:
+            await provider.search(query, count)
+    sequential = (time.monotonic() - started) / rounds
+
+    started = time.monotonic()
+    for _ in range(rounds):
+        await registry.search(query, count)
+    fan_out = (time.monotonic() - started) / rounds
+
+    timings = {"sequential": sequential, "fan_out": fan_out}
+    timings.update({provider.name: provider.stats.seconds / (2 * rounds) for provider in registry.providers})
+    return timings
+
+
+if __name__ == "__main__":
+    from aiohttp import web
+    from http_client import close_session
+
+    STUB_LATENCY = {"unsplash": 0.15, "pexels": 0.10, "pixabay": 0.20, "google": 0.25}
+
+    def _stub_payload(name: str, base: str, count: int) -> Dict:
+        images = [(f"{base}/img/{name}/{i}.jpg", 1920, 1080) for i in range(count)]
+        if name == "unsplash":
+            return {"results": [{"urls": {"raw": u, "regular": u}, "width": w, "height": h} for u, w, h in images]}
+        if name == "pexels":
+            return {"photos": [{"src": {"original": u}, "width": w, "height": h} for u, w, h in images]}
+        if name == "pixabay":
+            return {"hits": [{"webformatURL": u, "webformatWidth": w, "webformatHeight": h} for u, w, h in images]}
+        return {"items": [{"link": u, "image": {"width": w, "height": h}} for u, w, h in images]}
+
+    async def main():
+        async def handler(request: web.Request) -> web.Response:
+            name = request.match_info["provider"]
+            await asyncio.sleep(STUB_LATENCY[name])
+            count = int(request.query.get("per_page") or request.query.get("num") or 10)
+            return web.json_response(_stub_payload(name, f"http://{request.host}", count))
+
+        app = web.Application()
+        app.router.add_get("/{provider}/search", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        # In-memory limiter so the benchmark never touches the real quota store
+        limiter = RateLimiter(store=None)
+        try:
+            providers = [
+                create_provider(name, api_key="stub", endpoint=f"http://127.0.0.1:{port}/{name}/search",
+                                limiter=limiter, quota=(1000, 1.0))
+                for name in ("unsplash", "pexels", "pixabay")
+            ]
+            providers.append(GoogleImageProvider(
+                api_key="stub", search_engine="stub", endpoint=f"http://127.0.0.1:{port}/google/search",
+                limiter=limiter, quota=(1000, 1.0)))
+            timings = await benchmark_providers(providers)
+            for name, seconds in timings.items():
+                print(f"{name:>12}: {seconds * 1000:8.1f} ms")
+        finally:
+            await close_session()
+            await runner.cleanup()
+
+    asyncio.run(main())
@@ -0,0 +1,260 @@
+"""
+Per-key rate limiting for image provider APIs, driven by X-Ratelimit headers
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+QUOTA_STORE_PATH = Path(os.getenv("QUOTA_STORE_PATH", BASE_DIR.joinpath("media", "provider_quotas.sqlite3")))
+# Requests allowed back to back before pacing kicks in
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+# Longest we queue a request for a free slot before giving up on the provider
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+
+# Above this a reset header is a UNIX timestamp (Pexels), below it seconds to go (Pixabay)
+_EPOCH_THRESHOLD = 10 ** 9
+
+
+class RateLimited(Exception):
+    """Every key of a provider is exhausted for longer than the caller will wait"""
+
+    def __init__(self, provider: str, wait: float):
+        super().__init__(f"{provider} quota exhausted, next slot in {wait:.0f}s")
+        self.provider = provider
+        self.wait = wait
+
+
+def key_id(api_key: str) -> str:
+    """Stable identifier for a key, so raw keys never reach the database or logs."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str], now: Optional[float] = None) -> Optional[Tuple[int, int, Optional[float]]]:
+    """Return `(limit, remaining, reset_at)` from X-Ratelimit-* headers.
+
+    Header names are matched case-insensitively (Pexels sends X-Ratelimit-*,
+    Pixabay X-RateLimit-*). `reset_at` is an epoch time or None if not sent.
+    """
+    now = time.time() if now is None else now
+    lowered = {name.lower(): value for name, value in headers.items()}
+    try:
+        remaining = int(lowered["x-ratelimit-remaining"])
+        limit = int(lowered.get("x-ratelimit-limit", remaining))
+    except (KeyError, ValueError):
+        return None
+    reset_at = None
+    reset = lowered.get("x-ratelimit-reset")
+    if reset:
+        try:
+            value = float(reset)
+            reset_at = value if value > _EPOCH_THRESHOLD else now + value
+        except ValueError:
+            pass
+    return limit, remaining, reset_at
+
+
+@dataclass
+class KeyState:
+    """Server-reported quota for one key plus a local token bucket for pacing.
+
+    The bucket refills at `remaining / time-to-reset`, so the remaining
+    budget is spread evenly over the window instead of burning it in one burst.
+    """
+    provider: str
+    key_id: str
+    limit: int
+    period: float
+    remaining: int
+    reset_at: float
+    tokens: float
+    updated_at: float
+
+    def _refresh(self, now: float) -> None:
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.period
+        rate = self.remaining / max(self.reset_at - now, 1.0)
+        capacity = min(RATE_LIMIT_BURST, self.remaining)
+        self.tokens = min(capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until this key may send one more request."""
+        self._refresh(now)
+        if self.remaining <= 0:
+            return self.reset_at - now
+        if self.tokens >= 1:
+            return 0.0
+        rate = self.remaining / max(self.reset_at - now, 1.0)
+        return (1 - self.tokens) / rate
+
+    def reserve(self, now: float) -> float:
+        """Take a slot and return how long to wait before using it.
+
+        Tokens may go negative, which queues later callers behind this one.
+        """
+        wait = self.wait_time(now)
+        self.tokens -= 1
+        self.remaining -= 1
+        return max(0.0, wait)
+
+    def observe(self, limit: int, remaining: int, reset_at: Optional[float], now: float) -> None:
+        self._refresh(now)
+        self.limit = limit
+        self.remaining = remaining
+        if reset_at is not None:
+            self.reset_at = reset_at
+        self.tokens = min(self.tokens, remaining)
+
+    def exhaust(self, retry_after: Optional[float], now: float) -> None:
+        """Server said 429: nothing left until Retry-After (or the window end)."""
+        self._refresh(now)
+        self.remaining = 0
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after is not None:
+            self.reset_at = now + retry_after
+        elif self.reset_at <= now:
+            self.reset_at = now + self.period
+
+
+class QuotaStore:
+    """Last known quota per (provider, key) in SQLite, shared by all workers."""
+
+    def __init__(self, path: Union[str, Path] = QUOTA_STORE_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS provider_quotas (
+                provider TEXT NOT NULL,
+                key_id TEXT NOT NULL,
+                quota_limit INTEGER NOT NULL,
+                remaining INTEGER NOT NULL,
+                reset_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (provider, key_id)
+            )""")
+        self._conn.commit()
+
+    def load(self, provider: str, key: str) -> Optional[Tuple[int, int, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT quota_limit, remaining, reset_at FROM provider_quotas
+                   WHERE provider = ? AND key_id = ?""", (provider, key)).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, state: KeyState) -> None:
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO provider_quotas
+                   (provider, key_id, quota_limit, remaining, reset_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (state.provider, state.key_id, state.limit, state.remaining, state.reset_at, time.time()))
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RateLimiter:
+    """Paces requests per API key and rotates between a provider's keys.
+
+    Before a call, `acquire` picks the key that can go soonest, reserves a
+    slot and sleeps for the pacing delay. After the call, `observe` feeds the
+    X-Ratelimit headers back so the bucket follows what the server reports,
+    and `exhaust` parks a key that got a 429. State is written to the store
+    so a restarted worker starts from the last known budget, not a full one.
+    """
+
+    def __init__(self, store: Optional[QuotaStore] = None, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        self.store = store
+        self.max_wait = max_wait
+        self._states: Dict[Tuple[str, str], KeyState] = {}
+
+    def state(self, provider: str, api_key: str, limit: int, period: float) -> KeyState:
+        """State for a key, loaded from the store or started from the default quota."""
+        ident = key_id(api_key)
+        state = self._states.get((provider, ident))
+        if state is not None:
+            return state
+        now = time.time()
+        state = KeyState(provider, ident, limit, period, limit, now + period, float(min(RATE_LIMIT_BURST, limit)), now)
+        saved = self.store.load(provider, ident) if self.store else None
+        if saved is not None and saved[2] > now:
+            state.limit, state.remaining, state.reset_at = saved
+            state.tokens = min(state.tokens, state.remaining)
+        self._states[(provider, ident)] = state
+        return state
+
+    async def acquire(self, provider: str, api_keys: List[str], limit: int, period: float) -> str:
+        """Wait for a slot on the least loaded key and return that key."""
+        if not api_keys:
+            raise ValueError(f"{provider}: no API keys to rate-limit")
+        now = time.time()
+        states = [(self.state(provider, key, limit, period), key) for key in api_keys]
+        state, key = min(states, key=lambda item: item[0].wait_time(now))
+        wait = state.wait_time(now)
+        if wait > self.max_wait:
+            raise RateLimited(provider, wait)
+        wait = state.reserve(now)
+        if wait > 0:
+            logger.info(f"{provider}: pacing request on key {state.key_id} by {wait:.2f}s")
+            await asyncio.sleep(wait)
+        return key
+
+    def observe(self, provider: str, api_key: str, headers: Mapping[str, str]) -> None:
+        parsed = parse_rate_limit_headers(headers)
+        state = self._states.get((provider, key_id(api_key)))
+        if parsed is None or state is None:
+            return
+        state.observe(*parsed, now=time.time())
+        logger.info(f"{provider} API key {state.key_id}: {state.remaining}/{state.limit} requests remaining")
+        if self.store:
+            self.store.save(state)
+
+    def exhaust(self, provider: str, api_key: str, headers: Mapping[str, str], retry_after: Optional[float] = None) -> None:
+        state = self._states.get((provider, key_id(api_key)))
+        if state is None:
+            return
+        now = time.time()
+        parsed = parse_rate_limit_headers(headers, now)
+        if retry_after is None and parsed is not None and parsed[2] is not None:
+            retry_after = parsed[2] - now
+        state.exhaust(retry_after, now)
+        logger.warning(f"{provider} API key {state.key_id} rate limited until {time.ctime(state.reset_at)}")
+        if self.store:
+            self.store.save(state)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        now = time.time()
+        return {
+            f"{state.provider}:{state.key_id}": {
+                "limit": state.limit,
+                "remaining": state.remaining,
+                "reset_in": round(max(0.0, state.reset_at - now), 1),
+            }
+            for state in self._states.values()
+        }
+
+
+_default_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter backed by the persistent quota store"""
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = RateLimiter(QuotaStore())
+    return _default_limiter
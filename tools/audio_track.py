@@ -0,0 +1,146 @@
+"""
+Soundtracks fitted to a video's exact length, encoded once and muxed without re-encoding
+"""
+import hashlib
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR = Path(os.getenv("AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "slideshow_audio")))
+AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "192k")
+AUDIO_FADE_IN = float(os.getenv("AUDIO_FADE_IN", "0"))
+AUDIO_FADE_OUT = float(os.getenv("AUDIO_FADE_OUT", "0"))
+# Prepared tracks kept on disk; the least recently used go first once it's full
+AUDIO_CACHE_MB = int(os.getenv("AUDIO_CACHE_MB", "512"))
+# Tracks used this recently are never evicted, a render may be about to read them
+AUDIO_CACHE_GRACE = float(os.getenv("AUDIO_CACHE_GRACE", "600"))
+
+PARTIAL_SUFFIX = ".partial.m4a"
+
+_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def ffmpeg_binary() -> str:
+    from moviepy.config import FFMPEG_BINARY
+    return FFMPEG_BINARY
+
+
+@lru_cache(maxsize=256)
+def _probe(path: str, mtime_ns: int) -> float:
+    # ffmpeg prints the container duration while failing for lack of an output
+    result = subprocess.run([ffmpeg_binary(), "-hide_banner", "-i", path], capture_output=True, text=True)
+    match = _DURATION.search(result.stderr)
+    if match is None:
+        raise ValueError(f"Can't read the duration of {path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def probe_duration(path: Union[str, os.PathLike]) -> float:
+    """Length of `path` in seconds, probed once per file version."""
+    path = str(path)
+    return _probe(path, os.stat(path).st_mtime_ns)
+
+
+def prepare_audio(
+    source: Union[str, os.PathLike],
+    duration: float,
+    fade_in: float = AUDIO_FADE_IN,
+    fade_out: float = AUDIO_FADE_OUT,
+    cache_dir: Optional[Union[str, os.PathLike]] = None,
+) -> Path:
+    """AAC track of `source` exactly `duration` seconds long, cached on disk.
+
+    Shorter sources loop, longer ones are cut; with `fade_out` the end
+    fades out over that many seconds. The same (source, duration, fades)
+    returns the already encoded file, so renders only ever copy the audio
+    stream.
+    """
+    source = str(source)
+    stat = os.stat(source)
+    cache_dir = Path(cache_dir or AUDIO_CACHE_DIR)
+    digest = hashlib.sha1(
+        f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}|{duration:.3f}|{fade_in}|{fade_out}|{AUDIO_BITRATE}".encode()
+    ).hexdigest()[:20]
+    track = cache_dir / f"{Path(source).stem}_{digest}.m4a"
+    if track.exists():
+        # Mark it as recently used for eviction
+        os.utime(track)
+        return track
+
+    cmd = [ffmpeg_binary(), "-y", "-loglevel", "error"]
+    if probe_duration(source) < duration:
+        cmd += ["-stream_loop", "-1"]
+    cmd += ["-i", source, "-vn", "-t", f"{duration:.3f}"]
+    filters = []
+    if fade_in > 0:
+        filters.append(f"afade=t=in:st=0:d={min(fade_in, duration):.3f}")
+    if fade_out > 0:
+        fade_out = min(fade_out, duration)
+        filters.append(f"afade=t=out:st={duration - fade_out:.3f}:d={fade_out:.3f}")
+    if filters:
+        cmd += ["-af", ",".join(filters)]
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Encode to a unique file next to the final name and rename, so concurrent
+    # renders (threads or processes) never read or write a partial file
+    fd, partial = tempfile.mkstemp(dir=cache_dir, prefix=f"{track.stem}.", suffix=PARTIAL_SUFFIX)
+    os.close(fd)
+    partial = Path(partial)
+    cmd += ["-c:a", "aac", "-b:a", AUDIO_BITRATE, "-movflags", "+faststart", str(partial)]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        os.replace(partial, track)
+    finally:
+        partial.unlink(missing_ok=True)
+    logger.info(f"Prepared {duration:.2f}s audio track {track} from {source}")
+    evict_audio_cache(cache_dir)
+    return track
+
+
+def evict_audio_cache(cache_dir: Optional[Union[str, os.PathLike]] = None, max_mb: int = AUDIO_CACHE_MB) -> int:
+    """Delete the least recently used tracks until the cache fits in `max_mb`.
+
+    Tracks used within AUDIO_CACHE_GRACE seconds are kept even over the
+    limit. Returns how many files were removed.
+    """
+    cache_dir = Path(cache_dir or AUDIO_CACHE_DIR)
+    tracks = []
+    for path in cache_dir.glob("*.m4a"):
+        if path.name.endswith(PARTIAL_SUFFIX):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        tracks.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in tracks)
+    limit = max_mb * 1024 * 1024
+    cutoff = time.time() - AUDIO_CACHE_GRACE
+    removed = 0
+    for mtime, size, path in sorted(tracks):
+        if total <= limit or mtime > cutoff:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"Evicted {removed} audio tracks from {cache_dir}")
+    return removed
+
+
+def mux_audio(video_path: Union[str, os.PathLike], audio_track: Union[str, os.PathLike], output_path: Union[str, os.PathLike]) -> None:
+    """Put `audio_track` next to the video stream of `video_path`, copying both."""
+    subprocess.run([
+        ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-i", str(video_path), "-i", str(audio_track),
+        "-map", "0:v", "-map", "1:a", "-c", "copy", "-shortest",
+        "-movflags", "+faststart", str(output_path),
+    ], check=True, capture_output=True)
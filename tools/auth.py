@@ -0,0 +1,194 @@
+"""
+Password hashing off the event loop and a small cache for cookie -> user lookups
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from executor_pool import LazyExecutor
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor; each +1 doubles the time per hash/verify
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads doing bcrypt work; bcrypt releases the GIL so this bounds CPU use, not Python
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Seconds a resolved cookie stays valid without going back to the database
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Thread pool shared by all password operations, created on first use
+_executor = LazyExecutor(AUTH_WORKERS, ThreadPoolExecutor, thread_name_prefix="auth")
+_dummy_hash: Optional[str] = None
+
+
+get_executor = _executor.get
+shutdown_executor = _executor.shutdown
+
+
+# ------------------------------
+# Hashing
+# ------------------------------
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Check a password and return `(valid, new_hash)`.
+
+    `new_hash` is set when the stored hash uses an outdated scheme or cost,
+    so the caller can upgrade it after a successful login. A missing hash is
+    still checked against a dummy one, keeping unknown users as slow as
+    known ones.
+    """
+    global _dummy_hash
+    if not hashed_password:
+        if _dummy_hash is None:
+            _dummy_hash = pwd_context.hash("")
+        pwd_context.verify(password, _dummy_hash)
+        return False, None
+    try:
+        return pwd_context.verify_and_update(password, hashed_password)
+    except ValueError:
+        # Not a hash passlib recognises
+        return False, None
+
+
+async def hash_password_async(password: str) -> str:
+    """Run `hash_password` in the auth pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), hash_password, password)
+
+
+async def verify_password_async(password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Run `verify_password` in the auth pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), verify_password, password, hashed_password)
+
+
+# ------------------------------
+# Cookie -> user cache
+# ------------------------------
+
+@dataclass(frozen=True)
+class CachedUser:
+    """The parts of a user that requests check: who they are and their role."""
+    id: int
+    permissions: str = ""
+
+    @property
+    def is_admin(self) -> bool:
+        return "admin" in self.permissions.split(",")
+
+
+class UserCache:
+    """TTL cache of `CachedUser` by user id; `invalidate` it when a user changes."""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[float, CachedUser]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: int) -> Optional[CachedUser]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user: CachedUser) -> None:
+        key = user.id
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_size:
+                # Dicts keep insertion order, so the first key is the oldest
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + self.ttl, user)
+
+    def invalidate(self, key: Optional[int] = None) -> None:
+        """Drop one user, or everything when `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(int(key), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache()
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+async def _measure_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Longest delay past `interval` seen by a ticking coroutine."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def benchmark_login_storm(logins: int = 20, rounds: int = BCRYPT_ROUNDS) -> Dict[str, Dict[str, float]]:
+    """Verify `logins` passwords concurrently, inline and through the auth pool.
+
+    Reports wall time and the worst event loop stall for each mode; the
+    stall is what every other request waits on while logins are in flight.
+    """
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hashed = context.hash("secret")
+    loop = asyncio.get_running_loop()
+
+    async def inline_login():
+        context.verify("secret", hashed)
+        await asyncio.sleep(0)
+
+    async def pooled_login():
+        await loop.run_in_executor(get_executor(), context.verify, "secret", hashed)
+
+    results = {}
+    for mode, login in (("inline", inline_login), ("thread_pool", pooled_login)):
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_measure_loop_lag(stop))
+        await asyncio.sleep(0.02)
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        results[mode] = {
+            "seconds": round(elapsed, 3),
+            "max_loop_stall_ms": round(await ticker * 1000, 1),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(json.dumps(asyncio.run(benchmark_login_storm(count)), indent=2))
+    shutdown_executor()
@@ -0,0 +1,205 @@
+"""
+Render many slideshow variants (image set x platform x params) on one process pool
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from frame_pipe import render_frames
+from image_resize import cache_fits, fit_cache
+from segment_render import RENDER_WORKERS, get_process_pool
+from slideshow import EncoderSettings, Size, Slideshow
+
+logger = logging.getLogger(__name__)
+
+PLATFORM_SIZES: Dict[str, Size] = {
+    "youtube_video": (1920, 1080),
+    "youtube_short": (1080, 1920),
+    "instagram_feed": (1080, 1080),
+    "instagram_story": (1080, 1920),
+    "facebook_short": (1200, 630),
+}
+
+
+@dataclass(frozen=True)
+class RenderJob:
+    """One output video: a slideshow spec, where to write it and its audio."""
+    show: Slideshow
+    output_path: str
+    audio_path: Optional[str] = None
+
+    @property
+    def input_key(self) -> Tuple[str, ...]:
+        """Jobs with equal keys decode the same images."""
+        return self.show.images
+
+
+def make_job(
+    images: Sequence[str],
+    platform: Union[str, Size],
+    output_path: Union[str, Path],
+    config=None,
+    audio_path: Optional[str] = None,
+    **options,
+) -> RenderJob:
+    """Job for `images` on `platform` (a PLATFORM_SIZES name or a size).
+
+    `config` is a RenderConfig (or anything with the same duration/zoom
+    attributes); `options` go to Slideshow (fit_mode, overlay, encoder, ...).
+    """
+    size = PLATFORM_SIZES[platform] if isinstance(platform, str) else tuple(platform)
+    if config is not None:
+        options.setdefault("image_duration", config.image_view_duration)
+        options.setdefault("transition_duration", config.transition_duration)
+        options.setdefault("zoom_ratio", config.zoom_ratio)
+    return RenderJob(Slideshow(tuple(images), size, **options), str(output_path), audio_path)
+
+
+def render_jobs(jobs: List[Tuple[int, RenderJob]], threads: Optional[int] = None) -> List[Tuple[int, Dict[str, float]]]:
+    """Render `(position, job)` pairs one after another; runs in a worker process.
+
+    Still images are first decoded once each and fitted to every canvas the
+    bundle needs; the renders then take their slides from the fit cache,
+    which is emptied afterwards so idle pool workers don't hold on to it.
+    A job that fails gets an `error` entry and the others still render.
+    """
+    fits: Dict[str, list] = {}
+    for _, job in jobs:
+        show = job.show
+        if show.zoom_ratio < 0.01:
+            for path in show.images:
+                fits.setdefault(path, []).append((show.size, show.fit_mode, tuple(show.background)))
+
+    results = []
+    try:
+        for path, targets in fits.items():
+            try:
+                cache_fits(path, targets)
+            except Exception as e:
+                # The renders that use it fail on their own and report why
+                logger.warning(f"Could not pre-fit {path}: {str(e)}")
+        for position, job in jobs:
+            try:
+                stats = render_frames(job.show, job.output_path, job.audio_path, threads=threads)
+            except Exception as e:
+                logger.warning(f"Render of {job.output_path} failed: {str(e)}")
+                stats = {"error": str(e)}
+            results.append((position, {**stats, "output": job.output_path}))
+        logger.info(f"Rendered {len(jobs)} jobs, fit cache {fit_cache.stats()}")
+    finally:
+        fit_cache.clear()
+    return results
+
+
+def schedule(jobs: Sequence[RenderJob], workers: int) -> List[List[Tuple[int, RenderJob]]]:
+    """Split jobs into at most `workers` bundles, keeping jobs that share inputs together.
+
+    Groups go largest first to the bundle with the fewest frames, so the
+    bundles finish at about the same time. A group larger than a fair share
+    is split so every worker gets something to do.
+    """
+    groups: Dict[Tuple, List[Tuple[int, RenderJob]]] = {}
+    for position, job in enumerate(jobs):
+        groups.setdefault(job.input_key, []).append((position, job))
+
+    total = sum(job.show.frame_count for job in jobs)
+    fair_share = total / max(1, min(workers, len(jobs)))
+    pieces = []
+    for group in groups.values():
+        piece, frames = [], 0
+        for item in group:
+            if piece and frames + item[1].show.frame_count > fair_share:
+                pieces.append(piece)
+                piece, frames = [], 0
+            piece.append(item)
+            frames += item[1].show.frame_count
+        pieces.append(piece)
+
+    bundles = [[] for _ in range(min(workers, len(pieces)))]
+    loads = [0] * len(bundles)
+    for piece in sorted(pieces, key=lambda p: -sum(job.show.frame_count for _, job in p)):
+        target = loads.index(min(loads))
+        bundles[target].extend(piece)
+        loads[target] += sum(job.show.frame_count for _, job in piece)
+    return bundles
+
+
+def render_batch(jobs: Sequence[RenderJob], workers: Optional[int] = None) -> List[Dict[str, float]]:
+    """Render every job and return their stats in the order given.
+
+    Each worker process renders one bundle of jobs sequentially with its
+    share of the x264 threads; with one worker everything runs here.
+    Failed jobs have an `error` key instead of render stats; every bundle
+    is waited for, even when another one failed.
+    """
+    if not jobs:
+        return []
+    workers = workers or RENDER_WORKERS
+    bundles = schedule(jobs, workers)
+    threads = max(1, (os.cpu_count() or 1) // len(bundles))
+    started = time.perf_counter()
+    if len(bundles) == 1:
+        results = render_jobs(bundles[0], threads)
+    else:
+        pool = get_process_pool()
+        futures = [(pool.submit(render_jobs, bundle, threads), bundle) for bundle in bundles]
+        results = []
+        for future, bundle in futures:
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                # The worker itself failed (e.g. it was killed), so did its whole bundle
+                logger.warning(f"Bundle of {len(bundle)} jobs failed: {str(e)}")
+                results.extend((position, {"error": str(e), "output": job.output_path}) for position, job in bundle)
+    elapsed = time.perf_counter() - started
+    failed = sum("error" in stats for _, stats in results)
+    logger.info(f"Rendered {len(jobs) - failed}/{len(jobs)} videos in {len(bundles)} bundles in {elapsed:.1f}s")
+    return [stats for _, stats in sorted(results, key=lambda item: item[0])]
+
+
+if __name__ == "__main__":
+    import json
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+
+    import numpy
+    from PIL import Image
+
+    # python batch_render.py [images]: 3 platforms x 2 pacings, batch vs one fresh process per video
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    bench_dir = Path(tempfile.mkdtemp(prefix="batch_bench_"))
+    rng = numpy.random.default_rng(0)
+    images = []
+    for i in range(count):
+        path = bench_dir / f"image_{i}.jpg"
+        # Smooth content like a photo, so the encoder doesn't dominate the timing
+        noise = Image.fromarray(rng.integers(0, 256, (30, 40, 3), dtype=numpy.uint8))
+        noise.resize((4000, 3000), Image.BICUBIC).save(path, quality=90)
+        images.append(str(path))
+    encoder = EncoderSettings(fps=8, preset="ultrafast")
+    jobs = [
+        make_job(images, platform, bench_dir / f"{platform}_{duration}.mp4", image_duration=duration, encoder=encoder)
+        for platform in ("youtube_short", "instagram_feed", "facebook_short")
+        for duration in (5, 3)
+    ]
+
+    started = time.perf_counter()
+    for job in jobs:
+        # Fresh interpreter per video, like running a ds_movie script per variant
+        subprocess.run([
+            sys.executable, "-c",
+            "import sys; from frame_pipe import render_frames; from slideshow import *; "
+            f"render_frames({job.show!r}, {job.output_path!r})",
+        ], check=True, cwd=Path(__file__).resolve().parent)
+    independent = time.perf_counter() - started
+
+    started = time.perf_counter()
+    render_batch(jobs)
+    batch = time.perf_counter() - started
+    print(json.dumps({"videos": len(jobs), "independent_seconds": round(independent, 2), "batch_seconds": round(batch, 2)}, indent=2))
+    shutil.rmtree(bench_dir, ignore_errors=True)
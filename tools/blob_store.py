@@ -0,0 +1,285 @@
+import asyncio
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, Union
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+BLOB_STORE_ROOT = Path(os.getenv("BLOB_STORE_ROOT", BASE_DIR.joinpath("media", "blobs")))
+CHUNK_SIZE = 1024 * 64
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/pjpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tif",
+    "image/avif": ".avif",
+}
+
+
+def extension_for(content_type: str, default: str = ".jpg") -> str:
+    """Pick a file extension from a Content-Type header value."""
+    return CONTENT_TYPE_EXTENSIONS.get(content_type.split(";")[0].strip().lower(), default)
+
+
+def _hash_file(path: str) -> tuple:
+    """Return `(sha256 hex digest, size)` of a file on disk."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    content_hash: str
+    path: Path
+    size: int
+    created: bool  # False when identical bytes were already stored
+
+
+class BlobStore:
+    """Content-addressed image store.
+
+    Blobs live at `<root>/<aa>/<bb>/<sha256><ext>`, keyed by the SHA-256 of
+    the downloaded bytes, which is computed while the body streams in. Per-user
+    folders are hard links into the store, so the link count doubles as the
+    reference count. Where a hard link is impossible (another filesystem,
+    link limit) the view is a copy recorded in `blob_copies`, which counts
+    towards the reference count too. A small SQLite table maps source URLs
+    to hashes so a known URL never has to be fetched again.
+    """
+
+    def __init__(self, root: Union[str, Path] = BLOB_STORE_ROOT):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "urls.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS url_blobs (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                extension TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS blob_copies (
+                view_path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_blob_copies_hash ON blob_copies (content_hash)")
+        self._conn.commit()
+
+    # ------------------------------
+    # Blob paths and URL index
+    # ------------------------------
+
+    def path_for(self, content_hash: str, extension: str) -> Path:
+        return self.root / content_hash[:2] / content_hash[2:4] / f"{content_hash}{extension}"
+
+    def lookup_url(self, url: str) -> Optional[Path]:
+        """Return the stored blob for `url`, if it was downloaded before and still exists."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, extension FROM url_blobs WHERE url = ?", (url,)).fetchone()
+        if not row:
+            return None
+        path = self.path_for(*row)
+        return path if path.exists() else None
+
+    def remember_url(self, url: str, content_hash: str, extension: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO url_blobs (url, content_hash, extension) VALUES (?, ?, ?)",
+                (url, content_hash, extension))
+            self._conn.commit()
+
+    # ------------------------------
+    # Writing blobs
+    # ------------------------------
+
+    def _commit_temp(self, tmp_path: str, content_hash: str, extension: str, size: int) -> StoredBlob:
+        """Link the temp file in as the blob; a blob that already exists counts as stored.
+
+        `os.link` refuses to overwrite, so two writers committing the same hash
+        cannot race: one creates the blob and the other finds it in place.
+        """
+        final_path = self.path_for(content_hash, extension)
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(tmp_path, final_path)
+            created = True
+        except FileExistsError:
+            created = False
+        finally:
+            os.remove(tmp_path)
+        return StoredBlob(content_hash, final_path, size, created=created)
+
+    async def store_response(
+        self,
+        response: aiohttp.ClientResponse,
+        extension: Optional[str] = None,
+        postprocess: Optional[Callable[[str], Awaitable[object]]] = None,
+    ) -> StoredBlob:
+        """Stream a response body into the store, hashing it on the way.
+
+        `postprocess` runs on the temporary file before it is committed (e.g.
+        metadata stripping); the blob is then keyed by the hash of the bytes it
+        actually holds.
+        """
+        extension = extension or extension_for(response.headers.get("Content-Type", ""))
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=extension)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            return await self.commit_file(tmp_path, digest.hexdigest(), extension, size, postprocess)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    async def commit_file(
+        self,
+        tmp_path: str,
+        content_hash: str,
+        extension: str,
+        size: int,
+        postprocess: Optional[Callable[[str], Awaitable[object]]] = None,
+    ) -> StoredBlob:
+        """Move a fully written temp file into the store under `content_hash`.
+
+        The temp file must be on the same filesystem as the store (use `tmp_dir`).
+        If `postprocess` rewrites the file, the hash and size are recomputed so
+        the blob's name always matches its stored bytes.
+        """
+        if postprocess is not None:
+            await postprocess(tmp_path)
+            content_hash, size = await asyncio.to_thread(_hash_file, tmp_path)
+        return self._commit_temp(tmp_path, content_hash, extension, size)
+
+    def store_bytes(self, data: bytes, extension: str = ".jpg") -> StoredBlob:
+        content_hash = hashlib.sha256(data).hexdigest()
+        existing = self.path_for(content_hash, extension)
+        if existing.exists():
+            return StoredBlob(content_hash, existing, len(data), created=False)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=extension)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return self._commit_temp(tmp_path, content_hash, extension, len(data))
+
+    async def store_derived(
+        self,
+        source: Path,
+        transform: Callable[[str, str], Awaitable[object]],
+    ) -> StoredBlob:
+        """Store `transform(source, output)`'s output as its own blob.
+
+        `source` is never modified, so views and cache entries pointing at it
+        stay valid (e.g. a metadata-free copy of a downloaded image).
+        """
+        extension = source.suffix
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=extension)
+        os.close(fd)
+        try:
+            await transform(str(source), tmp_path)
+            content_hash, size = await asyncio.to_thread(_hash_file, tmp_path)
+            return self._commit_temp(tmp_path, content_hash, extension, size)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # ------------------------------
+    # Per-user views
+    # ------------------------------
+
+    def link_into(self, blob_path: Path, view_dir: Union[str, Path]) -> Path:
+        """Expose a blob inside `view_dir` (e.g. download/<username>) under its hash name."""
+        view_dir = Path(view_dir)
+        view_dir.mkdir(parents=True, exist_ok=True)
+        view_path = view_dir / blob_path.name
+        if view_path.exists():
+            return view_path
+        try:
+            os.link(blob_path, view_path)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            # Hard links are not possible across devices, fall back to a copy
+            # and record it, since a copy doesn't show up in the link count
+            shutil.copy2(blob_path, view_path)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO blob_copies (view_path, content_hash) VALUES (?, ?)",
+                    (str(view_path.resolve()), blob_path.stem))
+                self._conn.commit()
+        return view_path
+
+    def reference_count(self, blob_path: Path) -> int:
+        """Number of user views still pointing at the blob, hard links and copies."""
+        with self._lock:
+            copies = self._conn.execute(
+                "SELECT COUNT(*) FROM blob_copies WHERE content_hash = ?", (blob_path.stem,)).fetchone()[0]
+        return max(0, os.stat(blob_path).st_nlink - 1) + copies
+
+    def release(self, view_path: Union[str, Path]) -> bool:
+        """Remove a user view and drop the blob once nothing references it.
+
+        Returns True if the underlying blob was deleted as well.
+        """
+        view_path = Path(view_path)
+        if not view_path.exists():
+            return False
+        content_hash = view_path.stem
+        blob_path = self.path_for(content_hash, view_path.suffix)
+        with self._lock:
+            self._conn.execute("DELETE FROM blob_copies WHERE view_path = ?", (str(view_path.resolve()),))
+            self._conn.commit()
+        os.remove(view_path)
+        if blob_path.exists() and self.reference_count(blob_path) == 0:
+            os.remove(blob_path)
+            with self._lock:
+                self._conn.execute("DELETE FROM url_blobs WHERE content_hash = ?", (content_hash,))
+                self._conn.commit()
+            return True
+        return False
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_default_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide store instance"""
+    global _default_store
+    if _default_store is None:
+        _default_store = BlobStore()
+    return _default_store
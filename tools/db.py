@@ -1,8 +1,9 @@
-from sqlalchemy import Column, String, Integer, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Text, Boolean, DateTime, ForeignKey, inspect, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, field_validator
+from typing import Optional, List, Literal
 from passlib.context import CryptContext
 from pathlib import Path
 from database import Base, engine
@@ -37,11 +38,35 @@ class ImageDetail(Base):
     site_url = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     approved = Column(Boolean, default=False)
+    content_hash = Column(String(64), index=True, nullable=True)  # SHA-256 of the stored blob
     
     author = relationship("User", back_populates="images")
 
 Base.metadata.create_all(bind=engine)
 
+
+def add_missing_columns() -> None:
+    """Add columns introduced after `image_details` was created; `create_all` never alters tables.
+
+    Safe to run on every start: the column is only added when missing, and a
+    process that loses the race to add it just re-checks.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("image_details")}
+    if "content_hash" not in columns:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE image_details ADD COLUMN content_hash VARCHAR(64)"))
+        except DBAPIError:
+            columns = {column["name"] for column in inspect(engine).get_columns("image_details")}
+            if "content_hash" not in columns:
+                raise
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_image_details_content_hash ON image_details (content_hash)"))
+
+
+add_missing_columns()
+
 # Pydantic models
 class UserCreate(BaseModel):
     name: str
@@ -59,6 +84,16 @@ class UserOut(BaseModel):
     permissions: List[str]
     created_at: datetime
 
+    @field_validator("permissions", mode="before")
+    @classmethod
+    def split_permissions(cls, value):
+        # Stored as a comma-separated string on the User row
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [item for item in value.split(",") if item]
+        return value
+
     class Config:
         from_attributes = True
         
@@ -75,24 +110,33 @@ class ImageDetailCreate(BaseModel):
         
 
 class ImageDetailOut(BaseModel):
-    id: str
+    id: int
     title: str
     author: UserOut
     image_url: str
-    resolution: str
+    resolution: Optional[str]
     download_engine: Optional[str]
     site_name: str
     site_url: str
     created_at: datetime
     approved: bool
+    content_hash: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 class ImageSelection(BaseModel):
     image_ids: List[int]
+    action: Literal["approve", "reject", "delete"] = "approve"
     
+class RenderRequest(BaseModel):
+    image_ids: List[int]
+    parameter_id: Optional[int] = None
+    audio: Optional[str] = None  # File name in media/audio
+    overlay: Optional[str] = None  # File name in media/faces
+
 class TargetSize(SQLModel, table=True):
+    # Keeps SQLModel's default "targetsize" table name, existing rows live there
     id: Optional[int] = Field(default=None, primary_key=True)
     plateform: str
     width: int
@@ -101,9 +145,11 @@ class TargetSize(SQLModel, table=True):
 class Parameter(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     file_name: str
-    target_size: int | None = Field(default=None, foreign_key="target_size.id")
+    target_size: int | None = Field(default=None, foreign_key="targetsize.id")
     image_view_duration: int | None
     clip_view_duration: int | None
     transition_duration: int | None
     zoom_in: float | None
-    zoom_out: float | None
\ No newline at end of file
+    zoom_out: float | None
+
+SQLModel.metadata.create_all(engine)
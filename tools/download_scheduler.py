@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+from urllib.parse import urlparse
+
+import aiohttp
+
+from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class DownloadError(Exception):
+    """Raised when a URL could not be fetched after all retries"""
+
+    def __init__(self, url: str, message: str, status: Optional[int] = None):
+        super().__init__(f"{url}: {message}")
+        self.url = url
+        self.status = status
+
+
+@dataclass
+class DownloadMetrics:
+    """Counters collected while the scheduler runs"""
+    started_at: float = field(default_factory=time.monotonic)
+    requests: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    retried: int = 0
+    cancelled: int = 0
+    bytes_received: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def downloads_per_second(self) -> float:
+        return self.succeeded / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_received / self.elapsed if self.elapsed else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "cancelled": self.cancelled,
+            "bytes_received": self.bytes_received,
+            "elapsed": round(self.elapsed, 3),
+            "downloads_per_second": round(self.downloads_per_second, 2),
+            "bytes_per_second": round(self.bytes_per_second, 1),
+            "statuses": dict(self.statuses),
+            "errors": dict(self.errors),
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds announced by a `Retry-After` header."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class DownloadScheduler:
+    """Bounded-concurrency HTTP fetcher with per-host caps and retries.
+
+    A request first waits for a slot on its host, then for a global slot, so
+    a slow CDN never holds global capacity that other hosts could use.
+    Slots are released while a request sleeps before its next retry.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        per_host_limit: int = 4,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.metrics = DownloadMetrics()
+        self._session = session
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_slots[host]
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Exponential backoff with full jitter, never shorter than `Retry-After`."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def fetch(
+        self,
+        url: str,
+        handler: Callable[[aiohttp.ClientResponse], Awaitable[T]],
+        method: str = "GET",
+        **request_kwargs,
+    ) -> T:
+        """Request `url` and hand the successful response to `handler`.
+
+        `handler` runs while the connection slot is held, so it can stream the
+        body. Retryable statuses and connection errors are retried; anything
+        else raises `DownloadError`. The request runs as its own task, so
+        `cancel()` stops it (raising CancelledError here) whether it was
+        started with `fetch` or `submit`. `headers` may be a callable, called
+        before every attempt, for requests that depend on what an earlier
+        attempt left behind (a Range over the bytes already received).
+        """
+        task = asyncio.ensure_future(self._fetch(url, handler, method, **request_kwargs))
+        self._track(task)
+        return await task
+
+    def _track(self, task: asyncio.Future) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(
+        self,
+        url: str,
+        handler: Callable[[aiohttp.ClientResponse], Awaitable[T]],
+        method: str = "GET",
+        **request_kwargs,
+    ) -> T:
+        session = self._session or await get_session()
+        host_slots = self._host_semaphore(url)
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with host_slots, self._global_slots:
+                    self.metrics.requests += 1
+                    kwargs = request_kwargs
+                    if callable(request_kwargs.get("headers")):
+                        kwargs = {**request_kwargs, "headers": request_kwargs["headers"]()}
+                    async with session.request(method, url, **kwargs) as response:
+                        self.metrics.statuses[response.status] += 1
+                        if response.status in self.retry_statuses and attempt < self.max_retries:
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        elif response.status >= 400:
+                            raise DownloadError(url, f"HTTP Error {response.status}", response.status)
+                        else:
+                            try:
+                                result = await handler(response)
+                            finally:
+                                # Bytes the handler actually read, with or without Content-Length
+                                self.metrics.bytes_received += response.content.total_bytes
+                            self.metrics.succeeded += 1
+                            return result
+            except asyncio.CancelledError:
+                self.metrics.cancelled += 1
+                raise
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                self.metrics.errors[type(e).__name__] += 1
+                if attempt >= self.max_retries:
+                    self.metrics.failed += 1
+                    raise DownloadError(url, str(e) or type(e).__name__) from e
+            except DownloadError as e:
+                self.metrics.errors[f"HTTP {e.status}"] += 1
+                self.metrics.failed += 1
+                raise
+            except Exception as e:
+                self.metrics.errors[type(e).__name__] += 1
+                self.metrics.failed += 1
+                raise
+
+            delay = self.backoff_delay(attempt, retry_after)
+            self.metrics.retried += 1
+            logger.info(f"Retrying {url} in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+        self.metrics.failed += 1
+        raise DownloadError(url, "Retries exhausted")
+
+    def submit(
+        self,
+        url: str,
+        handler: Callable[[aiohttp.ClientResponse], Awaitable[T]],
+        **request_kwargs,
+    ) -> "asyncio.Task[T]":
+        """Schedule the download as a task that `cancel()` can stop."""
+        task = asyncio.ensure_future(self._fetch(url, handler, **request_kwargs))
+        self._track(task)
+        return task
+
+    async def map(
+        self,
+        urls: Iterable[str],
+        handler: Callable[[aiohttp.ClientResponse], Awaitable[T]],
+        **request_kwargs,
+    ) -> List[Any]:
+        """Fetch every URL; failures are returned in place as exceptions."""
+        tasks = [self.submit(url, handler, **request_kwargs) for url in urls]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def cancel(self) -> int:
+        """Cancel every pending download, returning how many were cancelled."""
+        pending = [task for task in self._tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        return len(pending)
+
+
+async def read_body(response: aiohttp.ClientResponse) -> bytes:
+    """Handler that buffers the whole response body"""
+    return await response.read()
@@ -1,5 +1,7 @@
 from moviepy import *
 from tools.utils import FileDirectory
+from image_resize import fitted_clip
+from audio_track import mux_audio, prepare_audio
 from pathlib import Path
 from moviepy.video.fx import CrossFadeIn, CrossFadeOut
 import random
@@ -18,28 +20,20 @@ CURRENT_SIZE = TARGET_SIZE["instagram_story"]  # Select desired platform
 IMAGE_VIEW_DURATION = 5  # seconds
 TRANSITION_DURATION = 1  # seconds
 VIDEO_LENGTH = 30  # seconds
+FIT_MODE = "cover"  # "cover" crops to fill, "contain" letterboxes
+BACKGROUND_COLOR = (0, 0, 0)  # letterbox color for "contain"
 
-def fit_to_screen(clip):
-    """Resize image to fill screen while maintaining aspect ratio"""
-    return clip.resized(lambda t: max(
-        CURRENT_SIZE[0]/clip.size[0],
-        CURRENT_SIZE[1]/clip.size[1]
-    )).with_position('center')
+def fit_to_screen(image_path):
+    """Resize and crop image to the screen once, as a constant-frame clip"""
+    return fitted_clip(image_path, CURRENT_SIZE, IMAGE_VIEW_DURATION, FIT_MODE, BACKGROUND_COLOR)
 
     
 def add_crossfadein_images(images):
     final_clips = []
     
-    for i, clip in enumerate(images):
-        # Create base clip with explicit duration
-        base_clip = CompositeVideoClip([
-            ColorClip(
-                size=CURRENT_SIZE,
-                color=(0,0,0),  # Black background
-                duration=IMAGE_VIEW_DURATION
-            ),
-            fit_to_screen(clip.with_duration(IMAGE_VIEW_DURATION))
-        ]).with_duration(IMAGE_VIEW_DURATION)
+    for i, image_path in enumerate(images):
+        # Already canvas-sized, no background layer needed
+        base_clip = fit_to_screen(image_path)
 
         # Add transitions after first clip
         if i > 0:
@@ -60,8 +54,8 @@ def add_face_overlay():
     return [face.resize(height=200).with_position(('right', 'bottom')) for face in faces]
 
 # Main composition
-image_clips = file_directory.get_image_files(BASE_DIR.joinpath('media', 'image'))
-final_clips = add_crossfadein_images(image_clips)
+image_paths = file_directory.get_image_files(BASE_DIR.joinpath('media', 'image'), load_clips=False)
+final_clips = add_crossfadein_images(image_paths)
 final_video = CompositeVideoClip(final_clips, size=CURRENT_SIZE).with_duration(VIDEO_LENGTH)
 
 # Add face overlay if available
@@ -73,26 +67,34 @@ else:
 
 # Audio handling
 def add_audio():
-    audio_files = BASE_DIR.joinpath('media', 'audio', 'audio_01.mp3')
-    if audio_files:
-        return AudioFileClip(audio_files).with_duration(VIDEO_LENGTH)
+    """Soundtrack fitted to VIDEO_LENGTH as a ready AAC file, encoded once per length"""
+    audio_file = BASE_DIR.joinpath('media', 'audio', 'audio_01.mp3')
+    if audio_file.exists():
+        return prepare_audio(audio_file, VIDEO_LENGTH)
     return None
 
 
 if __name__ == "__main__":
-    final = final_with_face.with_audio(add_audio())
-    
-    final.write_videofile(
-        f"output_{''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=3))}.mp4",
+    output_name = f"output_{''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=3))}.mp4"
+    audio_track = add_audio()
+    # Video only, the prepared track is copied in afterwards instead of re-encoded
+    video_name = f"video_{output_name}" if audio_track else output_name
+
+    final_with_face.write_videofile(
+        video_name,
         fps=15,  # Recommended for social media
         codec="libx264",
         preset='fast',
+        audio=False,
         ffmpeg_params=[
             '-crf', '18',        # Quality range (18-24 is good)
             '-movflags', '+faststart',
             '-pix_fmt', 'yuv420p'  # Ensure compatibility
         ]
     )
+    if audio_track:
+        mux_audio(video_name, audio_track, output_name)
+        Path(video_name).unlink()
 
 
     """
@@ -1,6 +1,9 @@
 from moviepy import *
 from moviepy.video.fx import CrossFadeIn, CrossFadeOut, Resize
 from tools.utils import FileDirectory
+from image_resize import fitted_clip
+from slideshow import EncoderSettings, Slideshow
+from segment_render import render_segmented
 from pathlib import Path
 import random
 import math
@@ -19,6 +22,8 @@ CURRENT_SIZE = TARGET_SIZE["instagram_story"]
 IMAGE_VIEW_DURATION = 5  # seconds per image
 TRANSITION_DURATION = 1  # seconds between images
 ZOOM_INTENSITY = 0.08  # 8% zoom effect
+FIT_MODE = "cover"  # "cover" crops to fill, "contain" letterboxes
+BACKGROUND_COLOR = (0, 0, 0)  # letterbox color for "contain"
 
 """
 NOTE ABOUT CODE STATUS
@@ -55,14 +60,9 @@ def add_ken_burns_effect(clip, zoom_direction='in', zoom_speed=0.5):
         Resize(get_scale)
     ])
 
-def fit_to_screen(clip):
-    """Resize image to fill screen while maintaining aspect ratio"""
-    return clip.with_effects([
-        Resize(lambda t: max(
-            CURRENT_SIZE[0]/clip.w,
-            CURRENT_SIZE[1]/clip.h
-        ))
-    ]).with_position('center')
+def fit_to_screen(image_path):
+    """Resize and crop image to the screen once, as a constant-frame clip"""
+    return fitted_clip(image_path, CURRENT_SIZE, IMAGE_VIEW_DURATION, FIT_MODE, BACKGROUND_COLOR)
 
 # def add_transitions(images):
 #     """Create video clips with transitions and zoom effects"""
@@ -84,24 +84,10 @@ def add_transitions(images):
     """Create video clips with transitions and zoom effects"""
     final_clips = []
     
-    for i, clip in enumerate(images):
-        # Process the image clip first
-        processed_clip = (
-            clip.with_duration(IMAGE_VIEW_DURATION)
-            # .with_effects(fit_to_screen)
-            .with_effects(add_ken_burns_effect(clip))
-        )
-
-        # Create base composite clip
-        base_clip = CompositeVideoClip([
-            ColorClip(
-                size=CURRENT_SIZE,
-                color=(0,0,0),
-                duration=IMAGE_VIEW_DURATION
-            ),
-            processed_clip.with_position('center'),  # Use the processed clip here
-            fit_to_screen(clip.with_duration(IMAGE_VIEW_DURATION)),
-        ]).with_duration(IMAGE_VIEW_DURATION)
+    for i, image_path in enumerate(images):
+        # The fitted image covers the whole canvas, so the background and the
+        # zoom layer that used to sit under it never showed in the output
+        base_clip = fit_to_screen(image_path)
 
         # Add transitions after first clip
         if i > 0:
@@ -134,72 +120,30 @@ def add_face_overlay(total_duration):
         return None
 
 def main():
-    """Main processing function with MoviePy 2.x resource management"""
-    clips_to_close = []
-    
-    try:
-        # Load and process images
-        image_paths = file_directory.get_image_files(BASE_DIR.joinpath('media', 'image'), load_clips=False)
-        if not image_paths:
-            raise ValueError("No images found in media/image directory")
-        
-        # Create ImageClip objects
-        raw_clips = [ImageClip(p) for p in image_paths]
-        clips_to_close.extend(raw_clips)
-        
-        # Process clips
-        total_duration = calculate_total_duration(len(raw_clips))
-        final_clips = add_transitions(raw_clips)
-        clips_to_close.extend(final_clips)
-        
-        # Create main video
-        main_video = CompositeVideoClip(final_clips, size=CURRENT_SIZE)
+    """Render the slideshow in parallel segments joined without re-encoding"""
+    image_paths = file_directory.get_image_files(BASE_DIR.joinpath('media', 'image'), load_clips=False)
+    if not image_paths:
+        raise ValueError("No images found in media/image directory")
 
-        # Add face overlay
-        face_clip = add_face_overlay(total_duration)
-        if face_clip:
-            print('face clip :', face_clip)
-            clips_to_close.append(face_clip)
-            main_video = CompositeVideoClip([
-                main_video.with_layer(1),
-                face_clip.with_layer(0)
-            ])
-
-        # Add audio
-        audio_paths = file_directory.get_audio_files(BASE_DIR.joinpath('media', 'audio'))
-        # audio_clip = None
-        if audio_paths:
-            audio_clip = random.choice(audio_paths)
-            audio_clip.with_duration(total_duration)
-            clips_to_close.append(audio_clip.with_duration(total_duration))
-
-        # Final composition
-        final = main_video.with_audio(audio_clip) if audio_clip else main_video
-
-        # Export video
-        output_name = f"output_{''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=3))}.mp4"
-        final.write_videofile(
-            output_name,
-            fps=24,
-            codec="libx264",
-            preset='fast',
-            ffmpeg_params=[
-                '-crf', '18',
-                '-movflags', '+faststart',
-                '-pix_fmt', 'yuv420p'
-            ]
-        )
-        print(f"Successfully created {output_name}")
-
-    finally:
-        # Cleanup resources
-        for clip in clips_to_close:
-            try:
-                if hasattr(clip, 'close'):
-                    clip.close()
-                    print('clips are closed')
-            except Exception as e:
-                print(f"Error closing clip: {e}")
+    face_paths = file_directory.get_image_files(BASE_DIR.joinpath('media', 'faces'), load_clips=False)
+    audio_paths = file_directory.get_audio_files(BASE_DIR.joinpath('media', 'audio'), load_clips=False)
+
+    show = Slideshow(
+        tuple(image_paths),
+        CURRENT_SIZE,
+        image_duration=IMAGE_VIEW_DURATION,
+        transition_duration=TRANSITION_DURATION,
+        fit_mode=FIT_MODE,
+        background=BACKGROUND_COLOR,
+        overlay=random.choice(face_paths) if face_paths else None,
+        overlay_height=200,
+        encoder=EncoderSettings(fps=24, preset='fast', crf=18),
+    )
+
+    # Export video
+    output_name = f"output_{''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=3))}.mp4"
+    stats = render_segmented(show, output_name, random.choice(audio_paths) if audio_paths else None)
+    print(f"Successfully created {output_name}: {stats}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Lazily created executors shared by every caller in a process
+"""
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Optional
+
+
+class LazyExecutor:
+    """Create an executor of `max_workers` on first use, shut it down on demand.
+
+    `factory` is the executor class (ProcessPoolExecutor by default); extra
+    keyword arguments go to it, e.g. `thread_name_prefix` for threads.
+    """
+
+    def __init__(self, max_workers: int, factory: Callable[..., Executor] = ProcessPoolExecutor, **kwargs):
+        self.max_workers = max_workers
+        self.factory = factory
+        self.kwargs = kwargs
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.factory(max_workers=self.max_workers, **self.kwargs)
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -0,0 +1,324 @@
+"""
+Slideshow frames computed directly with NumPy and piped to ffmpeg
+"""
+import logging
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+import numpy
+from PIL import Image
+
+from audio_track import ffmpeg_binary, prepare_audio
+from image_resize import cached_fit_image, file_key, fit_cache
+from ken_burns import KenBurns, Motion
+from slideshow import EncoderSettings, Size, Slideshow
+
+logger = logging.getLogger(__name__)
+
+# Blend weights are fixed point out of 2 ** BLEND_BITS: 255 * 256 + 128 fits in uint16
+BLEND_BITS = 8
+BLEND_ONE = 1 << BLEND_BITS
+
+# progress(frames_done, frames_total); raising from it aborts the render
+Progress = Callable[[int, int], None]
+
+
+class FFmpegPipe:
+    """ffmpeg process encoding raw RGB frames written to its stdin.
+
+    `audio_path` is muxed as is, so pass a track from `prepare_audio`.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        size: Size,
+        encoder: EncoderSettings,
+        audio_path: Optional[str] = None,
+        duration: Optional[float] = None,
+        threads: Optional[int] = None,
+    ):
+        cmd = [
+            ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}", "-r", str(encoder.fps),
+            "-i", "-",
+        ]
+        if audio_path:
+            cmd += ["-i", str(audio_path), "-map", "0:v", "-map", "1:a", "-c:a", "copy"]
+            if duration is not None:
+                cmd += ["-t", f"{duration:.3f}"]
+        cmd += ["-c:v", encoder.codec, "-preset", encoder.preset, *encoder.ffmpeg_params()]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        cmd += ["-movflags", "+faststart", str(path)]
+        self.path = path
+        self.frames = 0
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def write(self, frame: numpy.ndarray) -> None:
+        self.proc.stdin.write(memoryview(frame))
+        self.frames += 1
+
+    def close(self) -> None:
+        _, stderr = self.proc.communicate()
+        if self.proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed writing {self.path}: {stderr.decode(errors='replace').strip()}")
+
+    def __enter__(self) -> "FFmpegPipe":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.proc.kill()
+            self.proc.wait()
+
+
+def blend_into(out: numpy.ndarray, a: numpy.ndarray, b: numpy.ndarray, weight: int,
+               acc: numpy.ndarray, tmp: numpy.ndarray) -> None:
+    """`out = (a * (ONE - weight) + b * weight) >> BLEND_BITS`, rounded, in place.
+
+    `acc` and `tmp` are uint16 scratch buffers shaped like `out`; nothing is
+    allocated per call.
+    """
+    numpy.multiply(a, BLEND_ONE - weight, out=acc, dtype=numpy.uint16)
+    numpy.multiply(b, weight, out=tmp, dtype=numpy.uint16)
+    acc += tmp
+    acc += BLEND_ONE >> 1
+    numpy.right_shift(acc, BLEND_BITS, out=acc)
+    numpy.copyto(out, acc, casting="unsafe")
+
+
+class SlideshowFrames:
+    """Computes slideshow frames into one preallocated buffer.
+
+    Only the slides visible at the current frame are kept: the current one
+    and, during a crossfade, the previous one. Still slides are fitted once;
+    zoomed slides keep a KenBurns engine. Crossfades use precomputed integer
+    alpha ramps blended in place, and a frame identical to the previous one
+    (a still slide, overlay included) is returned without recomputation.
+    `frame(n)` returns a shared buffer, valid until the next call.
+    """
+
+    def __init__(self, show: Slideshow):
+        self.show = show
+        width, height = show.size
+        self._frame = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        self._acc = numpy.empty((height, width, 3), dtype=numpy.uint16)
+        self._tmp = numpy.empty((height, width, 3), dtype=numpy.uint16)
+        self._slides: Dict[int, object] = {}
+        self._ramps: Dict[int, numpy.ndarray] = {}
+        self._overlay = self._load_overlay()
+        self._last_key = None
+        self._last: Optional[numpy.ndarray] = None
+        self.computed = 0
+        self.reused = 0
+
+    def _load_overlay(self):
+        if not self.show.overlay:
+            return None
+        with Image.open(self.show.overlay) as img:
+            img = img.convert("RGBA")
+            width = max(1, round(img.size[0] * self.show.overlay_height / img.size[1]))
+            pixels = numpy.asarray(img.resize((width, self.show.overlay_height), Image.LANCZOS))
+        canvas_w, canvas_h = self.show.size
+        pixels = pixels[-canvas_h:, -canvas_w:]
+        height, width = pixels.shape[:2]
+        # Bottom-right corner, as in the moviepy composites
+        region = (slice(canvas_h - height, canvas_h), slice(canvas_w - width, canvas_w))
+        # Alpha as 0..BLEND_ONE weights, premultiplied overlay colour next to it
+        weight = (pixels[:, :, 3:].astype(numpy.uint16) * BLEND_ONE + 127) // 255
+        premultiplied = pixels[:, :, :3].astype(numpy.uint16) * weight
+        return region, BLEND_ONE - weight, premultiplied
+
+    def _slide(self, index: int):
+        slide = self._slides.get(index)
+        if slide is None:
+            show = self.show
+            path = show.images[index]
+            if show.zoom_ratio >= 0.01:
+                # KenBurns keeps only the downscaled source and crop rects, so it is shared
+                motion = Motion.zoom_in(show.zoom_ratio, show.image_duration)
+                key = ("ken_burns", *file_key(path), show.size, motion, show.image_duration, show.fps)
+                slide = fit_cache.get_or_load(
+                    key,
+                    lambda: self._ken_burns(path, motion),
+                    lambda engine: engine.source.nbytes,
+                )
+            else:
+                slide = cached_fit_image(path, show.size, show.fit_mode, show.background)
+            self._slides[index] = slide
+        return slide
+
+    def _ken_burns(self, path: str, motion: Motion) -> KenBurns:
+        show = self.show
+        with Image.open(path) as img:
+            source = numpy.asarray(img.convert("RGB"))
+        return KenBurns(source, show.size, motion, show.image_duration, show.fps)
+
+    def _pixels(self, index: int, t: float) -> numpy.ndarray:
+        slide = self._slide(index)
+        if isinstance(slide, KenBurns):
+            return slide.frame(t - self.show.start(index))
+        return slide
+
+    def ramp(self, index: int) -> numpy.ndarray:
+        """Fade-in weights of slide `index`, one per frame from its first frame.
+
+        Slides whose start falls on the same sub-frame offset share a ramp, so
+        with whole-frame timings every transition uses the same table.
+        """
+        show = self.show
+        first = show.slide_frames(index)[0]
+        offset = round((first - show.start(index) * show.fps) * 1000)
+        ramp = self._ramps.get(offset)
+        if ramp is None:
+            count = max(1, round(show.transition_duration * show.fps) + 1)
+            times = (first + numpy.arange(count)) / show.fps - show.start(index)
+            alpha = numpy.clip(times / show.transition_duration, 0.0, 1.0)
+            ramp = numpy.round(alpha * BLEND_ONE).astype(numpy.uint16)
+            self._ramps[offset] = ramp
+        return ramp
+
+    def active(self, n: int):
+        """`(index, weight)` of the slide on top at frame n; weight < BLEND_ONE means fading in."""
+        show = self.show
+        t = n / show.fps
+        index = min(int(t // show.step), len(show.images) - 1)
+        # Match slide_frames exactly where start * fps is not a whole frame
+        while index > 0 and round(show.start(index) * show.fps) > n:
+            index -= 1
+        while index < len(show.images) - 1 and round(show.start(index + 1) * show.fps) <= n:
+            index += 1
+        if index == 0 or show.transition_duration <= 0:
+            return index, BLEND_ONE
+        ramp = self.ramp(index)
+        position = n - show.slide_frames(index)[0]
+        return index, int(ramp[position]) if position < len(ramp) else BLEND_ONE
+
+    def frame_key(self, n: int):
+        """Hashable identity of frame n's content, or None if it changes every frame."""
+        index, weight = self.active(n)
+        if self.show.zoom_ratio >= 0.01 or weight < BLEND_ONE:
+            return None
+        return index
+
+    def frame(self, n: int) -> numpy.ndarray:
+        key = self.frame_key(n)
+        if key is not None and key == self._last_key:
+            self.reused += 1
+            return self._last
+        self.computed += 1
+
+        index, weight = self.active(n)
+        t = n / self.show.fps
+        for stale in [i for i in self._slides if i not in (index - 1, index)]:
+            del self._slides[stale]
+
+        current = self._pixels(index, t)
+        if weight >= BLEND_ONE:
+            if self._overlay is None:
+                self._last_key, self._last = key, current
+                return current
+            numpy.copyto(self._frame, current)
+        else:
+            previous = self._pixels(index - 1, t)
+            blend_into(self._frame, previous, current, weight, self._acc, self._tmp)
+
+        if self._overlay is not None:
+            region, inverse, premultiplied = self._overlay
+            target = self._frame[region]
+            acc = self._acc[region]
+            numpy.multiply(target, inverse, out=acc, dtype=numpy.uint16)
+            acc += premultiplied
+            acc += BLEND_ONE >> 1
+            numpy.right_shift(acc, BLEND_BITS, out=acc)
+            numpy.copyto(target, acc, casting="unsafe")
+        self._last_key, self._last = key, self._frame
+        return self._frame
+
+
+def render_frames(
+    show: Slideshow,
+    output_path: Union[str, Path],
+    audio_path: Optional[str] = None,
+    first_frame: int = 0,
+    end_frame: Optional[int] = None,
+    threads: Optional[int] = None,
+    progress: Optional[Progress] = None,
+) -> Dict[str, float]:
+    """Encode frames `[first_frame, end_frame)` of `show` straight into ffmpeg.
+
+    `progress` is called after every frame; an exception raised from it
+    kills the encoder and propagates. `audio_path` is fitted to the
+    rendered length once (see `prepare_audio`) and copied into the output.
+    """
+    end_frame = show.frame_count if end_frame is None else end_frame
+    frames = SlideshowFrames(show)
+    started = time.perf_counter()
+    count = end_frame - first_frame
+    duration = count / show.fps
+    if audio_path:
+        audio_path = prepare_audio(audio_path, duration)
+    with FFmpegPipe(output_path, show.size, show.encoder, audio_path, duration, threads) as pipe:
+        for n in range(first_frame, end_frame):
+            pipe.write(frames.frame(n))
+            if progress is not None:
+                progress(n - first_frame + 1, count)
+    elapsed = time.perf_counter() - started
+    logger.info(f"Piped {count} frames to {output_path} at {count / elapsed:.1f} fps")
+    return {"frames": count, "seconds": round(elapsed, 2), "fps": round(count / elapsed, 1) if elapsed else 0.0}
+
+
+def benchmark_renderers(images: int = 4, size: Size = (1080, 1920), fps: int = 15, work_dir: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """Frames per second of the moviepy composite and the direct pipe on one timeline,
+    plus the CPU time of computing the direct frames without encoding them."""
+    import shutil
+    import tempfile
+
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+    bench_dir = Path(work_dir or tempfile.mkdtemp(prefix="pipe_bench_"))
+    rng = numpy.random.default_rng(0)
+    paths = []
+    for i in range(images):
+        path = bench_dir / f"image_{i}.jpg"
+        Image.fromarray(rng.integers(0, 256, (1500, 2000, 3), dtype=numpy.uint8)).save(path)
+        paths.append(str(path))
+    show = Slideshow(tuple(paths), size, encoder=EncoderSettings(fps=fps))
+
+    results = {}
+    started = time.perf_counter()
+    clip = show.clip()
+    with FFMPEG_VideoWriter(str(bench_dir / "composite.mp4"), size, fps, preset=show.encoder.preset,
+                            ffmpeg_params=show.encoder.ffmpeg_params()) as writer:
+        for n in range(show.frame_count):
+            writer.write_frame(clip.get_frame(n / fps))
+    elapsed = time.perf_counter() - started
+    results["moviepy_composite"] = {"frames": show.frame_count, "seconds": round(elapsed, 2), "fps": round(show.frame_count / elapsed, 1)}
+    results["numpy_pipe"] = render_frames(show, bench_dir / "direct.mp4")
+    # Frame computation alone, without the encoder, in CPU seconds
+    frames = SlideshowFrames(show)
+    started = time.process_time()
+    for n in range(show.frame_count):
+        frames.frame(n)
+    results["numpy_frames_cpu"] = {
+        "frames": show.frame_count,
+        "computed": frames.computed,
+        "reused": frames.reused,
+        "cpu_seconds": round(time.process_time() - started, 2),
+    }
+    if work_dir is None:
+        shutil.rmtree(bench_dir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    print(json.dumps(benchmark_renderers(count), indent=2))
@@ -0,0 +1,288 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+import aiohttp
+
+from blob_store import BlobStore, CHUNK_SIZE, extension_for, get_blob_store
+from download_scheduler import DownloadScheduler
+from image_probe import HeaderProbe, ImageHeader, ImageRejected, ImageRequirements
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+HTTP_CACHE_PATH = Path(os.getenv("HTTP_CACHE_PATH", BASE_DIR.joinpath("media", "http_cache.sqlite3")))
+# Within this window a cached URL is reused without even a conditional request.
+HTTP_CACHE_REVALIDATE_AFTER = float(os.getenv("HTTP_CACHE_REVALIDATE_AFTER", str(24 * 3600)))
+
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_length: Optional[int] = None
+    content_hash: Optional[str] = None
+    extension: Optional[str] = None
+    checked_at: float = 0.0
+    partial_bytes: int = 0
+
+
+@dataclass(frozen=True)
+class CachedDownload:
+    path: Path
+    content_hash: str
+    status: str  # "fresh", "not_modified", "downloaded" or "resumed"
+    bytes_transferred: int
+    created: bool = False  # True when the bytes were new to the blob store
+    header: Optional[ImageHeader] = None  # Probed while streaming, None for cache hits
+
+
+class HttpCache:
+    """Per-URL HTTP validators (ETag, Last-Modified, Content-Length) in SQLite."""
+
+    def __init__(self, path: Union[str, Path] = HTTP_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_length INTEGER,
+                content_hash TEXT,
+                extension TEXT,
+                checked_at REAL NOT NULL DEFAULT 0,
+                partial_bytes INTEGER NOT NULL DEFAULT 0
+            )""")
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT url, etag, last_modified, content_length, content_hash,
+                          extension, checked_at, partial_bytes
+                   FROM http_cache WHERE url = ?""", (url,)).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def put(self, entry: CacheEntry) -> None:
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO http_cache
+                   (url, etag, last_modified, content_length, content_hash, extension, checked_at, partial_bytes)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (entry.url, entry.etag, entry.last_modified, entry.content_length,
+                 entry.content_hash, entry.extension, entry.checked_at, entry.partial_bytes))
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _validators_from(response: aiohttp.ClientResponse, entry: CacheEntry) -> None:
+    entry.etag = response.headers.get("ETag", entry.etag)
+    entry.last_modified = response.headers.get("Last-Modified", entry.last_modified)
+
+
+class CachedDownloader:
+    """Conditional, resumable downloads into the blob store.
+
+    * A URL checked less than `revalidate_after` seconds ago is served from
+      the store without any request.
+    * Otherwise a conditional GET (If-None-Match / If-Modified-Since) is sent
+      and a 304 reuses the stored blob, so repeat jobs only cost headers.
+    * An interrupted body is kept as `<tmp>/<sha1(url)>.part` and resumed with
+      a Range request guarded by If-Range on the next attempt, including the
+      scheduler's own retries. Downloads of the same URL run one at a time,
+      so they never write the same partial file.
+    * Finished files are committed by rename, never written in place.
+    * With `requirements`, the image header is parsed from the first bytes
+      and the transfer is dropped as soon as the image is known to fail them.
+    """
+
+    def __init__(
+        self,
+        scheduler: DownloadScheduler,
+        blob_store: Optional[BlobStore] = None,
+        cache: Optional[HttpCache] = None,
+        revalidate_after: float = HTTP_CACHE_REVALIDATE_AFTER,
+    ):
+        self.scheduler = scheduler
+        self.blob_store = blob_store or get_blob_store()
+        self.cache = cache or get_http_cache()
+        self.revalidate_after = revalidate_after
+        # Alive while some download of the URL holds or waits for it
+        self._url_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _partial_path(self, url: str) -> Path:
+        return self.blob_store.tmp_dir / f"{hashlib.sha1(url.encode()).hexdigest()}.part"
+
+    def _request_headers(self, entry: Optional[CacheEntry], cached_blob: Optional[Path], partial: Path) -> Dict[str, str]:
+        # Range offsets and the partial file are in identity bytes; a gzip'd
+        # body would make them refer to the encoded stream instead
+        headers: Dict[str, str] = {"Accept-Encoding": "identity"}
+        if entry is None:
+            return headers
+        validator = entry.etag or entry.last_modified
+        if cached_blob is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        elif partial.exists() and entry.content_length and partial.stat().st_size >= entry.content_length:
+            # Nothing left to resume, a Range request would only get a 416
+            partial.unlink()
+        elif partial.exists() and validator:
+            headers["Range"] = f"bytes={partial.stat().st_size}-"
+            headers["If-Range"] = validator
+        return headers
+
+    async def download(
+        self,
+        url: str,
+        validate: Optional[Callable[[aiohttp.ClientResponse], None]] = None,
+        postprocess: Optional[Callable[[str], Awaitable[object]]] = None,
+        requirements: Optional[ImageRequirements] = None,
+    ) -> CachedDownload:
+        """Fetch `url` into the blob store, reusing or resuming whatever is cached.
+
+        `validate` may raise to reject a response before its body is read.
+        `requirements` raises ImageRejected from the header probe; cached
+        blobs are returned without a probe, callers check those from disk.
+        """
+        lock = self._url_locks.get(url)
+        if lock is None:
+            lock = self._url_locks[url] = asyncio.Lock()
+        async with lock:
+            return await self._download(url, validate, postprocess, requirements)
+
+    async def _download(
+        self,
+        url: str,
+        validate: Optional[Callable[[aiohttp.ClientResponse], None]],
+        postprocess: Optional[Callable[[str], Awaitable[object]]],
+        requirements: Optional[ImageRequirements],
+    ) -> CachedDownload:
+        entry = self.cache.get(url)
+        cached_blob = None
+        if entry and entry.content_hash:
+            path = self.blob_store.path_for(entry.content_hash, entry.extension or "")
+            cached_blob = path if path.exists() else None
+
+        if cached_blob is not None and time.time() - entry.checked_at < self.revalidate_after:
+            return CachedDownload(cached_blob, entry.content_hash, "fresh", 0)
+
+        partial = self._partial_path(url)
+        entry = entry or CacheEntry(url=url)
+
+        def headers() -> Dict[str, str]:
+            # Rebuilt per attempt, a retry resumes from whatever the last one kept
+            return self._request_headers(entry, cached_blob, partial)
+
+        async def handle(response: aiohttp.ClientResponse) -> CachedDownload:
+            _validators_from(response, entry)
+            entry.checked_at = time.time()
+
+            if response.status == 304 and cached_blob is not None:
+                self.cache.put(entry)
+                return CachedDownload(cached_blob, entry.content_hash, "not_modified", 0)
+
+            if validate is not None:
+                validate(response)
+
+            probe = HeaderProbe(requirements) if requirements is not None else None
+
+            def reject(e: ImageRejected):
+                # Not worth resuming, and closing stops the rest of the body
+                partial.unlink(missing_ok=True)
+                response.close()
+                logger.info(f"Rejected {url} after probe: {str(e)}")
+                raise e
+
+            digest = hashlib.sha256()
+            offset = 0
+            if response.status == 206:
+                match = CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+                offset = int(match.group(1)) if match else -1
+                if offset < 0 or not partial.exists() or offset > partial.stat().st_size:
+                    partial.unlink(missing_ok=True)
+                    raise ValueError(f"Unusable partial response for {url}")
+                if match.group(3) != "*":
+                    entry.content_length = int(match.group(3))
+                # Re-hash the bytes we already have before appending
+                with open(partial, "r+b") as f:
+                    f.truncate(offset)
+                    for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(block)
+                        if probe is not None and not probe.done:
+                            try:
+                                probe.feed(block)
+                            except ImageRejected as e:
+                                reject(e)
+            else:
+                entry.content_length = response.content_length
+            entry.extension = extension_for(response.headers.get("Content-Type", ""))
+
+            transferred = 0
+            try:
+                with open(partial, "ab" if offset else "wb") as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        if probe is not None and not probe.done:
+                            probe.feed(chunk)
+                        digest.update(chunk)
+                        f.write(chunk)
+                        transferred += len(chunk)
+                if probe is not None and not probe.done:
+                    raise ImageRejected("Body ended before the image header")
+            except ImageRejected as e:
+                reject(e)
+            except BaseException:
+                # Keep what arrived so the next attempt can send a Range request
+                entry.partial_bytes = partial.stat().st_size if partial.exists() else 0
+                self.cache.put(entry)
+                raise
+
+            if probe is not None and probe.header is not None:
+                # Trust the bytes over Content-Type for the file extension
+                entry.extension = probe.header.extension
+            size = offset + transferred
+            tmp_path = str(self.blob_store.tmp_dir / f"{partial.stem}{entry.extension}")
+            os.replace(partial, tmp_path)
+            blob = await self.blob_store.commit_file(
+                tmp_path, digest.hexdigest(), entry.extension, size, postprocess)
+
+            entry.content_hash = blob.content_hash
+            entry.partial_bytes = 0
+            self.cache.put(entry)
+            self.blob_store.remember_url(url, blob.content_hash, entry.extension)
+            return CachedDownload(
+                blob.path, blob.content_hash, "resumed" if offset else "downloaded", transferred,
+                blob.created, probe.header if probe is not None else None)
+
+        return await self.scheduler.fetch(url, handle, headers=headers)
+
+
+_default_cache: Optional[HttpCache] = None
+
+
+def get_http_cache() -> HttpCache:
+    """Process-wide cache instance"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HttpCache()
+    return _default_cache
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Connection pool tuning, overridable per deployment
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "8"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+
+HTTP_TIMEOUT = aiohttp.ClientTimeout(
+    total=float(os.getenv("HTTP_TIMEOUT_TOTAL", "60")),
+    connect=float(os.getenv("HTTP_TIMEOUT_CONNECT", "10")),
+    sock_read=float(os.getenv("HTTP_TIMEOUT_SOCK_READ", "30")),
+)
+
+# API calls accept compressed bodies; image downloads override this with
+# identity (see http_cache), since images are compressed already.
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) blog-ai-tech image fetcher",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def create_connector() -> aiohttp.TCPConnector:
+    """Build the TCP connector shared by every fetcher in the tools package."""
+    return aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        use_dns_cache=True,
+        enable_cleanup_closed=True,
+    )
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared session for the running event loop, creating it on first use.
+
+    A session is bound to the loop it was created on, so a new one is opened
+    if the previous loop has gone away (e.g. a script calling asyncio.run twice).
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        if _session is not None and not _session.closed and _session_loop is not loop:
+            logger.warning("Discarding HTTP session bound to a previous event loop")
+        _session = aiohttp.ClientSession(
+            connector=create_connector(),
+            timeout=HTTP_TIMEOUT,
+            headers=DEFAULT_HEADERS,
+        )
+        _session_loop = loop
+        logger.info(
+            f"Opened shared HTTP session (limit={HTTP_POOL_LIMIT}, per_host={HTTP_POOL_LIMIT_PER_HOST})")
+    return _session
+
+
+async def close_session() -> None:
+    """Close the shared session and its connection pool. Safe to call repeatedly."""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("Closed shared HTTP session")
+    _session = None
+    _session_loop = None
+
+
+# ------------------------------
+# FastAPI lifecycle
+# ------------------------------
+
+def register_fastapi(app) -> None:
+    """Open the pool on FastAPI startup and drain it on shutdown."""
+    async def _startup():
+        await get_session()
+
+    app.add_event_handler("startup", _startup)
+    app.add_event_handler("shutdown", close_session)
+
+
+# ------------------------------
+# Celery worker lifecycle
+# ------------------------------
+# Each Celery worker process keeps one event loop alive across tasks so the
+# shared session (and its keep-alive connections) survive between tasks.
+
+def init_worker_loop(**kwargs) -> None:
+    """`worker_process_init` hook: create the per-process event loop."""
+    global _worker_loop
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+
+def shutdown_worker_loop(**kwargs) -> None:
+    """`worker_process_shutdown` hook: close the session and the loop."""
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        return
+    _worker_loop.run_until_complete(close_session())
+    _worker_loop.close()
+    _worker_loop = None
+
+
+def run_async(coro: Awaitable[Any]) -> Any:
+    """Run a coroutine from synchronous code (Celery tasks) on the worker loop."""
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        init_worker_loop()
+    return _worker_loop.run_until_complete(coro)
@@ -4,6 +4,8 @@ from PIL import Image
 import os
 import requests
 import shutil
+from image_metadata import strip_metadata_file
+from image_probe import probe_file
 
 class ImageSEOProcessor:
     def __init__(self, east_model_path, conf_threshold=0.5, nms_threshold=0.4):
@@ -99,17 +101,13 @@ class ImageSEOProcessor:
 
     def remove_metadata(self, image_path, output_path):
         """
-        Remove metadata (e.g. EXIF data) from an image.
+        Remove metadata (EXIF, XMP, IPTC, ICC) from an image.
+        JPEG/PNG/WebP are rewritten at the container level without decoding pixels.
         :param image_path: Input image file.
         :param output_path: Output image file (without metadata).
         :return: Path to the saved image.
         """
-        image = Image.open(image_path)
-        data = list(image.getdata())
-        image_no_meta = Image.new(image.mode, image.size)
-        image_no_meta.putdata(data)
-        image_no_meta.save(output_path)
-        return output_path
+        return strip_metadata_file(image_path, output_path)
 
     def check_orientation_and_size(self, image_path, min_width=800, min_height=600, output_folder=None):
         """
@@ -121,15 +119,15 @@ class ImageSEOProcessor:
         :param output_folder: Folder where qualifying images are saved.
         :return: True if conditions are met, False otherwise.
         """
-        image = Image.open(image_path)
-        width, height = image.size
-        is_horizontal = width >= height
-        meets_size = width >= min_width and height >= min_height
+        # Only the header is read; qualifying files are copied, not re-encoded
+        header = probe_file(image_path)
+        is_horizontal = header.width >= header.height
+        meets_size = header.width >= min_width and header.height >= min_height
         if is_horizontal and meets_size:
             if output_folder:
                 os.makedirs(output_folder, exist_ok=True)
                 dest_path = os.path.join(output_folder, os.path.basename(image_path))
-                image.save(dest_path)
+                shutil.copyfile(image_path, dest_path)
             return True
         return False
 
@@ -0,0 +1,247 @@
+import asyncio
+import io
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, Optional
+
+from PIL import Image
+
+from executor_pool import LazyExecutor
+
+logger = logging.getLogger(__name__)
+
+# Strip work is mostly file I/O, a couple of workers keep it off the event loop.
+STRIP_WORKERS = int(os.getenv("METADATA_STRIP_WORKERS", "2"))
+COPY_BUFFER_SIZE = 1024 * 64
+
+JPEG_SOI = b"\xff\xd8"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# APP0 (JFIF) and APP14 (Adobe colour transform) are needed to decode the
+# image correctly, every other APPn segment and COM carry metadata only
+# (APP1 = EXIF/XMP, APP2 = ICC, APP13 = IPTC/Photoshop).
+JPEG_KEEP_APP_MARKERS = {0xE0, 0xEE}
+JPEG_COM_MARKER = 0xFE
+JPEG_SOS_MARKER = 0xDA
+# Markers that are not followed by a length field.
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8, *range(0xD0, 0xD8)}
+
+PNG_METADATA_CHUNKS = {b"eXIf", b"tEXt", b"zTXt", b"iTXt", b"iCCP", b"tIME"}
+
+WEBP_METADATA_CHUNKS = {b"EXIF", b"XMP ", b"ICCP"}
+# VP8X feature flags announcing ICC (0x20), EXIF (0x08) and XMP (0x04) chunks.
+WEBP_METADATA_FLAGS = 0x20 | 0x08 | 0x04
+
+# Process pool shared by all strip calls, created on first use
+_process_pool = LazyExecutor(STRIP_WORKERS)
+
+
+class MetadataStripError(Exception):
+    """Raised when a container cannot be parsed for metadata removal"""
+    pass
+
+
+def _read_exact(src: BinaryIO, size: int) -> bytes:
+    data = src.read(size)
+    if len(data) != size:
+        raise MetadataStripError("Unexpected end of file")
+    return data
+
+
+def _strip_jpeg(src: BinaryIO, dst: BinaryIO) -> None:
+    """Copy JPEG markers, dropping metadata segments, without decoding."""
+    if src.read(2) != JPEG_SOI:
+        raise MetadataStripError("Missing JPEG SOI marker")
+    dst.write(JPEG_SOI)
+
+    while True:
+        byte = _read_exact(src, 1)
+        if byte != b"\xff":
+            raise MetadataStripError("Invalid JPEG marker")
+        marker = _read_exact(src, 1)[0]
+        # Skip fill bytes between markers
+        while marker == 0xFF:
+            marker = _read_exact(src, 1)[0]
+
+        if marker in JPEG_STANDALONE_MARKERS:
+            dst.write(bytes((0xFF, marker)))
+            continue
+        if marker == 0xD9:
+            dst.write(b"\xff\xd9")
+            return
+
+        length_bytes = _read_exact(src, 2)
+        length = struct.unpack(">H", length_bytes)[0]
+        if length < 2:
+            raise MetadataStripError("Invalid JPEG segment length")
+
+        is_metadata = (0xE0 <= marker <= 0xEF and marker not in JPEG_KEEP_APP_MARKERS) \
+            or marker == JPEG_COM_MARKER
+        if is_metadata:
+            src.seek(length - 2, io.SEEK_CUR)
+            continue
+
+        dst.write(bytes((0xFF, marker)))
+        dst.write(length_bytes)
+        dst.write(_read_exact(src, length - 2))
+
+        if marker == JPEG_SOS_MARKER:
+            # Entropy-coded data and everything after it is copied verbatim.
+            shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            return
+
+
+def _strip_png(src: BinaryIO, dst: BinaryIO) -> None:
+    """Copy PNG chunks, dropping text, EXIF, ICC and time chunks."""
+    if src.read(8) != PNG_SIGNATURE:
+        raise MetadataStripError("Missing PNG signature")
+    dst.write(PNG_SIGNATURE)
+
+    while True:
+        header = src.read(8)
+        if not header:
+            return
+        if len(header) != 8:
+            raise MetadataStripError("Truncated PNG chunk header")
+        length, chunk_type = struct.unpack(">I4s", header)
+
+        # Chunk data plus its 4 byte CRC
+        if chunk_type in PNG_METADATA_CHUNKS:
+            src.seek(length + 4, io.SEEK_CUR)
+            continue
+
+        dst.write(header)
+        remaining = length + 4
+        while remaining:
+            block = _read_exact(src, min(remaining, COPY_BUFFER_SIZE))
+            dst.write(block)
+            remaining -= len(block)
+
+        if chunk_type == b"IEND":
+            return
+
+
+def _strip_webp(src: BinaryIO, dst: BinaryIO) -> None:
+    """Copy RIFF/WebP chunks, dropping EXIF, XMP and ICCP and fixing VP8X flags."""
+    riff, _, webp = struct.unpack("<4sI4s", _read_exact(src, 12))
+    if riff != b"RIFF" or webp != b"WEBP":
+        raise MetadataStripError("Missing RIFF/WEBP header")
+
+    start = dst.tell()
+    # RIFF size is patched once the kept chunks are known.
+    dst.write(struct.pack("<4sI4s", b"RIFF", 0, b"WEBP"))
+    written = 4
+
+    while True:
+        header = src.read(8)
+        if not header:
+            break
+        if len(header) != 8:
+            raise MetadataStripError("Truncated WebP chunk header")
+        fourcc, size = struct.unpack("<4sI", header)
+        padded = size + (size & 1)
+
+        if fourcc in WEBP_METADATA_CHUNKS:
+            src.seek(padded, io.SEEK_CUR)
+            continue
+
+        payload = _read_exact(src, padded)
+        if fourcc == b"VP8X" and payload:
+            payload = bytes((payload[0] & ~WEBP_METADATA_FLAGS & 0xFF,)) + payload[1:]
+        dst.write(header)
+        dst.write(payload)
+        written += 8 + padded
+
+    end = dst.tell()
+    dst.seek(start + 4)
+    dst.write(struct.pack("<I", written))
+    dst.seek(end)
+
+
+def _strip_with_pillow(src: BinaryIO, dst: BinaryIO) -> None:
+    """Fallback for formats without a container-level stripper.
+
+    Pixels are copied as one raw buffer instead of a tuple per pixel.
+    """
+    with Image.open(src) as img:
+        if getattr(img, "is_animated", False):
+            # Re-encoding would flatten the animation, keep the original bytes.
+            src.seek(0)
+            shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            return
+        image_format = img.format
+        clean = Image.frombytes(img.mode, img.size, img.tobytes())
+        if img.mode == "P" and img.getpalette():
+            clean.putpalette(img.getpalette())
+        clean.save(dst, format=image_format)
+
+
+def _detect_stripper(head: bytes):
+    if head.startswith(JPEG_SOI):
+        return _strip_jpeg
+    if head.startswith(PNG_SIGNATURE):
+        return _strip_png
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _strip_webp
+    return _strip_with_pillow
+
+
+def strip_metadata_stream(src: BinaryIO, dst: BinaryIO) -> None:
+    """Write `src` to `dst` without EXIF, XMP, IPTC and ICC metadata.
+
+    `dst` must be seekable (WebP needs its RIFF size patched).
+    """
+    head = src.read(12)
+    src.seek(0)
+    stripper = _detect_stripper(head)
+    try:
+        stripper(src, dst)
+    except MetadataStripError:
+        if stripper is _strip_with_pillow:
+            raise
+        logger.warning("Container parse failed, falling back to Pillow")
+        src.seek(0)
+        dst.seek(0)
+        dst.truncate()
+        _strip_with_pillow(src, dst)
+
+
+def strip_metadata_bytes(data: bytes) -> bytes:
+    """Return a copy of the encoded image in `data` without metadata."""
+    out = io.BytesIO()
+    strip_metadata_stream(io.BytesIO(data), out)
+    return out.getvalue()
+
+
+def strip_metadata_file(image_path: str, output_path: Optional[str] = None) -> str:
+    """Remove metadata from `image_path`, in place unless `output_path` is given.
+
+    The result is written to a temporary file next to the target and renamed
+    over it, so a failure never leaves a half-written image behind.
+    """
+    output_path = output_path or image_path
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    try:
+        with open(image_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            strip_metadata_stream(src, dst)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_path
+
+
+get_process_pool = _process_pool.get
+shutdown_process_pool = _process_pool.shutdown
+
+
+async def strip_metadata_async(image_path: str, output_path: Optional[str] = None) -> str:
+    """Run `strip_metadata_file` in the process pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_process_pool(), strip_metadata_file, image_path, output_path)
@@ -0,0 +1,279 @@
+import os
+import struct
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image
+
+# Enough for PNG/WebP/GIF and for most JPEGs; large EXIF/ICC blocks push the
+# JPEG frame header further, so the probe keeps reading up to PROBE_MAX_BYTES.
+PROBE_BYTES = 16 * 1024
+PROBE_MAX_BYTES = int(os.getenv("PROBE_MAX_BYTES", str(256 * 1024)))
+
+FORMAT_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "GIF": ".gif",
+    "BMP": ".bmp",
+}
+
+# SOFn markers carrying frame dimensions (C4 DHT, C8 JPG and CC DAC are not frames)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+
+
+class ImageRejected(ValueError):
+    """Raised when an image header fails the requested size or orientation."""
+
+
+class UnknownImageFormat(ImageRejected):
+    """Raised for a signature the header parsers don't know (AVIF, TIFF, SVG...)."""
+
+
+@dataclass(frozen=True)
+class ImageHeader:
+    format: str
+    width: int
+    height: int
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS.get(self.format, ".jpg")
+
+    @property
+    def orientation(self) -> str:
+        if self.width > self.height:
+            return "landscape"
+        if self.width < self.height:
+            return "portrait"
+        return "square"
+
+
+# ------------------------------
+# Header parsers
+# ------------------------------
+
+def _exif_orientation(segment: bytes) -> int:
+    """Read the Orientation tag (0x0112) from an APP1 Exif payload."""
+    if not segment.startswith(b"Exif\x00\x00") or len(segment) < 14:
+        return 1
+    tiff = segment[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None:
+        return 1
+    try:
+        ifd_offset = struct.unpack(endian + "I", tiff[4:8])[0]
+        count = struct.unpack(endian + "H", tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            tag, _, _, value = struct.unpack(endian + "HHIH", tiff[entry:entry + 10])
+            if tag == 0x0112:
+                return value
+    except struct.error:
+        pass
+    return 1
+
+
+def _parse_jpeg(data: bytes) -> Optional[ImageHeader]:
+    orientation = 1
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ImageRejected("Corrupt JPEG marker stream")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            pos += 2
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            if orientation >= 5:
+                # Rotated 90/270 degrees on display
+                width, height = height, width
+            return ImageHeader("JPEG", width, height)
+        if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+            # APP1 also carries XMP, only the Exif segment holds the orientation
+            if pos + 2 + length > len(data):
+                return None
+            orientation = _exif_orientation(data[pos + 4:pos + 2 + length])
+        if marker == 0xDA:
+            raise ImageRejected("JPEG scan started before a frame header")
+        pos += 2 + length
+    return None
+
+
+def _parse_png(data: bytes) -> Optional[ImageHeader]:
+    if len(data) < 24:
+        return None
+    if data[12:16] != b"IHDR":
+        raise ImageRejected("PNG without IHDR")
+    width, height = struct.unpack(">II", data[16:24])
+    return ImageHeader("PNG", width, height)
+
+
+def _parse_webp(data: bytes) -> Optional[ImageHeader]:
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        # Keyframe start code then 14-bit width/height
+        if data[23:26] != b"\x9d\x01\x2a":
+            raise ImageRejected("Corrupt VP8 frame header")
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageHeader("WEBP", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L":
+        if data[20] != 0x2F:
+            raise ImageRejected("Corrupt VP8L header")
+        bits = int.from_bytes(data[21:25], "little")
+        return ImageHeader("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return ImageHeader("WEBP", width, height)
+    raise ImageRejected(f"Unknown WebP chunk {chunk!r}")
+
+
+def parse_image_header(data: bytes) -> Optional[ImageHeader]:
+    """Return the format and display size from the leading bytes of an image.
+
+    Returns None when `data` is too short to decide yet. Raises ImageRejected
+    for bytes that are not a supported image at all.
+    """
+    if len(data) < 12:
+        return None
+    if data[:3] == b"\xff\xd8\xff":
+        return _parse_jpeg(data)
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return _parse_png(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _parse_webp(data)
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageHeader("GIF", width, height)
+    if data[:2] == b"BM":
+        if len(data) < 26:
+            return None
+        width, height = struct.unpack("<ii", data[18:26])
+        return ImageHeader("BMP", width, abs(height))
+    raise UnknownImageFormat("Unrecognised image signature")
+
+
+def probe_file(path: str) -> ImageHeader:
+    """Header of an image on disk, falling back to Pillow for other formats."""
+    with open(path, "rb") as f:
+        data = f.read(PROBE_BYTES)
+        try:
+            header = parse_image_header(data)
+            while header is None and len(data) < PROBE_MAX_BYTES:
+                more = f.read(PROBE_BYTES)
+                if not more:
+                    break
+                data += more
+                header = parse_image_header(data)
+        except ImageRejected:
+            header = None
+    if header is not None:
+        return header
+    with Image.open(path) as img:
+        return ImageHeader(img.format or "", img.size[0], img.size[1])
+
+
+# ------------------------------
+# Requirements
+# ------------------------------
+
+_ORIENTATION_ALIASES = {
+    "vertical": "portrait",
+    "portrait": "portrait",
+    "horizontal": "landscape",
+    "landscape": "landscape",
+    "square": "square",
+}
+
+
+@dataclass(frozen=True)
+class ImageRequirements:
+    """Size/orientation filter checked against a probed header."""
+    min_width: int = 0
+    min_height: int = 0
+    orientation: Optional[str] = None  # "portrait", "landscape" or "square"
+    exact_sizes: Tuple[Tuple[int, int], ...] = ()
+
+    @property
+    def constrained(self) -> bool:
+        """False when any image passes, whatever its format or size."""
+        return bool(self.min_width or self.min_height or self.orientation or self.exact_sizes)
+
+    @classmethod
+    def from_params(cls, params: dict) -> "ImageRequirements":
+        """Build from task params (`orientation`, `min_width`, `min_height`, `exact_sizes`)."""
+        orientation = params.get("orientation")
+        return cls(
+            min_width=int(params.get("min_width", 0)),
+            min_height=int(params.get("min_height", 0)),
+            orientation=_ORIENTATION_ALIASES.get(orientation.lower()) if orientation else None,
+            exact_sizes=tuple(tuple(size) for size in params.get("exact_sizes", ())),
+        )
+
+    @classmethod
+    def for_sizes(cls, sizes: Iterable[Tuple[int, int]]) -> "ImageRequirements":
+        return cls(exact_sizes=tuple(tuple(size) for size in sizes))
+
+    def check(self, header: ImageHeader) -> None:
+        if header.width < self.min_width or header.height < self.min_height:
+            raise ImageRejected(
+                f"{header.width}x{header.height} smaller than {self.min_width}x{self.min_height}")
+        if self.orientation and header.orientation != self.orientation:
+            raise ImageRejected(f"{header.orientation} image, {self.orientation} required")
+        if self.exact_sizes and (header.width, header.height) not in self.exact_sizes:
+            raise ImageRejected(f"{header.width}x{header.height} matches no target size")
+
+
+class HeaderProbe:
+    """Incremental header check fed with the first chunks of a download.
+
+    `feed()` returns True once the header has been parsed and accepted, and
+    raises ImageRejected as soon as the image is known to be unwanted, so the
+    caller can drop the connection before the rest of the body arrives.
+    Without constraints a format the parsers don't know is let through with
+    `header` left as None, for the caller to read from disk.
+    """
+
+    def __init__(self, requirements: Optional[ImageRequirements] = None, max_bytes: int = PROBE_MAX_BYTES):
+        self.requirements = requirements or ImageRequirements()
+        self.max_bytes = max_bytes
+        self.header: Optional[ImageHeader] = None
+        self._buffer = bytearray()
+        self.skipped = False
+
+    @property
+    def done(self) -> bool:
+        return self.header is not None or self.skipped
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.done:
+            return True
+        self._buffer += chunk
+        try:
+            header = parse_image_header(bytes(self._buffer))
+            if header is None and len(self._buffer) >= self.max_bytes:
+                raise UnknownImageFormat(f"No image header within {self.max_bytes} bytes")
+        except UnknownImageFormat:
+            if self.requirements.constrained:
+                raise
+            self.skipped = True
+            self._buffer = bytearray()
+            return True
+        if header is None:
+            return False
+        self.requirements.check(header)
+        self.header = header
+        self._buffer = bytearray()
+        return True
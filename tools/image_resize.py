@@ -0,0 +1,275 @@
+import asyncio
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy
+from PIL import Image, ImageOps
+
+from executor_pool import LazyExecutor
+
+RESIZE_WORKERS = int(os.getenv("RESIZE_WORKERS", str(os.cpu_count() or 2)))
+RESIZE_QUALITY = int(os.getenv("RESIZE_QUALITY", "85"))
+# Only shrink the intermediate when the next variant is at least this much smaller
+CHAIN_STEP = 1.5
+# Memory per process for fitted slides reused across renders
+FIT_CACHE_MB = int(os.getenv("FIT_CACHE_MB", "512"))
+
+Size = Tuple[int, int]
+Box = Tuple[float, float, float, float]
+
+# Process pool shared by all resize calls, created on first use
+_process_pool = LazyExecutor(RESIZE_WORKERS)
+
+
+def cover_scale(source: Size, target: Size) -> float:
+    """Scale at which `source` just covers `target` on both axes."""
+    return max(target[0] / source[0], target[1] / source[1])
+
+
+def cover_box(source: Size, target: Size, centering: Tuple[float, float] = (0.5, 0.5)) -> Box:
+    """Largest crop of `source` with the aspect ratio of `target`."""
+    src_w, src_h = source
+    target_ratio = target[0] / target[1]
+    if src_w / src_h > target_ratio:
+        crop_w, crop_h = src_h * target_ratio, float(src_h)
+    else:
+        crop_w, crop_h = float(src_w), src_w / target_ratio
+    left = (src_w - crop_w) * centering[0]
+    top = (src_h - crop_h) * centering[1]
+    return left, top, left + crop_w, top + crop_h
+
+
+def _open_for(data: bytes, sizes: Dict[str, Size]) -> Image.Image:
+    """Decode once, at the smallest JPEG scale that still covers every variant."""
+    image = Image.open(io.BytesIO(data))
+    if image.format == "JPEG":
+        stored = image.size
+        if image.getexif().get(0x0112, 1) >= 5:
+            # Rotated on display, compare against the displayed size
+            stored = stored[1], stored[0]
+        scale = max(cover_scale(stored, size) for size in sizes.values())
+        if scale < 1:
+            image.draft("RGB", (math.ceil(image.size[0] * scale), math.ceil(image.size[1] * scale)))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    return image
+
+
+def render_variants(
+    data: bytes,
+    sizes: Dict[str, Size],
+    quality: int = RESIZE_QUALITY,
+    centering: Tuple[float, float] = (0.5, 0.5),
+) -> Dict[str, bytes]:
+    """Encode a cover-cropped JPEG for every `name -> (width, height)` in `sizes`.
+
+    The source is decoded once (JPEG via draft() at reduced scale). Variants
+    are produced largest first, and the uncropped frame is shrunk along the
+    way so each variant is resampled from the previous intermediate instead
+    of the full decode.
+    """
+    if not sizes:
+        return {}
+    image = _open_for(data, sizes)
+    original = image.size
+    ordered = sorted(sizes.items(), key=lambda item: cover_scale(original, item[1]), reverse=True)
+
+    variants: Dict[str, bytes] = {}
+    frame = image
+    for name, size in ordered:
+        scale = cover_scale(original, size)
+        frame_size = (max(1, round(original[0] * scale)), max(1, round(original[1] * scale)))
+        if frame.size[0] >= frame_size[0] * CHAIN_STEP:
+            frame = frame.resize(frame_size, Image.LANCZOS, reducing_gap=3.0)
+        resized = frame.resize(size, Image.LANCZOS, box=cover_box(frame.size, size, centering), reducing_gap=3.0)
+        buffer = io.BytesIO()
+        resized.save(buffer, "JPEG", quality=quality, optimize=True)
+        variants[name] = buffer.getvalue()
+    return variants
+
+
+def fit_image(
+    image: Union[str, os.PathLike, bytes, Image.Image, numpy.ndarray],
+    size: Size,
+    mode: str = "cover",
+    background: Tuple[int, int, int] = (0, 0, 0),
+    zoom: float = 1.0,
+    centering: Tuple[float, float] = (0.5, 0.5),
+) -> numpy.ndarray:
+    """Resample `image` once onto an exact `size` canvas and return RGB pixels.
+
+    "cover" crops to fill the canvas (`zoom` > 1 crops tighter around the
+    centre), "contain" fits the whole image and letterboxes it on
+    `background`. Paths and bytes are decoded at reduced JPEG scale.
+    """
+    if mode not in ("cover", "contain"):
+        raise ValueError(f"Unknown fit mode {mode!r}")
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            image = f.read()
+    if isinstance(image, bytes):
+        # Covering scale is never below the contain scale, so it suits both modes
+        scale = max(zoom, 1.0)
+        image = _open_for(image, {"fit": (math.ceil(size[0] * scale), math.ceil(size[1] * scale))})
+    elif isinstance(image, numpy.ndarray):
+        image = Image.fromarray(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if mode == "cover":
+        left, top, right, bottom = cover_box(image.size, size, centering)
+        if zoom > 1:
+            inset_w = (right - left) * (1 - 1 / zoom) / 2
+            inset_h = (bottom - top) * (1 - 1 / zoom) / 2
+            left, top, right, bottom = left + inset_w, top + inset_h, right - inset_w, bottom - inset_h
+        return numpy.asarray(image.resize(size, Image.LANCZOS, box=(left, top, right, bottom), reducing_gap=3.0))
+
+    scale = min(size[0] / image.size[0], size[1] / image.size[1])
+    inner = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+    canvas = Image.new("RGB", size, tuple(background))
+    canvas.paste(
+        image.resize(inner, Image.LANCZOS, reducing_gap=3.0),
+        ((size[0] - inner[0]) // 2, (size[1] - inner[1]) // 2),
+    )
+    return numpy.asarray(canvas)
+
+
+def fitted_clip(image, size: Size, duration: float, mode: str = "cover", background: Tuple[int, int, int] = (0, 0, 0), zoom: float = 1.0):
+    """Constant-frame moviepy clip of `image` already fitted to `size`.
+
+    Every frame is the same array, so compositing it costs a copy, not a resize.
+    """
+    from moviepy import ImageClip
+    return ImageClip(fit_image(image, size, mode, background, zoom)).with_duration(duration)
+
+
+class ImageCache:
+    """LRU of decoded/fitted images bounded by total bytes, safe across threads.
+
+    Values are shared between callers, so arrays are stored read-only.
+    """
+
+    def __init__(self, max_bytes: int = FIT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[object, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, load: Callable[[], object], nbytes: Callable[[object], int]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = load()
+        size = nbytes(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.bytes -= evicted
+        return value
+
+    def contains(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+
+fit_cache = ImageCache()
+
+
+def file_key(path: Union[str, os.PathLike]) -> Tuple[str, int]:
+    """Cache key part that changes when the file at `path` is replaced."""
+    return str(path), os.stat(path).st_mtime_ns
+
+
+Fit = Tuple[Size, str, Tuple[int, int, int]]
+
+
+def _fit_key(path, size: Size, mode: str, background) -> Tuple:
+    return ("fit", *file_key(path), tuple(size), mode, tuple(background))
+
+
+def cached_fit_image(
+    path: Union[str, os.PathLike],
+    size: Size,
+    mode: str = "cover",
+    background: Tuple[int, int, int] = (0, 0, 0),
+) -> numpy.ndarray:
+    """`fit_image` of a file, decoded and resampled once per size in this process."""
+    return fit_cache.get_or_load(
+        _fit_key(path, size, mode, background),
+        lambda: _read_only(fit_image(path, size, mode, background)),
+        lambda pixels: pixels.nbytes,
+    )
+
+
+def cache_fits(path: Union[str, os.PathLike], fits: List[Fit]) -> int:
+    """Put every `(size, mode, background)` fit of `path` in the fit cache from one decode.
+
+    The file is decoded once, at the smallest JPEG scale that covers the
+    largest size. Fits are made largest first, shrinking the decode along
+    the way as `render_variants` does, so smaller canvases resample from an
+    intermediate instead of the full image. Returns how many fits were made.
+    """
+    missing = [fit for fit in dict.fromkeys(fits) if not fit_cache.contains(_fit_key(path, *fit))]
+    if not missing:
+        return 0
+    with open(path, "rb") as f:
+        image = _open_for(f.read(), {str(i): size for i, (size, _, _) in enumerate(missing)})
+    original = image.size
+
+    def scale(fit: Fit) -> float:
+        size, mode, _ = fit
+        return cover_scale(original, size) if mode == "cover" else min(size[0] / original[0], size[1] / original[1])
+
+    frame = image
+    for fit in sorted(missing, key=scale, reverse=True):
+        frame_size = (max(1, round(original[0] * scale(fit))), max(1, round(original[1] * scale(fit))))
+        if frame.size[0] >= frame_size[0] * CHAIN_STEP:
+            frame = frame.resize(frame_size, Image.LANCZOS, reducing_gap=3.0)
+        fit_cache.get_or_load(
+            _fit_key(path, *fit),
+            lambda: _read_only(fit_image(frame, *fit)),
+            lambda pixels: pixels.nbytes,
+        )
+    return len(missing)
+
+
+def _read_only(pixels: numpy.ndarray) -> numpy.ndarray:
+    pixels.setflags(write=False)
+    return pixels
+
+
+get_process_pool = _process_pool.get
+shutdown_process_pool = _process_pool.shutdown
+
+
+async def render_variants_async(
+    data: bytes, sizes: Dict[str, Size], quality: int = RESIZE_QUALITY
+) -> Dict[str, bytes]:
+    """Run `render_variants` in the process pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), render_variants, data, sizes, quality)
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from image_probe import ImageHeader
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+
+_DONE = object()
+
+
+@dataclass
+class IngestItem:
+    """One search result travelling through the pipeline"""
+    position: int
+    result: dict
+    url: str = ""
+    path: Optional[Path] = None
+    content_hash: Optional[str] = None
+    fetch_status: Optional[str] = None  # CachedDownload.status
+    created: bool = False
+    header: Optional[ImageHeader] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    image_format: Optional[str] = None
+    stored_path: Optional[str] = None
+
+
+StageFunc = Callable[[Any], Awaitable[Optional[Any]]]
+
+
+@dataclass
+class Stage:
+    """A pipeline step run by `workers` concurrent coroutines.
+
+    `func` returns the (possibly updated) item to pass on, or None to drop it.
+    """
+    name: str
+    func: StageFunc
+    workers: int = 1
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+@dataclass
+class PipelineResult:
+    items: List[Any] = field(default_factory=list)
+    produced: int = 0
+    elapsed: float = 0.0
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+class Pipeline:
+    """Chain of stages connected by bounded asyncio queues.
+
+    Each queue holds at most `queue_size` items, so a slow stage pushes back
+    on the ones before it and memory stays flat however large the source is.
+    Items that reach the end are collected unless `collect` is False.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = PIPELINE_QUEUE_SIZE, collect: bool = True):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.collect = collect
+
+    async def _feed(self, source: AsyncIterator[Any], out_queue: asyncio.Queue) -> int:
+        produced = 0
+        try:
+            async for item in source:
+                await out_queue.put(item)
+                produced += 1
+        finally:
+            await out_queue.put(_DONE)
+        return produced
+
+    async def _run_stage(self, stage: Stage, in_queue: asyncio.Queue, out_queue: asyncio.Queue) -> None:
+        async def worker():
+            while True:
+                item = await in_queue.get()
+                if item is _DONE:
+                    # Let sibling workers see the end marker too
+                    await in_queue.put(_DONE)
+                    return
+                started = time.monotonic()
+                try:
+                    result = await stage.func(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    stage.failed += 1
+                    logger.warning(f"Stage '{stage.name}' failed: {str(e)}")
+                    continue
+                finally:
+                    stage.busy_seconds += time.monotonic() - started
+                if result is None:
+                    stage.dropped += 1
+                    continue
+                stage.processed += 1
+                await out_queue.put(result)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(stage.workers)))
+        finally:
+            await out_queue.put(_DONE)
+
+    async def _drain(self, in_queue: asyncio.Queue, items: List[Any]) -> None:
+        while True:
+            item = await in_queue.get()
+            if item is _DONE:
+                return
+            if self.collect:
+                items.append(item)
+
+    async def run(self, source: AsyncIterator[Any]) -> PipelineResult:
+        started = time.monotonic()
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        result = PipelineResult()
+
+        feeder = asyncio.create_task(self._feed(source, queues[0]))
+        runners = [
+            asyncio.create_task(self._run_stage(stage, queues[i], queues[i + 1]))
+            for i, stage in enumerate(self.stages)
+        ]
+        drainer = asyncio.create_task(self._drain(queues[-1], result.items))
+        tasks = [feeder, *runners, drainer]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        result.produced = feeder.result()
+        result.elapsed = time.monotonic() - started
+        result.stages = {stage.name: stage.snapshot() for stage in self.stages}
+        return result
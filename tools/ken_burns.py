@@ -0,0 +1,238 @@
+"""
+Ken Burns zoom/pan rendered from one crop rectangle per frame
+"""
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy
+from PIL import Image
+
+from image_resize import cover_box
+
+try:
+    import cv2
+except ImportError:  # NumPy fallback below
+    cv2 = None
+
+Size = Tuple[int, int]
+Point = Tuple[float, float]
+
+KEN_BURNS_FPS = int(os.getenv("KEN_BURNS_FPS", "30"))
+
+EASINGS = {
+    "linear": lambda p: p,
+    # Smoothstep: starts and stops without a jump in speed
+    "ease": lambda p: p * p * (3 - 2 * p),
+}
+
+
+@dataclass(frozen=True)
+class Motion:
+    """Zoom and pan over the life of a clip.
+
+    Zoom is relative to the largest crop with the output aspect ratio (1.0
+    shows that whole crop, 1.2 shows 1/1.2 of it). Pan positions are where
+    the crop sits inside the room left around it, from (0, 0) top left to
+    (1, 1) bottom right.
+    """
+    zoom_start: float = 1.0
+    zoom_end: float = 1.0
+    pan_start: Point = (0.5, 0.5)
+    pan_end: Point = (0.5, 0.5)
+    easing: str = "linear"
+
+    @classmethod
+    def zoom_in(cls, ratio: float, duration: float) -> "Motion":
+        """Same path as the old effect: scale 1 + ratio * t, centred."""
+        return cls(1.0, 1.0 + ratio * duration)
+
+    @classmethod
+    def zoom_out(cls, ratio: float, duration: float) -> "Motion":
+        return cls(1.0 + ratio * duration, 1.0)
+
+    @classmethod
+    def pan(cls, start: Point, end: Point, zoom: float = 1.1) -> "Motion":
+        return cls(zoom, zoom, start, end, "ease")
+
+
+def crop_rects(source: Size, size: Size, motion: Motion, duration: float, fps: int = KEN_BURNS_FPS) -> numpy.ndarray:
+    """Source rectangles `(x, y, w, h)` for frames 0..duration*fps, as floats.
+
+    Everything is computed in one vectorised pass; there is one row past the
+    last frame so any `t` up to `duration` can be interpolated.
+    """
+    count = max(1, math.ceil(duration * fps)) + 1
+    progress = numpy.clip(numpy.arange(count) / max(duration * fps, 1e-9), 0.0, 1.0)
+    progress = EASINGS[motion.easing](progress)
+
+    left, top, right, bottom = cover_box(source, size)
+    base_w, base_h = right - left, bottom - top
+    zoom = motion.zoom_start + (motion.zoom_end - motion.zoom_start) * progress
+    width = base_w / zoom
+    height = base_h / zoom
+    pan_x = motion.pan_start[0] + (motion.pan_end[0] - motion.pan_start[0]) * progress
+    pan_y = motion.pan_start[1] + (motion.pan_end[1] - motion.pan_start[1]) * progress
+    x = (source[0] - width) * pan_x
+    y = (source[1] - height) * pan_y
+    return numpy.stack([x, y, width, height], axis=1)
+
+
+def _resample_numpy(source: numpy.ndarray, rect, size: Size) -> numpy.ndarray:
+    """Bilinear crop-and-scale with separable gathers, for when cv2 is missing."""
+    x, y, w, h = rect
+    out_w, out_h = size
+    src_h, src_w = source.shape[:2]
+    xs = numpy.clip(x + (numpy.arange(out_w) + 0.5) * (w / out_w) - 0.5, 0, src_w - 1)
+    ys = numpy.clip(y + (numpy.arange(out_h) + 0.5) * (h / out_h) - 0.5, 0, src_h - 1)
+    x0 = numpy.minimum(xs.astype(numpy.int32), src_w - 2 if src_w > 1 else 0)
+    y0 = numpy.minimum(ys.astype(numpy.int32), src_h - 2 if src_h > 1 else 0)
+    fx = (xs - x0).astype(numpy.float32)[None, :, None]
+    fy = (ys - y0).astype(numpy.float32)[:, None, None]
+    x1 = numpy.minimum(x0 + 1, src_w - 1)
+    y1 = numpy.minimum(y0 + 1, src_h - 1)
+
+    top = source[y0].astype(numpy.float32)
+    bottom = source[y1].astype(numpy.float32)
+    rows = top + (bottom - top) * fy
+    left = rows[:, x0]
+    frame = left + (rows[:, x1] - left) * fx
+    return (frame + 0.5).astype(numpy.uint8)
+
+
+class KenBurns:
+    """Renders a moving crop of one still image.
+
+    The source is scaled down once so the tightest crop is about output size
+    (INTER_AREA, so no aliasing); every frame is then a single bilinear
+    resample of that base through an affine map, instead of an upscale,
+    crop and downscale of the full frame.
+    """
+
+    def __init__(self, image, size: Size, motion: Motion, duration: float, fps: int = KEN_BURNS_FPS):
+        source = numpy.asarray(image)
+        if source.ndim == 2:
+            source = numpy.repeat(source[:, :, None], 3, axis=2)
+        elif source.shape[2] == 4:
+            source = source[:, :, :3]
+        self.size = tuple(size)
+        self.duration = duration
+        self.fps = fps
+
+        rects = crop_rects((source.shape[1], source.shape[0]), self.size, motion, duration, fps)
+        tightest = rects[:, 2].min()
+        scale = self.size[0] / tightest
+        if scale < 1:
+            new_size = (max(1, round(source.shape[1] * scale)), max(1, round(source.shape[0] * scale)))
+            # Rounding makes the two axes scale slightly differently
+            factors = numpy.array([new_size[0] / source.shape[1], new_size[1] / source.shape[0]] * 2)
+            if cv2 is not None:
+                source = cv2.resize(source, new_size, interpolation=cv2.INTER_AREA)
+            else:
+                source = numpy.asarray(Image.fromarray(source).resize(new_size, Image.BOX))
+            rects = rects * factors
+        self.source = numpy.ascontiguousarray(source)
+        self.rects = rects
+
+    def rect_at(self, t: float) -> numpy.ndarray:
+        """Crop for time `t`, interpolated between the precomputed frames."""
+        position = min(max(t, 0.0), self.duration) * self.fps
+        index = min(int(position), len(self.rects) - 2) if len(self.rects) > 1 else 0
+        frac = position - index
+        if frac <= 0 or len(self.rects) == 1:
+            return self.rects[index]
+        return self.rects[index] + (self.rects[index + 1] - self.rects[index]) * frac
+
+    def frame(self, t: float) -> numpy.ndarray:
+        x, y, w, h = self.rect_at(t)
+        out_w, out_h = self.size
+        if cv2 is None:
+            return _resample_numpy(self.source, (x, y, w, h), self.size)
+        sx, sy = w / out_w, h / out_h
+        # Maps output pixel centres onto the source rectangle
+        matrix = numpy.array([
+            [sx, 0.0, x + 0.5 * sx - 0.5],
+            [0.0, sy, y + 0.5 * sy - 0.5],
+        ])
+        return cv2.warpAffine(
+            self.source, matrix, self.size,
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_REPLICATE,
+        )
+
+    def clip(self):
+        from moviepy import VideoClip
+        return VideoClip(self.frame, duration=self.duration)
+
+
+def ken_burns_clip(image, size: Size, duration: float, motion: Optional[Motion] = None, fps: int = KEN_BURNS_FPS):
+    """moviepy clip of `image` (path, PIL image or array) cropped to `size` with `motion`."""
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as img:
+            image = numpy.asarray(img.convert("RGB"))
+    return KenBurns(image, size, motion or Motion(), duration, fps).clip()
+
+
+def zoom_in_effect(clip, zoom_ratio: float = 0.04, size: Optional[Size] = None, duration: Optional[float] = None):
+    """Drop-in for the old per-frame PIL zoom on a still clip.
+
+    Zooms by `1 + zoom_ratio * t` around the centre, reading the still frame
+    once. `size` and `duration` default to the clip's own.
+    """
+    duration = duration if duration is not None else clip.duration
+    return ken_burns_clip(clip.get_frame(0), size or clip.size, duration, Motion.zoom_in(zoom_ratio, duration))
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def _legacy_zoom_frame(frame: numpy.ndarray, zoom_ratio: float, t: float) -> numpy.ndarray:
+    """The previous effect: LANCZOS upscale, centre crop, LANCZOS downscale."""
+    img = Image.fromarray(frame)
+    base_size = img.size
+    new_size = [math.ceil(base_size[0] * (1 + zoom_ratio * t)), math.ceil(base_size[1] * (1 + zoom_ratio * t))]
+    new_size[0] += new_size[0] % 2
+    new_size[1] += new_size[1] % 2
+    img = img.resize(new_size, Image.LANCZOS)
+    x = math.ceil((new_size[0] - base_size[0]) / 2)
+    y = math.ceil((new_size[1] - base_size[1]) / 2)
+    img = img.crop([x, y, new_size[0] - x, new_size[1] - y]).resize(base_size, Image.LANCZOS)
+    return numpy.array(img)
+
+
+def benchmark_zoom(
+    source: Size = (3000, 2000), size: Size = (1080, 1920), duration: float = 5.0,
+    fps: int = KEN_BURNS_FPS, zoom_ratio: float = 0.04,
+) -> Dict[str, Dict[str, float]]:
+    """Frames per second of the old and new zoom on a synthetic photo."""
+    rng = numpy.random.default_rng(0)
+    image = rng.integers(0, 256, (source[1], source[0], 3), dtype=numpy.uint8)
+    times = numpy.arange(int(duration * fps)) / fps
+
+    results = {}
+    started = time.perf_counter()
+    fitted = numpy.asarray(Image.fromarray(image).resize(size, Image.LANCZOS, box=cover_box(source, size)))
+    for t in times:
+        _legacy_zoom_frame(fitted, zoom_ratio, t)
+    elapsed = time.perf_counter() - started
+    results["pil_double_resize"] = {"seconds": round(elapsed, 3), "fps": round(len(times) / elapsed, 1)}
+
+    started = time.perf_counter()
+    engine = KenBurns(image, size, Motion.zoom_in(zoom_ratio, duration), duration, fps)
+    for t in times:
+        engine.frame(t)
+    elapsed = time.perf_counter() - started
+    name = "warp_affine" if cv2 is not None else "numpy_bilinear"
+    results[name] = {"seconds": round(elapsed, 3), "fps": round(len(times) / elapsed, 1)}
+    return results
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    print(json.dumps(benchmark_zoom(duration=seconds), indent=2))
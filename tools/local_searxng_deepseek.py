@@ -2,8 +2,13 @@ from hashlib import file_digest
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from urllib.parse import urlparse
 from typing import Dict, List
-from PIL import Image
 from db import *
+from image_metadata import strip_metadata_file, strip_metadata_async
+from http_client import close_session
+from download_scheduler import DownloadScheduler
+from http_cache import CachedDownloader
+from image_probe import ImageRequirements
+from searxng_search import search_all
 import asyncio
 import ssl
 import aiohttp
@@ -18,51 +23,18 @@ async def search_searxng(
     language: str = 'de-DE'
 ) -> Dict[int, dict]:
     """Search SearXNG instance and return image results with positions"""
-    url = "http://localhost:8888/search"
-    params = {
-        "q": query,
-        "format": "json",
-        "categories": categories,
-        "safe_search": "moderate",
-        "language": language,
-    }
-
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, params=params) as response:
-                results = await response.json()
-                return {
-                    result['positions'][0]: {
-                        'title': result.get('title', ''),
-                        'website_url': result.get('url', ''),
-                        'img_src': result.get('img_src', ''),
-                        'resolution': result.get('resolution', '')
-                    }
-                    for result in results.get('results', [])
-                    if result.get('img_src')
-                }
-        except (aiohttp.ClientError, ValueError) as e:
-            print(f"Error searching SearXNG: {str(e)}")
-            pass
+    return await search_all(query, language, pages=(1,), categories=categories)
         
 def deleta_metadata(image_path: str) -> None:
     """Remove metadata from an image file"""
     try:
-        with Image.open(image_path) as img:
-            data = list(img.getdata())
-            img_without_metadata = Image.new(img.mode, img.size)
-            img_without_metadata.putdata(data)
-            img_without_metadata.save(image_path)
+        strip_metadata_file(image_path)
         print(f"Metadata removed from {image_path}")
     except Exception as e:
         print(f"Failed to remove metadata from {image_path}: {e}")
     
-async def download_image(session: aiohttp.ClientSession, url: str, username: str, position: int) -> str:
+async def download_image(downloader: CachedDownloader, url: str, username: str, position: int) -> str:
     """Download and save a single image with async handling"""
-    image_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
-    if not any(url.endswith(ext) for ext in image_extensions):
-        url += '.jpg'
-        # deleta_metadata(url)
     try:
         parsed_url = urlparse(url)
         if not all([parsed_url.scheme, parsed_url.netloc]):
@@ -72,28 +44,20 @@ async def download_image(session: aiohttp.ClientSession, url: str, username: str
         download_dir = os.path.join("download", username)
         os.makedirs(download_dir, exist_ok=True)
 
-        # Generate filename from position and URL
-        filename = f"{position}_{os.path.basename(parsed_url.path)}" or f"image_{position}.jpg"
-        filepath = os.path.join(download_dir, filename)
-
-        async with session.get(url) as response:
-            if response.status != 200:
-                raise ValueError(f"HTTP Error {response.status}")
-            
+        def check_image(response: aiohttp.ClientResponse) -> None:
             # Verify content type is image
             content_type = response.headers.get('Content-Type', '')
             if not content_type.startswith('image/'):
                 raise ValueError(f"Non-image content type: {content_type}")
 
-            # Stream content to file
-            with open(filepath, 'wb') as f:
-                async for chunk in response.content.iter_chunked(1024 * 16):
-                    f.write(chunk)
+        # Conditional/resumable GET into the blob store, stripped before commit.
+        # The header probe picks the real extension of the formats it knows.
+        result = await downloader.download(
+            url, validate=check_image, postprocess=strip_metadata_async, requirements=ImageRequirements())
+        filepath = str(downloader.blob_store.link_into(result.path, download_dir))
 
-            deleta_metadata(filepath)
-            
-            # return f"Downloaded {url} to {filepath}"
-            return filepath
+        # return f"Downloaded {url} to {filepath}"
+        return filepath
 
     except Exception as e:
         return f"Error: {url} - {str(e)}"
@@ -140,16 +104,16 @@ def store_data(results: Dict[int, dict], username: str):
 
 async def process_images(results: Dict[int, dict], username: str) -> List[str]:
     """Process all images in parallel"""
-    async with aiohttp.ClientSession() as session:
-        tasks = [
-            download_image(session, result['img_src'], username, position)
-            for position, result in results.items()
-            if result.get('img_src')
-        ]
-        file_paths = await asyncio.gather(*tasks)
-        
-        store_data(results, username)
-        return file_paths
+    downloader = CachedDownloader(DownloadScheduler())
+    tasks = [
+        download_image(downloader, result['img_src'], username, position)
+        for position, result in results.items()
+        if result.get('img_src')
+    ]
+    file_paths = await asyncio.gather(*tasks)
+
+    store_data(results, username)
+    return file_paths
 
 async def main():
     query = "honda sports bike vertical images"
@@ -164,7 +128,10 @@ async def main():
 
     # Download images
     print(f"Found {len(search_results)} images, downloading...")
-    await process_images(search_results, username)
+    try:
+        await process_images(search_results, username)
+    finally:
+        await close_session()
     
 if __name__ == "__main__":
     with asyncio.Runner() as runner:
@@ -2,15 +2,30 @@ import os
 import asyncio
 import aiohttp
 import logging
-from PIL import Image
+from typing import Optional
 from sqlmodel import Session, select
 from urllib.parse import urlparse
 from db import engine, User, ImageDetail
+from image_metadata import STRIP_WORKERS, strip_metadata_file, strip_metadata_async
+from searxng_search import iter_search, search_all
+from download_scheduler import DownloadScheduler
+from blob_store import get_blob_store
+from http_cache import CachedDownloader
+from ingest_pipeline import IngestItem, Pipeline, Stage
+from image_probe import ImageRejected, ImageRequirements, probe_file
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "16"))
+DOWNLOAD_PER_HOST_LIMIT = int(os.getenv("DOWNLOAD_PER_HOST_LIMIT", "4"))
+# Worker counts for the ingestion stages (fetch uses DOWNLOAD_CONCURRENCY)
+VALIDATE_WORKERS = int(os.getenv("INGEST_VALIDATE_WORKERS", "4"))
+PERSIST_WORKERS = int(os.getenv("INGEST_PERSIST_WORKERS", "1"))
+# Per-user folders of hard links into the blob store
+DOWNLOAD_ROOT = os.getenv("DOWNLOAD_ROOT", "download")
+
 language_country_codes = [
     "en-US",   # English (United States)
     "en-GB",   # English (United Kingdom)
@@ -18,76 +33,67 @@ language_country_codes = [
     "es-MX",   # Spanish (Mexico)
 ]
 
+def normalize_image_url(url: str) -> str:
+    # The file extension comes from the probed header, not from the URL
+    url = str(url)
+    parsed_url = urlparse(url)
+    if not all([parsed_url.scheme, parsed_url.netloc]):
+        raise ValueError("Invalid URL format")
+    return url
+
+
+def check_image_response(response: aiohttp.ClientResponse) -> None:
+    content_type = response.headers.get('Content-Type', '')
+    if not content_type.startswith('image/'):
+        raise ValueError(f"Non-image content type: {content_type}")
+
+
 class ImageProcessor:
     def __init__(self, username: int):
         self.username = username
-        self.download_dir = os.path.join("download", str(self.username))
+        self.download_dir = os.path.join(DOWNLOAD_ROOT, str(self.username))
         os.makedirs(self.download_dir, exist_ok=True)
+        self.blob_store = get_blob_store()
+        self.requirements = ImageRequirements()
         logger.info(f"Initialized ImageProcessor for user: {self.username}")
 
-    async def search_images(self, q_params: dict) -> dict:
-        """Search for images using the SearXNG instance."""
-        url = "http://localhost:8888/search"
-        params = {
-            "q": q_params.get("query", ""),
-            "format": "json",
+    def _search_args(self, q_params: dict) -> dict:
+        first_page = int(q_params.get("page", 1))
+        page_count = int(q_params.get("page_count", 1))
+        return {
+            "query": q_params.get("query", ""),
+            "language": q_params.get("language", "en-EN"),
+            "pages": range(first_page, first_page + page_count),
             "categories": q_params.get("categories", "images"),
-            "safe_search": "moderate",
-            "lang": q_params.get("language", "en-EN"),
-            "page": q_params.get("page", 1),
         }
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, params=params) as response:
-                    results = await response.json()
-                    image_results = {
-                        result['positions'][0]: {
-                            'title': result.get('title', ''),
-                            'website_url': result.get('url', ''),
-                            'img_src': result.get('img_src', ''),
-                            'resolution': result.get('resolution', '')
-                        }
-                        for result in results.get('results', [])
-                        if result.get('img_src')
-                    }
-                    logger.info(
-                        f"Found {len(image_results)} images for query: '{q_params['query']}'")
-                    return image_results
-            except (aiohttp.ClientError, ValueError) as e:
-                logger.error(f"Error searching SearXNG: {str(e)}")
-                return {}
-
-    async def download_image(self, session: aiohttp.ClientSession, data: dict, position: int) -> str:
+    async def search_images(self, q_params: dict) -> dict:
+        """Search for images using the SearXNG instance (cached, multi-page)."""
+        image_results = await search_all(**self._search_args(q_params))
+        logger.info(
+            f"Found {len(image_results)} images for query: '{q_params['query']}'")
+        return image_results
+
+    def iter_images(self, q_params: dict):
+        """Stream `(position, result)` pairs as each SearXNG page arrives."""
+        return iter_search(**self._search_args(q_params))
+
+    async def download_image(self, downloader: CachedDownloader, data: dict, position: int) -> str:
         """Download and save a single image asynchronously."""
-        image_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
         url = str(data['img_src'])
-        if not any(url.endswith(ext) for ext in image_extensions):
-            url += '.jpg'
-
         try:
-            parsed_url = urlparse(url)
-            if not all([parsed_url.scheme, parsed_url.netloc]):
-                raise ValueError("Invalid URL format")
-
-            filename = f"{position}_{os.path.basename(parsed_url.path)}" or f"image_{position}.jpg"
-            filepath = os.path.join(self.download_dir, filename)
-
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise ValueError(f"HTTP Error {response.status}")
-
-                content_type = response.headers.get('Content-Type', '')
-                if not content_type.startswith('image/'):
-                    raise ValueError(f"Non-image content type: {content_type}")
-
-                with open(filepath, 'wb') as f:
-                    async for chunk in response.content.iter_chunked(1024 * 16):
-                        f.write(chunk)
-                    self.store_data(data, url)
-
-            self.remove_metadata(filepath)
-            # logger.info(f"Downloaded and processed image: {filepath}")
+            url = normalize_image_url(url)
+
+            # Conditional/resumable GET, a 304 or a fresh cache entry costs no body
+            result = await downloader.download(
+                url, validate=check_image_response, postprocess=strip_metadata_async,
+                requirements=self.requirements)
+            if result.status != "downloaded":
+                logger.info(f"Reused cached image ({result.status}): {url}")
+
+            # Per-user view is a hard link named after the content hash
+            filepath = str(self.blob_store.link_into(result.path, self.download_dir))
+            self.store_data(data, url, result.content_hash)
             return filepath
 
         except Exception as e:
@@ -97,27 +103,30 @@ class ImageProcessor:
     def remove_metadata(self, image_path: str) -> None:
         """Remove metadata from the image."""
         try:
-            with Image.open(image_path) as img:
-                data = list(img.getdata())
-                rm_metadata = Image.new(img.mode, img.size)
-                rm_metadata.putdata(data)
-                rm_metadata.save(image_path)
+            strip_metadata_file(image_path)
         except Exception as e:
             logger.error(
                 f"Error removing metadata from {image_path}: {str(e)}")
 
-    def store_data(self, results: dict, url: str) -> None:
-        db_image = ImageDetail(
-            title=results['title'],
-            author_id=self.username,
-            image_url=url,
-            resolution=results['resolution'],
-            site_url=results['website_url']
-        )
+    def store_data(self, results: dict, url: str, content_hash: str) -> bool:
+        """Record the image for this user; False if the same bytes were already recorded."""
         with Session(engine) as session:
+            statement = select(ImageDetail.id).where(
+                ImageDetail.author_id == self.username,
+                ImageDetail.content_hash == content_hash)
+            if session.exec(statement).first() is not None:
+                return False
+            db_image = ImageDetail(
+                title=results['title'],
+                author_id=self.username,
+                image_url=url,
+                resolution=results['resolution'],
+                site_url=results['website_url'],
+                content_hash=content_hash
+            )
             session.add(db_image)
             session.commit()
-                
+        return True
 
     def store_data_update(self, total_images: int) -> None:
         with Session(engine) as session:
@@ -131,22 +140,97 @@ class ImageProcessor:
             session.refresh(user)
 
 
+    # ------------------------------
+    # Ingestion stages
+    # ------------------------------
+
+    async def _fetch_stage(self, item: IngestItem) -> Optional[IngestItem]:
+        item.url = normalize_image_url(item.result['img_src'])
+        # The header probe drops images that fail the requirements mid-transfer.
+        try:
+            download = await self.downloader.download(
+                item.url, validate=check_image_response, requirements=self.requirements)
+        except ImageRejected:
+            return None
+        item.path = download.path
+        item.content_hash = download.content_hash
+        item.fetch_status = download.status
+        item.created = download.created
+        item.header = download.header
+        return item
+
+    async def _validate_stage(self, item: IngestItem) -> Optional[IngestItem]:
+        header = item.header
+        if header is None:
+            # Served from cache or not a format the probe knows, read it from disk
+            try:
+                header = await asyncio.to_thread(probe_file, str(item.path))
+            except OSError:
+                # Pillow can't size it either (SVG...); only a constrained search needs the size
+                if self.requirements.constrained:
+                    return None
+                return item
+            try:
+                self.requirements.check(header)
+            except ImageRejected:
+                return None
+        item.width, item.height, item.image_format = header.width, header.height, header.format
+        if not item.result.get('resolution'):
+            item.result['resolution'] = f"{item.width}x{item.height}"
+        return item
+
+    async def _strip_stage(self, item: IngestItem) -> IngestItem:
+        # The stripped copy becomes its own blob in the process pool; the
+        # downloaded blob is left as is for the HTTP cache to revalidate.
+        blob = await self.blob_store.store_derived(item.path, strip_metadata_async)
+        item.path = blob.path
+        item.content_hash = blob.content_hash
+        return item
+
+    async def _persist_stage(self, item: IngestItem) -> Optional[IngestItem]:
+        # Per-user view is a hard link named after the content hash
+        item.stored_path = str(self.blob_store.link_into(item.path, self.download_dir))
+        stored = await asyncio.to_thread(self.store_data, item.result, item.url, item.content_hash)
+        # Already recorded for this user: dropped, so only new rows are counted
+        return item if stored else None
+
+    async def _search_items(self, params: dict):
+        async for position, result in self.iter_images(params):
+            yield IngestItem(position=position, result=result)
+
     async def process_images(self, params: dict, username: int) -> None:
-        """Search, download, and store images based on the query."""
-        results = await self.search_images(params)
-        print('total images', len(results))
-        if not results:
+        """Search, download, and store images based on the query.
+
+        Runs as a staged pipeline (search -> fetch -> validate -> strip ->
+        persist) with bounded queues between stages, so downloads start with
+        the first result page and CPU work overlaps with the network.
+        Metadata stripping runs in its own stage on the process pool, so it
+        never holds a download slot.
+        `orientation`, `min_width` and `min_height` in `params` are checked
+        against the image header while the download is still in flight.
+        """
+        self.requirements = ImageRequirements.from_params(params)
+        scheduler = DownloadScheduler(
+            max_concurrency=DOWNLOAD_CONCURRENCY, per_host_limit=DOWNLOAD_PER_HOST_LIMIT)
+        self.downloader = CachedDownloader(scheduler, self.blob_store)
+
+        pipeline = Pipeline([
+            Stage("fetch", self._fetch_stage, workers=DOWNLOAD_CONCURRENCY),
+            Stage("validate", self._validate_stage, workers=VALIDATE_WORKERS),
+            Stage("strip", self._strip_stage, workers=STRIP_WORKERS),
+            Stage("persist", self._persist_stage, workers=PERSIST_WORKERS),
+        ], collect=False)
+        result = await pipeline.run(self._search_items(params))
+        # The persist stage counts the newly stored images, nothing needs to be kept
+        stored = result.stages["persist"]["processed"]
+        print('total images', result.produced)
+        logger.info(f"Pipeline stages: {result.stages}")
+        logger.info(f"Download metrics: {scheduler.metrics.snapshot()}")
+        if not result.produced:
             logger.info("No images found")
             return
 
-        async with aiohttp.ClientSession() as session:
-            tasks = [
-                self.download_image(session, result, position)
-                for position, result in results.items()
-                if result.get('img_src')
-            ]
-            file_paths = await asyncio.gather(*tasks)
-        self.store_data_update(len(file_paths))
+        await asyncio.to_thread(self.store_data_update, stored)
 
 
 # Example usage
@@ -1,32 +1,57 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, Form
+from fastapi import FastAPI, Request, Depends, HTTPException, Form, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 from fastapi import FastAPI, Request, Depends, Form, HTTPException
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 from urllib.parse import urlparse
-from passlib.context import CryptContext
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 from fastapi.responses import RedirectResponse
+import asyncio
 import logging
 import random
-# from auth import hash_password, verify_password, create_access_token, decode_access_token
+import uuid
+from auth import CachedUser, hash_password_async, verify_password_async, user_cache
 from datetime import datetime
-from db import TargetSize, User, ImageDetail, UserCreate, UserOut, ImageDetailCreate, ImageDetailOut, engine, ImageSelection, Parameter
-from database import get_db
-from tasks import process_images_task, language_country_codes
+from db import TargetSize, User, ImageDetail, UserCreate, UserOut, ImageDetailCreate, ImageDetailOut, ImageSelection, Parameter, RenderRequest
+from database import dispose_async_engine, get_async_engine, get_db
+from celery.result import AsyncResult
+from tasks import process_images_task, language_country_codes, request_render_cancel, render_owner, submit_render
+from worker import celery_app
+from http_client import register_fastapi
+from blob_store import get_blob_store
+from local_searxng_deepseek_copy_chatGPT import DOWNLOAD_ROOT
+from render_config import render_config_cache
 
 logger = logging.getLogger("uvicorn.error")
 
 BASE_DIR = Path(__file__).resolve().parent
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Ids per UPDATE/DELETE statement in bulk review requests
+BULK_CHUNK_SIZE = 500
+BULK_ACTION_LABELS = {"approve": "Approved", "reject": "Rejected", "delete": "Deleted"}
+
 app = FastAPI()
 app.mount(
     "/media", StaticFiles(directory=BASE_DIR.joinpath('media', 'image')), name="media")
 templates = Jinja2Templates(directory="templates")
+register_fastapi(app)
+
+
+@app.on_event("startup")
+async def connect_database():
+    # Fail at boot, not on the first request, when the async driver is missing
+    get_async_engine()
+
+
+@app.on_event("shutdown")
+async def dispose_database():
+    # Close pooled connections cleanly instead of leaving them to the server
+    await dispose_async_engine()
 
 
 # GET endpoint to render the login page
@@ -42,12 +67,19 @@ async def login_user(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
+    # bcrypt runs in the auth thread pool so other requests keep being served
+    valid, new_hash = await verify_password_async(password, user.hashed_password if user else None)
+    if not valid:
         # Render the login page again with an error message if credentials are invalid
         return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid email or password"})
+    if new_hash:
+        # Stored hash used an older cost factor, upgrade it now that we know the password
+        user.hashed_password = new_hash
+        await db.commit()
+    user_cache.invalidate(user.id)
 
     # Create a response and set a secure, HTTP-only cookie with the user's ID
     response = RedirectResponse(url="/", status_code=303)
@@ -56,15 +88,15 @@ async def login_user(
 
 
 @app.post("/signup")
-def signup_user(
+async def signup_user(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
     name: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == email).first()
+    existing_user = (await db.execute(select(User.id).where(User.email == email))).first()
     if existing_user:
         return templates.TemplateResponse(
             "signup.html",
@@ -80,25 +112,35 @@ def signup_user(
     new_user = User(
         # id=str(uuid.uuid4()),
         email=email,
-        hashed_password=hash_password(password),
+        hashed_password=await hash_password_async(password),
         name=name
     )
     db.add(new_user)
-    db.commit()
+    await db.commit()
+    # A reused id must not pick up the permissions of a deleted user
+    user_cache.invalidate(new_user.id)
 
     # Redirect to login
     return RedirectResponse(url="/login", status_code=303)
 
 
 # Simple user authentication (example)
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> CachedUser:
     # In real code, use a proper auth system (e.g., OAuth, JWT)
     user_id = request.cookies.get("id")
     if not user_id:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not user_id.isdigit():
         raise HTTPException(status_code=401, detail="Invalid user")
+    user = user_cache.get(int(user_id))
+    if user is not None:
+        return user
+    # Routes only check who the user is and their role, not the whole row
+    row = (await db.execute(select(User.id, User.permissions).where(User.id == int(user_id)))).first()
+    if row is None:
+        raise HTTPException(status_code=401, detail="Invalid user")
+    user = CachedUser(row.id, row.permissions or "")
+    user_cache.set(user)
     return user
 
 # Utility: get site name from URL
@@ -114,11 +156,11 @@ def get_site_name(url: str) -> str:
 
 
 @app.get("/")
-async def read_root(request: Request, db: Session = Depends(get_db)):
+async def read_root(request: Request, db: AsyncSession = Depends(get_db)):
     # Get images with author data
-    images = db.query(ImageDetail).options(
-        joinedload(ImageDetail.author)).all()
-    users = db.query(User).all()
+    images = (await db.execute(select(ImageDetail).options(
+        joinedload(ImageDetail.author)))).scalars().all()
+    users = (await db.execute(select(User))).scalars().all()
 
     # Populate a 'site_name' attribute for convenience
     for img in images:
@@ -136,20 +178,19 @@ async def read_root(request: Request, db: Session = Depends(get_db)):
 
 
 @app.post("/users/", response_model=UserOut)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Hash password
-    print('running this function')
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await hash_password_async(user.password)
     db_user = User(
-        id=str(datetime.now().timestamp()),
         name=user.name,
         email=user.email,
         hashed_password=hashed_password,
         permissions=",".join(user.permissions)
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    user_cache.invalidate(db_user.id)
     return db_user
 
 # Handle form submission for creating a user
@@ -161,14 +202,14 @@ async def handle_create_user(
     email: str = Form(...),
     password: str = Form(...),
     permissions: str = Form(""),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == email).first()
+    existing_user = (await db.execute(select(User.id).where(User.email == email))).first()
     if existing_user:
         return RedirectResponse(url="/?error=Email+already+exists", status_code=303)
 
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await hash_password_async(password)
     db_user = User(
         # id=str(datetime.now().timestamp()),
         name=name,
@@ -177,7 +218,8 @@ async def handle_create_user(
         permissions=permissions
     )
     db.add(db_user)
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(db_user.id)
     return RedirectResponse(url="/", status_code=303)
 
 # Handle form submission for creating an image
@@ -188,9 +230,9 @@ async def handle_create_image(
     title: str = Form(...),
     image_url: str = Form(...),
     site_url: str = Form(...),
-    author_id: str = Form(...),
+    author_id: int = Form(...),
     download_engine: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     db_image = ImageDetail(
         # id=str(datetime.now().timestamp()),
@@ -201,18 +243,17 @@ async def handle_create_image(
         download_engine=download_engine
     )
     db.add(db_image)
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/", status_code=303)
 
 
 @app.post("/images/", response_model=ImageDetailOut)
 async def create_image_api(
     image: ImageDetailCreate,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     db_image = ImageDetail(
-        id=str(datetime.now().timestamp()),
         title=image.title,
         author_id=user.id,
         image_url=image.image_url,
@@ -221,8 +262,10 @@ async def create_image_api(
         site_url=image.site_url
     )
     db.add(db_image)
-    db.commit()
-    db.refresh(db_image)
+    await db.commit()
+    # Load the author now, lazy loading is not available on an async session
+    await db.refresh(db_image, attribute_names=["author"])
+    db_image.site_name = get_site_name(db_image.site_url)
     return db_image
 
 
@@ -230,21 +273,21 @@ async def create_image_api(
 async def update_image(
     image_id: int,
     image: ImageDetailCreate,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    db_image = db.query(ImageDetail).filter(ImageDetail.id == image_id).first()
+    db_image = await db.get(ImageDetail, image_id, options=[joinedload(ImageDetail.author)])
     if not db_image:
         raise HTTPException(status_code=404, detail="Image not found")
     # Basic authorization check
-    if db_image.author_id != user.id and "admin" not in user.permissions.split(","):
+    if db_image.author_id != user.id and not user.is_admin:
         raise HTTPException(status_code=403, detail="Not authorized")
 
     for key, value in image.dict().items():
         setattr(db_image, key, value)
 
-    db.commit()
-    db.refresh(db_image)
+    await db.commit()
+    db_image.site_name = get_site_name(db_image.site_url)
     return db_image
 
 
@@ -261,18 +304,19 @@ async def update_image(
 
 
 @app.delete("/delete/image_id/{imageId}/user_id/{user_id}")
-def delete_image(imageId: int, user_id: int):
-    with Session(engine) as session:
-        user = session.get(User, user_id)
-        image = session.get(ImageDetail, imageId)
-        if image.author_id != user.id and "admin" not in user.permissions.split(","):
-            logger.error(
-                f"Delete failed: User {user.id} {user.name} not authorized to delete image {image.title}")
-            raise HTTPException(status_code=403, detail="Not authorized")
-        session.delete(image)
-        session.commit()
-        logger.info(f"Image {image} deleted successfully by user {user_id}")
-        return {"ok": True}
+async def delete_image(imageId: int, user_id: int, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
+    image = await db.get(ImageDetail, imageId)
+    if not user or not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if image.author_id != user.id and "admin" not in (user.permissions or "").split(","):
+        logger.error(
+            f"Delete failed: User {user.id} {user.name} not authorized to delete image {image.title}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    await db.delete(image)
+    await db.commit()
+    logger.info(f"Image {image} deleted successfully by user {user_id}")
+    return {"ok": True}
 
 
 @app.post("/fetch-images/{name}")
@@ -286,6 +330,8 @@ async def fetch_images(name: str):
         "limit": 100,
         "size": "large",
         "page": rend_page,
+        # Consecutive result pages fetched concurrently from the first one
+        "page_count": 3,
         "orientation": "vertical",
         # Optional languages are: "en-EN", "de-DE", "es-ES", "fr-FR", "it-IT", "pt-PT"
         "language": rand_lang
@@ -295,20 +341,174 @@ async def fetch_images(name: str):
     return {"message": "Image processing started"}
 
 
+# ------------------------------
+# BULK REVIEW
+# ------------------------------
+
+
+def _chunks(ids: List[int], size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _owned(statement, user: CachedUser):
+    # Non-admins may only touch their own images
+    if user.is_admin:
+        return statement
+    return statement.where(ImageDetail.author_id == user.id)
+
+
+def remove_image_files(files: List[Tuple[int, str]]) -> None:
+    """Drop the per-user views of deleted images; blobs go once unreferenced."""
+    blob_store = get_blob_store()
+    for author_id, content_hash in files:
+        for view_path in Path(DOWNLOAD_ROOT, str(author_id)).glob(f"{content_hash}.*"):
+            try:
+                blob_store.release(view_path)
+            except OSError as e:
+                logger.warning(f"Could not remove {view_path}: {str(e)}")
+
+
+@app.post("/images/bulk")
 @app.post("/update-checked-images")
-def update_checked_images(data: ImageSelection):
+async def update_checked_images(
+    data: ImageSelection,
+    background_tasks: BackgroundTasks,
+    user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Approve, reject or delete a selection in one request.
+
+    Ids are applied in chunks of BULK_CHUNK_SIZE with set-based statements
+    inside a single transaction; files of deleted images are removed after
+    the response is sent.
+    """
     if not data.image_ids:
         raise HTTPException(status_code=400, detail="No images selected")
 
-    # Process the image IDs (Example: Approve images, Delete, etc.)
-    return {"message": f"Updated images: {data.image_ids}"}
+    image_ids = sorted(set(data.image_ids))
+    affected = 0
+    files: List[Tuple[int, str]] = []
+    for chunk in _chunks(image_ids):
+        if data.action == "delete":
+            rows = (await db.execute(_owned(
+                select(ImageDetail.author_id, ImageDetail.content_hash).where(ImageDetail.id.in_(chunk)), user))).all()
+            files.extend((author_id, content_hash) for author_id, content_hash in rows if content_hash)
+            statement = delete(ImageDetail).where(ImageDetail.id.in_(chunk))
+        else:
+            statement = update(ImageDetail).where(ImageDetail.id.in_(chunk)).values(
+                approved=data.action == "approve")
+        result = await db.execute(_owned(statement, user).execution_options(synchronize_session=False))
+        affected += result.rowcount
+    await db.commit()
+
+    if files:
+        background_tasks.add_task(remove_image_files, files)
+    logger.info(f"Bulk {data.action} of {affected}/{len(image_ids)} images by user {user.id}")
+    return {
+        "message": f"{BULK_ACTION_LABELS[data.action]} {affected} images",
+        "action": data.action,
+        "requested": len(image_ids),
+        "updated": affected,
+        "files_scheduled": len(files),
+    }
 
 
 @app.post("/submit")
-async def submit_form(data: Parameter):
-    return {"message": "Form submitted successfully!", "data": data}
+async def submit_form(data: Parameter, db: AsyncSession = Depends(get_db),
+                      user: CachedUser = Depends(get_current_user)):
+    # Parameter sets have no owner and every render can use them, only admins edit them
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    # Insert, or update the set when the form carries its id
+    parameter = await db.merge(data)
+    await db.commit()
+    # Renders in this process read parameter sets through a cache
+    render_config_cache.invalidate(parameter.id)
+    return {"message": "Form submitted successfully!", "data": parameter}
 
 
 @app.get("/video_gen")
 async def serve_form_page(request: Request, target_size: TargetSize):
         return templates.TemplateResponse("video_gen.html", {"request": request, "target_size": target_size})
+
+
+def _media_file(folder: str, name: Optional[str]) -> Optional[str]:
+    """Path of the file `name` in media/<folder>; only bare file names are accepted."""
+    if name is None:
+        return None
+    path = BASE_DIR.joinpath("media", folder, name)
+    if Path(name).name != name or not path.is_file():
+        raise HTTPException(status_code=400, detail=f"Unknown {folder} file {name!r}")
+    return str(path)
+
+
+@app.post("/video_gen/render")
+async def submit_video_render(
+    data: RenderRequest,
+    user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue a render of downloaded images, in the order given.
+
+    Non-admins may only use their own images. Returns the task id to poll
+    at /video_gen/tasks/{task_id}.
+    """
+    if not data.image_ids:
+        raise HTTPException(status_code=400, detail="No images selected")
+    rows = (await db.execute(_owned(
+        select(ImageDetail.id, ImageDetail.author_id, ImageDetail.content_hash).where(
+            ImageDetail.id.in_(data.image_ids)), user))).all()
+    views = {
+        image_id: next(Path(DOWNLOAD_ROOT, str(author_id)).glob(f"{content_hash}.*"), None)
+        for image_id, author_id, content_hash in rows if content_hash
+    }
+    missing = [image_id for image_id in data.image_ids if views.get(image_id) is None]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"No downloaded file for images {missing}")
+
+    output_dir = Path(DOWNLOAD_ROOT, str(user.id), "videos").resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # The result backend client blocks, keep it off the event loop
+    task_id = await asyncio.to_thread(
+        submit_render, user.id,
+        image_paths=[str(views[image_id].resolve()) for image_id in data.image_ids],
+        audio_path=_media_file("audio", data.audio),
+        output_filename=str(output_dir / f"video_{uuid.uuid4().hex}.mp4"),
+        parameter_id=data.parameter_id,
+        overlay_path=_media_file("faces", data.overlay),
+    )
+    logger.info(f"Render {task_id} of {len(data.image_ids)} images queued by user {user.id}")
+    return {"task_id": task_id}
+
+
+def _check_render_owner(task_id: str, user: CachedUser) -> None:
+    owner = render_owner(task_id)
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Render task not found")
+    if owner != user.id and not user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+
+# Plain def: the result backend client blocks, so FastAPI runs these in its thread pool
+@app.get("/video_gen/tasks/{task_id}")
+def video_task_status(task_id: str, user: CachedUser = Depends(get_current_user)):
+    _check_render_owner(task_id, user)
+    result = AsyncResult(task_id, app=celery_app)
+    status = {"task_id": task_id, "state": result.state}
+    if result.state in ("PROGRESS", "CANCELLED"):
+        status.update(result.info or {})
+    elif result.state == "SUCCESS":
+        status["result"] = result.result
+    elif result.state == "FAILURE":
+        status["error"] = str(result.info)
+    return status
+
+
+@app.post("/video_gen/tasks/{task_id}/cancel")
+def cancel_video_task(task_id: str, user: CachedUser = Depends(get_current_user)):
+    _check_render_owner(task_id, user)
+    # Running renders stop at their next progress update, queued ones never start
+    request_render_cancel(task_id)
+    celery_app.control.revoke(task_id)
+    return {"task_id": task_id, "cancel_requested": True}
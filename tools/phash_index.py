@@ -0,0 +1,220 @@
+import io
+import logging
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# One index for every user and provider, so the same picture is only kept once.
+PHASH_INDEX_PATH = Path(os.getenv("PHASH_INDEX_PATH", BASE_DIR.joinpath("media", "image_hashes.sqlite3")))
+
+ImageInput = Union[bytes, Image.Image]
+
+# Hash widths `phash` can produce: hash_size 8 and 16
+SUPPORTED_BITS = {64: 8, 256: 16}
+
+
+# ------------------------------
+# Hashing
+# ------------------------------
+
+@lru_cache(maxsize=8)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so `D @ x @ D.T` is the 2D DCT of `x`."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def _grayscale(image: ImageInput, size: Tuple[int, int]) -> np.ndarray:
+    if isinstance(image, bytes):
+        image = Image.open(io.BytesIO(image))
+        # draft() lets the JPEG decoder skip most of the work for a tiny thumbnail
+        image.draft("L", (size[0] * 4, size[1] * 4))
+    small = image.convert("L").resize(size, Image.BILINEAR)
+    return np.asarray(small, dtype=np.float32)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def phash(image: ImageInput, hash_size: int = 8) -> int:
+    """DCT perceptual hash of `hash_size`**2 bits (64 by default, 256 for 16)."""
+    n = hash_size * 4
+    pixels = _grayscale(image, (n, n))
+    dct = _dct_matrix(n) @ pixels @ _dct_matrix(n).T
+    low = dct[:hash_size, :hash_size]
+    return _pack_bits(low > np.median(low))
+
+
+def dhash(image: ImageInput, hash_size: int = 8) -> int:
+    """Horizontal gradient hash of `hash_size`**2 bits."""
+    pixels = _grayscale(image, (hash_size + 1, hash_size))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def max_distance_for(similarity_threshold: float, bits: int = 64) -> int:
+    """Convert a 0-1 similarity threshold into a Hamming radius."""
+    return int((1.0 - similarity_threshold) * bits)
+
+
+# ------------------------------
+# BK-tree
+# ------------------------------
+
+class BKTree:
+    """Metric tree over Hamming distance for radius queries."""
+
+    def __init__(self):
+        self._root: Optional[Tuple[int, Dict[int, tuple]]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int) -> None:
+        if self._root is None:
+            self._root = (value, {})
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self._size += 1
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> Iterator[Tuple[int, int]]:
+        """Yield `(hash, distance)` for every stored hash within `radius`."""
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= radius:
+                yield node_value, distance
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            for edge in range(max(0, distance - radius), distance + radius + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+
+
+# ------------------------------
+# Persistent index
+# ------------------------------
+
+class PHashIndex:
+    """SQLite-backed perceptual hash store with an in-memory BK-tree.
+
+    Hashes are stored as fixed-width big-endian blobs. Rows written by other
+    processes (other Celery workers) are picked up by `refresh()`, which runs
+    before every `add_if_new`.
+    """
+
+    def __init__(self, path: Union[str, Path] = PHASH_INDEX_PATH, bits: int = 64):
+        if bits not in SUPPORTED_BITS:
+            raise ValueError(f"Unsupported hash width {bits}, expected one of {sorted(SUPPORTED_BITS)}")
+        self.path = Path(path)
+        self.bits = bits
+        self.hash_size = SUPPORTED_BITS[bits]
+        self._tree = BKTree()
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS image_hashes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bits INTEGER NOT NULL,
+                hash BLOB NOT NULL,
+                source TEXT,
+                url TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_image_hashes_bits ON image_hashes (bits, id)")
+        self._conn.commit()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def _to_blob(self, value: int) -> bytes:
+        return value.to_bytes(self.bits // 8, "big")
+
+    def refresh(self) -> int:
+        """Load rows added since the last refresh, returning how many were new."""
+        rows = self._conn.execute(
+            "SELECT id, hash FROM image_hashes WHERE bits = ? AND id > ? ORDER BY id",
+            (self.bits, self._last_id)).fetchall()
+        for row_id, blob in rows:
+            self._tree.add(int.from_bytes(blob, "big"))
+            self._last_id = row_id
+        return len(rows)
+
+    def hash(self, image: ImageInput) -> int:
+        """`phash` of `image` at this index's width."""
+        return phash(image, self.hash_size)
+
+    def find_similar(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """Return `(hash, distance)` pairs within `max_distance`, nearest first."""
+        return sorted(self._tree.search(value, max_distance), key=lambda item: item[1])
+
+    def _insert(self, value: int, source: str, url: str) -> None:
+        self._conn.execute(
+            "INSERT INTO image_hashes (bits, hash, source, url) VALUES (?, ?, ?, ?)",
+            (self.bits, self._to_blob(value), source, url))
+
+    def add(self, value: int, source: str = "", url: str = "") -> None:
+        with self._lock:
+            self._insert(value, source, url)
+            self._conn.commit()
+            self._tree.add(value)
+
+    def add_if_new(self, value: int, max_distance: int, source: str = "", url: str = "") -> bool:
+        """Store `value` unless a near-duplicate exists. Returns True if stored.
+
+        Refresh, check and insert run in one write transaction, so another
+        process can't insert a near-duplicate in between.
+        """
+        with self._lock:
+            # Takes the database write lock now instead of at the INSERT
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.refresh()
+                if self.find_similar(value, max_distance):
+                    self._conn.rollback()
+                    return False
+                self._insert(value, source, url)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._tree.add(value)
+            return True
+
+    def close(self) -> None:
+        self._conn.close()
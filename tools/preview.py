@@ -0,0 +1,99 @@
+"""
+Fast low-resolution previews of a slideshow: a video, a contact sheet or a GIF
+"""
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from PIL import Image
+
+from frame_pipe import SlideshowFrames, render_frames
+from slideshow import PREVIEW_FPS, PREVIEW_SCALE, Slideshow
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_KINDS = ("video", "sheet", "gif")
+SHEET_COLUMNS = 4
+SHEET_GAP = 4
+
+
+def contact_sheet(show: Slideshow, output_path: Union[str, Path], columns: int = SHEET_COLUMNS) -> Dict[str, float]:
+    """Save the keyframe of every slide as one image, `columns` tiles wide."""
+    frames = SlideshowFrames(show)
+    keyframes = show.keyframes()
+    columns = max(1, min(columns, len(keyframes)))
+    rows = -(-len(keyframes) // columns)
+    width, height = show.size
+    sheet = Image.new(
+        "RGB",
+        (columns * width + (columns + 1) * SHEET_GAP, rows * height + (rows + 1) * SHEET_GAP),
+        tuple(show.background),
+    )
+    for i, n in enumerate(keyframes):
+        row, column = divmod(i, columns)
+        position = (SHEET_GAP + column * (width + SHEET_GAP), SHEET_GAP + row * (height + SHEET_GAP))
+        sheet.paste(Image.fromarray(frames.frame(n)), position)
+    sheet.save(output_path)
+    return {"frames": len(keyframes)}
+
+
+def preview_gif(show: Slideshow, output_path: Union[str, Path]) -> Dict[str, float]:
+    """Save the whole timeline as a looping GIF at the show's fps.
+
+    Frames are quantized against one palette taken from the keyframes, and
+    a still slide becomes a single GIF frame with a longer duration.
+    """
+    frames = SlideshowFrames(show)
+    keyframes = [Image.fromarray(frames.frame(n)) for n in show.keyframes()]
+    strip = Image.new("RGB", (show.size[0] * len(keyframes), show.size[1]))
+    for i, image in enumerate(keyframes):
+        strip.paste(image, (i * show.size[0], 0))
+    palette = strip.quantize(256)
+
+    images, durations = [], []
+    frame_ms = 1000 / show.fps
+    for n in range(show.frame_count):
+        computed = frames.computed
+        pixels = frames.frame(n)
+        if images and frames.computed == computed:
+            durations[-1] += frame_ms
+            continue
+        images.append(Image.fromarray(pixels).quantize(palette=palette, dither=Image.Dither.NONE))
+        durations.append(frame_ms)
+    images[0].save(
+        output_path,
+        save_all=True,
+        append_images=images[1:],
+        duration=[round(duration) for duration in durations],
+        loop=0,
+    )
+    return {"frames": show.frame_count, "gif_frames": len(images)}
+
+
+def render_preview(
+    show: Slideshow,
+    output_path: Union[str, Path],
+    kind: str = "video",
+    audio_path: Optional[str] = None,
+    scale: float = PREVIEW_SCALE,
+    fps: int = PREVIEW_FPS,
+) -> Dict:
+    """Render `show` scaled down to `scale` at `fps` as a video, contact sheet or GIF.
+
+    Runs in the calling process: at preview sizes starting a pool and
+    concatenating segments costs more than it saves.
+    """
+    if kind not in PREVIEW_KINDS:
+        raise ValueError(f"Unknown preview kind {kind!r}, expected one of {PREVIEW_KINDS}")
+    preview = show.preview(scale, fps)
+    started = time.perf_counter()
+    if kind == "video":
+        stats = render_frames(preview, output_path, audio_path)
+    elif kind == "sheet":
+        stats = contact_sheet(preview, output_path)
+    else:
+        stats = preview_gif(preview, output_path)
+    elapsed = time.perf_counter() - started
+    logger.info(f"Rendered {kind} preview {preview.size[0]}x{preview.size[1]}@{preview.fps} to {output_path} in {elapsed:.1f}s")
+    return {**stats, "kind": kind, "size": list(preview.size), "seconds": round(elapsed, 2)}
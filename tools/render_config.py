@@ -0,0 +1,146 @@
+"""
+Render parameters loaded from the Parameter/TargetSize tables into one typed, cached config
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from db import Parameter, TargetSize, engine
+
+Size = Tuple[int, int]
+
+RENDER_CONFIG_TTL = float(os.getenv("RENDER_CONFIG_TTL", "300"))
+DEFAULT_PLATFORM = "youtube_short"
+DEFAULT_TARGET_SIZE: Size = (1080, 1920)
+
+
+@dataclass(frozen=True)
+class RenderConfig:
+    """Validated render parameters of one Parameter row and its TargetSize.
+
+    Missing columns fall back to the defaults the renderers used before
+    they were stored in the database.
+    """
+    parameter_id: Optional[int] = None
+    file_name: str = ""
+    platform: str = DEFAULT_PLATFORM
+    target_size: Size = DEFAULT_TARGET_SIZE
+    image_view_duration: float = 5.0
+    clip_view_duration: Optional[float] = None
+    transition_duration: float = 1.0
+    zoom_in: float = 0.0
+    zoom_out: float = 0.0
+
+    def __post_init__(self):
+        # Columns are ints in the table, the renderers work in float seconds
+        for name in ("image_view_duration", "transition_duration", "zoom_in", "zoom_out"):
+            object.__setattr__(self, name, float(getattr(self, name)))
+        if self.clip_view_duration is not None:
+            object.__setattr__(self, "clip_view_duration", float(self.clip_view_duration))
+        width, height = self.target_size
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Invalid target size {self.target_size}")
+        if self.image_view_duration <= 0:
+            raise ValueError("image_view_duration must be positive")
+        if not 0 <= self.transition_duration < self.image_view_duration:
+            raise ValueError("transition_duration must be shorter than image_view_duration")
+        if self.zoom_in < 0 or self.zoom_out < 0:
+            raise ValueError("zoom_in and zoom_out can't be negative")
+        object.__setattr__(self, "target_size", (int(width), int(height)))
+
+    @property
+    def zoom_ratio(self) -> float:
+        """Zoom-in ratio the slideshow applies, 0 when below the visible threshold."""
+        return self.zoom_in if self.zoom_in >= 0.01 else 0.0
+
+    @classmethod
+    def from_rows(cls, parameter: Parameter, target: Optional[TargetSize] = None) -> "RenderConfig":
+        values = {
+            "parameter_id": parameter.id,
+            "file_name": parameter.file_name or "",
+            "image_view_duration": parameter.image_view_duration,
+            "clip_view_duration": parameter.clip_view_duration,
+            "transition_duration": parameter.transition_duration,
+            "zoom_in": parameter.zoom_in,
+            "zoom_out": parameter.zoom_out,
+        }
+        if target is not None:
+            values["platform"] = target.plateform
+            values["target_size"] = (target.width, target.height)
+        # NULL columns keep the dataclass defaults
+        return cls(**{key: value for key, value in values.items() if value is not None})
+
+
+def load_render_config(parameter_id: Optional[int] = None) -> RenderConfig:
+    """Fetch a parameter set and its target size in one query.
+
+    `parameter_id=None` loads the most recent set, or the defaults when the
+    table is empty. An unknown id raises ValueError.
+    """
+    statement = select(Parameter, TargetSize).join(
+        TargetSize, Parameter.target_size == TargetSize.id, isouter=True
+    )
+    if parameter_id is None:
+        statement = statement.order_by(Parameter.id.desc())
+    else:
+        statement = statement.where(Parameter.id == parameter_id)
+    with Session(engine) as session:
+        row = session.exec(statement.limit(1)).first()
+    if row is None:
+        if parameter_id is not None:
+            raise ValueError(f"No render parameters with id {parameter_id}")
+        return RenderConfig()
+    return RenderConfig.from_rows(*row)
+
+
+class RenderConfigCache:
+    """TTL cache of loaded configs keyed by parameter-set id (None is the latest set).
+
+    Configs are immutable, so one instance is shared by every render that
+    asks for the same id. Call `invalidate` after a parameter set changes.
+    """
+
+    def __init__(self, ttl: float = RENDER_CONFIG_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Optional[int], Tuple[float, RenderConfig]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, parameter_id: Optional[int] = None) -> RenderConfig:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(parameter_id)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Query outside the lock; a concurrent miss just loads the same row twice
+        config = load_render_config(parameter_id)
+        with self._lock:
+            self._entries[parameter_id] = (time.monotonic() + self.ttl, config)
+        return config
+
+    def invalidate(self, parameter_id: Optional[int] = None) -> None:
+        """Drop one parameter set (and the cached latest one), or everything when None."""
+        with self._lock:
+            if parameter_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(parameter_id, None)
+                self._entries.pop(None, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+render_config_cache = RenderConfigCache()
+
+
+def get_render_config(parameter_id: Optional[int] = None) -> RenderConfig:
+    return render_config_cache.get(parameter_id)
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+import aiohttp
+
+from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+SEARXNG_URL = os.getenv("SEARXNG_URL", "http://localhost:8888/search")
+SEARCH_CACHE_PATH = Path(os.getenv("SEARCH_CACHE_PATH", BASE_DIR.joinpath("media", "search_cache.sqlite3")))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+SEARCH_PAGE_CONCURRENCY = int(os.getenv("SEARCH_PAGE_CONCURRENCY", "4"))
+
+CacheKey = Tuple[str, str, int, str]
+
+
+class SearchCache:
+    """TTL cache of SearXNG result pages keyed by (query, lang, page, categories)."""
+
+    def __init__(self, path: Union[str, Path] = SEARCH_CACHE_PATH, ttl: float = SEARCH_CACHE_TTL):
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS search_cache (
+                query TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                categories TEXT NOT NULL,
+                results TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (query, lang, page, categories)
+            )""")
+        self._conn.commit()
+
+    def get(self, key: CacheKey) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT results, fetched_at FROM search_cache
+                   WHERE query = ? AND lang = ? AND page = ? AND categories = ?""", key).fetchone()
+        if not row or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: CacheKey, results: List[dict]) -> None:
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO search_cache
+                   (query, lang, page, categories, results, fetched_at) VALUES (?, ?, ?, ?, ?, ?)""",
+                (*key, json.dumps(results), time.time()))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM search_cache WHERE fetched_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+        return cursor.rowcount
+
+
+_default_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> SearchCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SearchCache()
+    return _default_cache
+
+
+def _normalize(result: dict) -> dict:
+    return {
+        'title': result.get('title', ''),
+        'website_url': result.get('url', ''),
+        'img_src': result.get('img_src', ''),
+        'resolution': result.get('resolution', ''),
+    }
+
+
+async def search_page(
+    query: str,
+    language: str = "en-EN",
+    page: int = 1,
+    categories: str = "images",
+    cache: Optional[SearchCache] = None,
+) -> List[dict]:
+    """Fetch one SearXNG result page, served from the cache while it is fresh."""
+    cache = cache or get_search_cache()
+    key = (query, language, page, categories)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    params = {
+        "q": query,
+        "format": "json",
+        "categories": categories,
+        "safe_search": "moderate",
+        "language": language,
+        "pageno": page,
+    }
+    session = await get_session()
+    try:
+        async with session.get(SEARXNG_URL, params=params) as response:
+            response.raise_for_status()
+            payload = await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        logger.error(f"Error searching SearXNG (page {page}): {str(e)}")
+        return []
+
+    results = [_normalize(result) for result in payload.get('results', []) if result.get('img_src')]
+    cache.put(key, results)
+    return results
+
+
+async def iter_search(
+    query: str,
+    language: str = "en-EN",
+    pages: Iterable[int] = (1,),
+    categories: str = "images",
+    max_concurrency: int = SEARCH_PAGE_CONCURRENCY,
+    cache: Optional[SearchCache] = None,
+) -> AsyncIterator[Tuple[int, dict]]:
+    """Yield `(position, result)` across several pages as soon as each page arrives.
+
+    Pages are requested concurrently (at most `max_concurrency` at once) and
+    results are de-duplicated by `img_src`. Positions run across pages so
+    they stay unique for the whole search.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(page: int) -> List[dict]:
+        async with semaphore:
+            return await search_page(query, language, page, categories, cache)
+
+    tasks = [asyncio.create_task(fetch(page)) for page in pages]
+    seen = set()
+    position = 0
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            for result in await next_page:
+                if result['img_src'] in seen:
+                    continue
+                seen.add(result['img_src'])
+                position += 1
+                yield position, result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def search_all(
+    query: str,
+    language: str = "en-EN",
+    pages: Iterable[int] = (1,),
+    categories: str = "images",
+    max_concurrency: int = SEARCH_PAGE_CONCURRENCY,
+) -> Dict[int, dict]:
+    """Collect `iter_search` into the `{position: result}` dict older callers expect."""
+    return {
+        position: result
+        async for position, result in iter_search(query, language, pages, categories, max_concurrency)
+    }
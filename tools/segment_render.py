@@ -0,0 +1,151 @@
+"""
+Render a slideshow as independent segments in a process pool and join them losslessly
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from audio_track import ffmpeg_binary, prepare_audio
+from executor_pool import LazyExecutor
+from frame_pipe import Progress, render_frames
+from slideshow import Slideshow
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 2)))
+
+# Process pool shared by all segment renders, created on first use
+_process_pool = LazyExecutor(RENDER_WORKERS)
+
+
+get_process_pool = _process_pool.get
+shutdown_process_pool = _process_pool.shutdown
+
+
+def segment_ranges(show: Slideshow, workers: int) -> List[Tuple[int, int]]:
+    """Frame ranges cut at slide boundaries, merged into about 2 per worker.
+
+    A couple of segments per worker evens out slides that render slower
+    (zoom) without paying concat and process overhead per slide.
+    """
+    slides = [show.slide_frames(i) for i in range(len(show.images))]
+    target = max(1, min(len(slides), workers * 2))
+    per_segment = -(-len(slides) // target)
+    return [
+        (slides[i][0], slides[min(i + per_segment, len(slides)) - 1][1])
+        for i in range(0, len(slides), per_segment)
+    ]
+
+
+def render_segment(show: Slideshow, first_frame: int, end_frame: int, path: str, threads: Optional[int] = None) -> Tuple[str, int, float]:
+    """Encode frames `[first_frame, end_frame)` to `path`; runs in a worker process."""
+    stats = render_frames(show, path, first_frame=first_frame, end_frame=end_frame, threads=threads)
+    return path, stats["frames"], stats["seconds"]
+
+
+def concat_segments(paths: List[str], output_path: Union[str, Path], duration: float, audio_track: Optional[str] = None) -> None:
+    """Join segments with the concat demuxer, copying the video and `audio_track` (from `prepare_audio`) as is."""
+    list_path = Path(paths[0]).with_name("segments.txt")
+    list_path.write_text("".join(f"file '{Path(p).resolve().as_posix()}'\n" for p in paths))
+    cmd = [ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", str(list_path)]
+    if audio_track:
+        cmd += ["-i", str(audio_track), "-map", "0:v", "-map", "1:a", "-c:a", "copy"]
+    cmd += ["-c:v", "copy", "-t", f"{duration:.3f}", "-movflags", "+faststart", str(output_path)]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
+def render_segmented(
+    show: Slideshow,
+    output_path: Union[str, Path],
+    audio_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    progress: Optional[Progress] = None,
+) -> Dict[str, float]:
+    """Render `show` to `output_path` using up to `workers` processes.
+
+    Segments are cut at slide boundaries, encoded with identical settings
+    and concatenated without re-encoding. x264 threads are split between
+    workers so they don't oversubscribe the cores. With a pool, `progress`
+    is called as each segment finishes; if it raises, segments not yet
+    started are cancelled and the exception propagates.
+    """
+    workers = workers or RENDER_WORKERS
+    if workers == 1:
+        # Nothing to parallelise, pipe the whole timeline into one encoder
+        return {"segments": 1, **render_frames(show, output_path, audio_path, progress=progress)}
+    ranges = segment_ranges(show, workers)
+    threads = max(1, (os.cpu_count() or 1) // min(workers, len(ranges)))
+    started = time.perf_counter()
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=Path(output_path).resolve().parent)
+    try:
+        paths = [os.path.join(work_dir, f"segment_{i:04d}.mp4") for i in range(len(ranges))]
+        if len(ranges) == 1:
+            (first, end), = ranges
+            stats = render_frames(show, paths[0], first_frame=first, end_frame=end, threads=threads, progress=progress)
+            results = [(paths[0], stats["frames"], stats["seconds"])]
+            audio_track = prepare_audio(audio_path, show.duration) if audio_path else None
+        else:
+            pool = get_process_pool()
+            futures = [
+                pool.submit(render_segment, show, first, end, path, threads)
+                for (first, end), path in zip(ranges, paths)
+            ]
+            results, done = [], 0
+            try:
+                # Fit the soundtrack here while the workers render
+                audio_track = prepare_audio(audio_path, show.duration) if audio_path else None
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    done += results[-1][1]
+                    if progress is not None:
+                        progress(done, show.frame_count)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        concat_segments(paths, output_path, show.duration, audio_track)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - started
+    frames = sum(result[1] for result in results)
+    logger.info(f"Rendered {frames} frames in {len(ranges)} segments to {output_path} in {elapsed:.1f}s")
+    return {
+        "segments": len(ranges),
+        "frames": frames,
+        "seconds": round(elapsed, 2),
+        "fps": round(frames / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    import numpy
+    from PIL import Image
+
+    # python segment_render.py [images] [workers]: synthetic slideshow, 1 worker vs `workers`
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    parallel = int(sys.argv[2]) if len(sys.argv) > 2 else RENDER_WORKERS
+    bench_dir = Path(tempfile.mkdtemp(prefix="segment_bench_"))
+    rng = numpy.random.default_rng(0)
+    images = []
+    for i in range(count):
+        path = bench_dir / f"image_{i}.jpg"
+        Image.fromarray(rng.integers(0, 256, (1200, 1600, 3), dtype=numpy.uint8)).save(path)
+        images.append(str(path))
+    show = Slideshow(tuple(images), (720, 1280))
+    results = {
+        f"{n}_workers": render_segmented(show, bench_dir / f"out_{n}.mp4", workers=n)
+        for n in sorted({1, parallel})
+    }
+    shutdown_process_pool()
+    print(json.dumps(results, indent=2))
+    shutil.rmtree(bench_dir, ignore_errors=True)
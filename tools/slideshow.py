@@ -0,0 +1,156 @@
+"""
+Slideshow timeline shared by the whole-video and segmented renderers
+"""
+import os
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Tuple
+
+from image_resize import fitted_clip
+from ken_burns import Motion, ken_burns_clip
+
+Size = Tuple[int, int]
+
+RENDER_FPS = int(os.getenv("RENDER_FPS", "15"))
+PREVIEW_SCALE = float(os.getenv("PREVIEW_SCALE", "0.25"))
+PREVIEW_FPS = int(os.getenv("PREVIEW_FPS", "8"))
+
+
+@dataclass(frozen=True)
+class EncoderSettings:
+    """x264 settings every renderer passes to ffmpeg.
+
+    Segments joined with the concat demuxer must share these exactly,
+    so they live in one place.
+    """
+    fps: int = RENDER_FPS
+    codec: str = "libx264"
+    preset: str = "fast"
+    crf: Optional[int] = None
+    pix_fmt: str = "yuv420p"
+
+    def ffmpeg_params(self) -> List[str]:
+        params = ["-pix_fmt", self.pix_fmt]
+        if self.crf is not None:
+            params += ["-crf", str(self.crf)]
+        return params
+
+
+@dataclass(frozen=True)
+class Slideshow:
+    """Images shown one after another with crossfades, on a fixed canvas.
+
+    Slide i starts at `i * (image_duration - transition_duration)` and fades
+    in over the previous one for `transition_duration`. Frame ranges put
+    each transition on its incoming slide, so slide boundaries are the
+    natural points to cut the video into independent segments.
+    """
+    images: Tuple[str, ...]
+    size: Size
+    image_duration: float = 5.0
+    transition_duration: float = 1.0
+    zoom_ratio: float = 0.0
+    fit_mode: str = "cover"
+    background: Tuple[int, int, int] = (0, 0, 0)
+    overlay: Optional[str] = None
+    overlay_height: int = 400
+    encoder: EncoderSettings = field(default_factory=EncoderSettings)
+
+    def __post_init__(self):
+        if not self.images:
+            raise ValueError("Slideshow needs at least one image")
+        if not 0 <= self.transition_duration < self.image_duration:
+            raise ValueError("transition_duration must be shorter than image_duration")
+        object.__setattr__(self, "images", tuple(str(image) for image in self.images))
+        object.__setattr__(self, "size", tuple(self.size))
+
+    @property
+    def fps(self) -> int:
+        return self.encoder.fps
+
+    @property
+    def step(self) -> float:
+        return self.image_duration - self.transition_duration
+
+    @property
+    def duration(self) -> float:
+        return len(self.images) * self.image_duration - (len(self.images) - 1) * self.transition_duration
+
+    @property
+    def frame_count(self) -> int:
+        return round(self.duration * self.fps)
+
+    def start(self, index: int) -> float:
+        return index * self.step
+
+    def slide_frames(self, index: int) -> Tuple[int, int]:
+        """Frames `[first, end)` owned by slide `index`, its fade-in included."""
+        first = round(self.start(index) * self.fps)
+        if index == len(self.images) - 1:
+            return first, self.frame_count
+        return first, round(self.start(index + 1) * self.fps)
+
+    def preview(self, scale: float = PREVIEW_SCALE, fps: int = PREVIEW_FPS) -> "Slideshow":
+        """Same timeline at `scale` of the size and `fps`, encoded with ultrafast.
+
+        Durations are unchanged, so tuning the preview tunes the full render.
+        """
+        width, height = self.size
+        # Even dimensions for yuv420p
+        size = (max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2))
+        return replace(
+            self,
+            size=size,
+            overlay_height=max(1, round(self.overlay_height * scale)),
+            encoder=replace(self.encoder, fps=min(fps, self.fps), preset="ultrafast"),
+        )
+
+    def keyframes(self) -> List[int]:
+        """One frame per slide, halfway through the part shown without a fade."""
+        frames = []
+        for index in range(len(self.images)):
+            first, end = self.slide_frames(index)
+            if index > 0:
+                first = min(end - 1, first + round(self.transition_duration * self.fps))
+            frames.append(min((first + end) // 2, self.frame_count - 1))
+        return frames
+
+    def slide_clip(self, index: int):
+        """moviepy clip of one slide, placed on the timeline with its fade-in."""
+        from moviepy.video.fx import CrossFadeIn
+
+        image = self.images[index]
+        if self.zoom_ratio >= 0.01:
+            clip = ken_burns_clip(image, self.size, self.image_duration, Motion.zoom_in(self.zoom_ratio, self.image_duration), self.fps)
+        else:
+            clip = fitted_clip(image, self.size, self.image_duration, self.fit_mode, self.background)
+        if index > 0 and self.transition_duration > 0:
+            clip = clip.with_effects([CrossFadeIn(self.transition_duration)])
+        return clip.with_start(self.start(index))
+
+    def overlay_clip(self):
+        from moviepy import ImageClip
+
+        return (
+            ImageClip(self.overlay)
+            .resized(height=self.overlay_height)
+            .with_position(("right", "bottom"))
+            .with_start(0)
+            .with_duration(self.duration)
+        )
+
+    def clip(self, first_frame: int = 0, end_frame: Optional[int] = None):
+        """Composite of only the slides visible in frames `[first_frame, end_frame)`.
+
+        Times stay absolute, so frame n is `clip.get_frame(n / fps)`.
+        """
+        from moviepy import CompositeVideoClip
+
+        end_frame = self.frame_count if end_frame is None else end_frame
+        t0, t1 = first_frame / self.fps, end_frame / self.fps
+        layers = [
+            self.slide_clip(i) for i in range(len(self.images))
+            if self.start(i) < t1 and self.start(i) + self.image_duration > t0
+        ]
+        if self.overlay:
+            layers.append(self.overlay_clip())
+        return CompositeVideoClip(layers, size=self.size, bg_color=self.background).with_duration(self.duration)
@@ -1,7 +1,17 @@
-import asyncio
+import multiprocessing
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from celery.exceptions import Ignore
+
 from worker import celery_app
+from http_client import run_async
 # from image_processor import ImageProcessor  # Your existing class
 from local_searxng_deepseek_copy_chatGPT import ImageProcessor
+from render_config import render_config_cache
 
 language_country_codes = [
     "en-US",   # English (United States)
@@ -40,4 +50,87 @@ language_country_codes = [
 def process_images_task(params: dict, username: str):
     print('process start')
     processor = ImageProcessor(username)
-    asyncio.run(processor.process_images(params, username))
+    run_async(processor.process_images(params, username))
+
+
+# Seconds between progress updates / cancel checks against the result backend
+RENDER_PROGRESS_INTERVAL = 1.0
+VID_EDIT_DIR = str(Path(__file__).resolve().parent / "vid_edit")
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+def _cancel_key(task_id: str) -> str:
+    return f"render-cancel-{task_id}"
+
+
+def request_render_cancel(task_id: str) -> None:
+    """Ask a running render to stop; it notices at its next progress update."""
+    celery_app.backend.set(_cancel_key(task_id), "1")
+
+
+def render_cancel_requested(task_id: str) -> bool:
+    return celery_app.backend.get(_cancel_key(task_id)) is not None
+
+
+def _owner_key(task_id: str) -> str:
+    return f"render-owner-{task_id}"
+
+
+def submit_render(owner_id: int, **kwargs) -> str:
+    """Queue `render_video_task` for user `owner_id` and return its task id.
+
+    The owner is stored before the task is sent, so status and cancel
+    requests can be checked against it from the first moment.
+    """
+    task_id = str(uuid.uuid4())
+    celery_app.backend.set(_owner_key(task_id), str(owner_id))
+    render_video_task.apply_async(kwargs=kwargs, task_id=task_id)
+    return task_id
+
+
+def render_owner(task_id: str) -> Optional[int]:
+    """Id of the user who submitted render `task_id`, None when unknown or expired."""
+    owner = celery_app.backend.get(_owner_key(task_id))
+    return int(owner) if owner is not None else None
+
+
+@celery_app.task(bind=True, acks_late=True)
+def render_video_task(self, image_paths: list, audio_path: str = None, output_filename: str = "",
+                      parameter_id: int = None, workers: int = None, overlay_path: str = None):
+    # vid_edit modules import each other by bare name
+    if VID_EDIT_DIR not in sys.path:
+        sys.path.append(VID_EDIT_DIR)
+    from main_pipeline import process_video_task
+
+    # Parameter sets are written by the API process, whose invalidation can't
+    # reach this cache; reload the set once per render so edits apply right away
+    render_config_cache.invalidate(parameter_id)
+    if multiprocessing.current_process().daemon:
+        # Prefork pool children are daemonic and can't start the segment pool,
+        # run with -P solo (see worker.py) to render segments in parallel
+        workers = 1
+    last_update = 0.0
+
+    def progress(done: int, total: int):
+        nonlocal last_update
+        now = time.monotonic()
+        if done < total and now - last_update < RENDER_PROGRESS_INTERVAL:
+            return
+        last_update = now
+        if render_cancel_requested(self.request.id):
+            raise RenderCancelled(f"Cancelled at frame {done}/{total}")
+        self.update_state(state="PROGRESS", meta={"frames": done, "total": total})
+
+    try:
+        output = process_video_task(image_paths, audio_path, output_filename,
+                                    parameter_id=parameter_id, progress=progress, workers=workers,
+                                    overlay_path=overlay_path)
+    except RenderCancelled as e:
+        self.update_state(state="CANCELLED", meta={"message": str(e)})
+        # Keep the CANCELLED state instead of overwriting it with a result
+        raise Ignore()
+    return {"output": output}
+
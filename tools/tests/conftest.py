@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules in tools/ import each other by bare name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
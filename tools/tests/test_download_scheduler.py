@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import aiohttp
+from aiohttp import web
+
+from download_scheduler import DownloadError, DownloadScheduler, read_body
+
+
+@asynccontextmanager
+async def image_server():
+    """Local server with fast, throttled, broken, slow and chunked routes."""
+    hits: Counter = Counter()
+    in_flight = {"now": 0, "peak": 0}
+
+    async def ok(request):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.05)
+        in_flight["now"] -= 1
+        return web.Response(body=b"x" * 1024, content_type="image/jpeg")
+
+    async def throttled(request):
+        hits[request.path] += 1
+        if hits[request.path] == 1:
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        return web.Response(body=b"ok", content_type="image/jpeg")
+
+    async def broken(request):
+        return web.Response(status=503)
+
+    async def slow(request):
+        await asyncio.sleep(5)
+        return web.Response(body=b"late")
+
+    async def chunked(request):
+        # No Content-Length: the body is streamed in chunks
+        response = web.StreamResponse()
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for _ in range(4):
+            await response.write(b"y" * 500)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/ok/{n}", ok)
+    app.router.add_get("/throttled", throttled)
+    app.router.add_get("/broken", broken)
+    app.router.add_get("/slow", slow)
+    app.router.add_get("/chunked", chunked)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}", in_flight
+    finally:
+        await runner.cleanup()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_per_host_limit_retry_after_and_failures():
+    async def main():
+        async with image_server() as (base, in_flight), aiohttp.ClientSession() as session:
+            scheduler = DownloadScheduler(
+                max_concurrency=8, per_host_limit=3, max_retries=2, backoff_base=0.1, session=session)
+            urls = [f"{base}/ok/{n}" for n in range(30)] + [f"{base}/throttled", f"{base}/broken"]
+            started = time.monotonic()
+            results = await scheduler.map(urls, read_body)
+            return results, time.monotonic() - started, in_flight["peak"], scheduler.metrics
+
+    results, took, peak, metrics = run(main())
+    assert peak <= 3
+    assert results[30] == b"ok" and took >= 1.0
+    assert isinstance(results[31], DownloadError)
+    assert metrics.succeeded == 31 and metrics.failed == 1
+
+
+def test_cancel_reaches_direct_fetch_calls():
+    async def main():
+        async with image_server() as (base, _), aiohttp.ClientSession() as session:
+            scheduler = DownloadScheduler(session=session)
+            calls = [asyncio.ensure_future(scheduler.fetch(f"{base}/slow", read_body)) for _ in range(3)]
+            await asyncio.sleep(0.1)
+            cancelled = scheduler.cancel()
+            results = await asyncio.gather(*calls, return_exceptions=True)
+            return cancelled, results, scheduler.metrics
+
+    cancelled, results, metrics = run(main())
+    assert cancelled == 3
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert metrics.cancelled == 3
+
+
+def test_cancel_counts_each_submitted_download_once():
+    async def main():
+        async with image_server() as (base, _), aiohttp.ClientSession() as session:
+            scheduler = DownloadScheduler(session=session)
+            tasks = [scheduler.submit(f"{base}/slow", read_body) for _ in range(4)]
+            await asyncio.sleep(0.1)
+            cancelled = scheduler.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return cancelled, scheduler.metrics
+
+    cancelled, metrics = run(main())
+    assert cancelled == 4
+    assert metrics.cancelled == 4
+
+
+def test_bytes_received_counts_bodies_without_content_length():
+    async def main():
+        async with image_server() as (base, _), aiohttp.ClientSession() as session:
+            scheduler = DownloadScheduler(session=session)
+            body = await scheduler.fetch(f"{base}/chunked", read_body)
+            await scheduler.fetch(f"{base}/ok/1", read_body)
+            return body, scheduler.metrics.bytes_received
+
+    body, received = run(main())
+    assert len(body) == 2000
+    assert received == 2000 + 1024
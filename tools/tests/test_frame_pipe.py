@@ -0,0 +1,44 @@
+import numpy
+from PIL import Image
+
+from frame_pipe import BLEND_BITS, BLEND_ONE, SlideshowFrames, blend_into
+from slideshow import EncoderSettings, Slideshow
+
+
+def blend(a, b, weight):
+    out = numpy.empty_like(a)
+    acc = numpy.empty(a.shape, dtype=numpy.uint16)
+    tmp = numpy.empty(a.shape, dtype=numpy.uint16)
+    blend_into(out, a, b, weight, acc, tmp)
+    return out
+
+
+def test_blend_matches_float_crossfade_without_overflow():
+    values = numpy.arange(256, dtype=numpy.uint8)
+    a = numpy.repeat(values, 256).reshape(256, 256, 1)
+    b = numpy.tile(values, 256).reshape(256, 256, 1)
+    for weight in range(0, BLEND_ONE + 1, 16):
+        expected = (a.astype(numpy.float64) * (BLEND_ONE - weight) + b.astype(numpy.float64) * weight) / 2 ** BLEND_BITS
+        assert numpy.abs(blend(a, b, weight) - expected).max() <= 0.5
+
+    assert numpy.array_equal(blend(a, b, 0), a)
+    assert numpy.array_equal(blend(a, b, BLEND_ONE), b)
+    full = numpy.full((2, 2, 3), 255, dtype=numpy.uint8)
+    assert numpy.array_equal(blend(full, full, BLEND_ONE // 2), full)
+
+
+def test_slideshow_crossfade_ramps_between_slides(tmp_path):
+    paths = []
+    for i, colour in enumerate([(0, 0, 0), (200, 100, 50)]):
+        paths.append(tmp_path / f"{i}.png")
+        Image.new("RGB", (16, 16), colour).save(paths[-1])
+    show = Slideshow(tuple(paths), (8, 8), image_duration=1.0, transition_duration=0.5,
+                     encoder=EncoderSettings(fps=10))
+    frames = SlideshowFrames(show)
+
+    assert list(frames.ramp(1)) == [0, 51, 102, 154, 205, 256]
+    fade = [int(frames.frame(n)[4, 4, 0]) for n in range(4, 12)]
+    assert fade == [0, 0, 40, 80, 120, 160, 200, 200]
+    # A still frame after the fade is reused instead of recomputed
+    frames.frame(11)
+    assert frames.reused >= 1
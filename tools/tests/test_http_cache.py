@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+
+import aiohttp
+from aiohttp import web
+
+from blob_store import BlobStore
+from download_scheduler import DownloadScheduler
+from http_cache import CachedDownloader, HttpCache
+
+BODY = bytes(range(256)) * 16
+ETAG = '"v1"'
+
+
+@asynccontextmanager
+async def flaky_server():
+    """Server whose first full response breaks off halfway; Range requests are honoured."""
+    requests = []
+
+    async def image(request):
+        requests.append(dict(request.headers))
+        start = 0
+        if request.headers.get("If-Range") == ETAG and request.headers.get("Range"):
+            start = int(request.headers["Range"][len("bytes="):].rstrip("-"))
+        response = web.StreamResponse(status=206 if start else 200, headers={"ETag": ETAG})
+        response.content_type = "image/jpeg"
+        response.content_length = len(BODY) - start
+        if start:
+            response.headers["Content-Range"] = f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"
+        await response.prepare(request)
+        if len(requests) == 1:
+            await response.write(BODY[:1500])
+            await asyncio.sleep(0.05)
+            request.transport.close()
+            return response
+        await response.write(BODY[start:])
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/image.jpg", image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/image.jpg", requests
+    finally:
+        await runner.cleanup()
+
+
+def test_retry_resumes_and_same_url_downloads_share_one_transfer(tmp_path):
+    async def main():
+        async with flaky_server() as (url, requests), aiohttp.ClientSession() as session:
+            scheduler = DownloadScheduler(max_retries=2, backoff_base=0.01, session=session)
+            downloader = CachedDownloader(
+                scheduler, BlobStore(tmp_path / "blobs"), HttpCache(tmp_path / "http.sqlite3"))
+            results = await asyncio.gather(downloader.download(url), downloader.download(url))
+            return results, requests
+
+    (first, second), requests = asyncio.run(main())
+    assert first.status == "resumed" and first.bytes_transferred == len(BODY) - 1500
+    assert first.path.read_bytes() == BODY
+    assert first.content_hash == hashlib.sha256(BODY).hexdigest()
+    # The second caller waited for the first and was served from the cache
+    assert second.status == "fresh" and second.path == first.path
+    assert len(requests) == 2
+    assert requests[1]["Range"] == "bytes=1500-" and requests[1]["If-Range"] == ETAG
+    assert all(request["Accept-Encoding"] == "identity" for request in requests)
@@ -0,0 +1,71 @@
+import io
+import struct
+
+from PIL import Image, PngImagePlugin
+
+from image_metadata import strip_metadata_bytes, strip_metadata_file
+
+
+def image():
+    return Image.linear_gradient("L").convert("RGB").resize((32, 24))
+
+
+def exif():
+    data = Image.Exif()
+    data[0x010F] = "Camera maker"
+    return data
+
+
+def pixels(data):
+    with Image.open(io.BytesIO(data)) as img:
+        return img.convert("RGB").tobytes()
+
+
+def test_jpeg_drops_app_segments_and_comments_keeping_the_scan():
+    buf = io.BytesIO()
+    image().save(buf, "JPEG", exif=exif(), comment=b"secret note")
+    original = buf.getvalue()
+
+    stripped = strip_metadata_bytes(original)
+    assert b"Exif" not in stripped and b"secret note" not in stripped
+    assert b"JFIF" in stripped
+    # Entropy-coded data is copied verbatim, nothing is re-encoded
+    assert stripped.endswith(original[original.index(b"\xff\xda"):])
+    assert pixels(stripped) == pixels(original)
+
+
+def test_png_drops_text_and_exif_chunks():
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Author", "someone")
+    buf = io.BytesIO()
+    image().save(buf, "PNG", pnginfo=info, exif=exif())
+    original = buf.getvalue()
+
+    stripped = strip_metadata_bytes(original)
+    assert b"tEXt" not in stripped and b"eXIf" not in stripped
+    assert stripped.endswith(b"IEND\xaeB`\x82")
+    assert pixels(stripped) == pixels(original)
+
+
+def test_webp_drops_exif_and_fixes_flags_and_size():
+    buf = io.BytesIO()
+    image().save(buf, "WEBP", lossless=True, exif=exif())
+    original = buf.getvalue()
+    assert b"EXIF" in original
+
+    stripped = strip_metadata_bytes(original)
+    assert b"EXIF" not in stripped
+    assert struct.unpack("<I", stripped[4:8])[0] == len(stripped) - 8
+    vp8x = stripped.index(b"VP8X")
+    assert stripped[vp8x + 8] & 0x08 == 0
+    assert pixels(stripped) == pixels(original)
+
+
+def test_strip_file_in_place(tmp_path):
+    path = tmp_path / "photo.jpg"
+    image().save(path, "JPEG", exif=exif())
+
+    assert strip_metadata_file(str(path)) == str(path)
+    with Image.open(path) as img:
+        assert not img.getexif()
+    assert [p.name for p in tmp_path.iterdir()] == ["photo.jpg"]
@@ -0,0 +1,59 @@
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from image_probe import HeaderProbe, ImageHeader, ImageRejected, ImageRequirements, parse_image_header
+
+XMP = b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta/>"
+
+
+def encode(image_format, size=(40, 20), **kwargs):
+    buf = io.BytesIO()
+    Image.new("RGB", size, "red").save(buf, image_format, **kwargs)
+    return buf.getvalue()
+
+
+def rotated_jpeg():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotate 90 CW on display
+    return encode("JPEG", exif=exif)
+
+
+def with_xmp_after_exif(data):
+    # Insert an XMP APP1 just before the quantisation tables, after PIL's Exif APP1
+    pos = data.index(b"\xff\xdb")
+    segment = b"\xff\xe1" + struct.pack(">H", len(XMP) + 2) + XMP
+    return data[:pos] + segment + data[pos:]
+
+
+def test_jpeg_size_and_exif_rotation():
+    assert parse_image_header(encode("JPEG")) == ImageHeader("JPEG", 40, 20)
+    header = parse_image_header(rotated_jpeg())
+    assert (header.width, header.height, header.orientation) == (20, 40, "portrait")
+
+
+def test_xmp_segment_after_exif_keeps_the_rotation():
+    header = parse_image_header(with_xmp_after_exif(rotated_jpeg()))
+    assert (header.width, header.height) == (20, 40)
+
+
+@pytest.mark.parametrize("kwargs", [{"lossless": False}, {"lossless": True}, {"exif": b"Exif\x00\x00II*\x00"}])
+def test_png_and_webp_sizes(kwargs):
+    assert parse_image_header(encode("PNG")) == ImageHeader("PNG", 40, 20)
+    assert parse_image_header(encode("WEBP", **kwargs)) == ImageHeader("WEBP", 40, 20)
+
+
+def test_short_data_needs_more_bytes_and_garbage_is_rejected():
+    assert parse_image_header(encode("PNG")[:20]) is None
+    with pytest.raises(ImageRejected):
+        parse_image_header(b"\x89PNG\r\n\x1a\n" + b"\x00" * 4 + b"JUNK" + b"\x00" * 8)
+
+
+def test_probe_rejects_on_the_first_chunks():
+    probe = HeaderProbe(ImageRequirements(orientation="portrait"))
+    data = encode("PNG")
+    assert probe.feed(data[:10]) is False
+    with pytest.raises(ImageRejected):
+        probe.feed(data[10:64])
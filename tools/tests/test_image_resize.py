@@ -0,0 +1,73 @@
+import io
+
+import numpy
+import pytest
+from PIL import Image
+
+from image_resize import cover_box, cover_scale, fit_image, render_variants
+
+RED, GREEN, BLUE = (255, 0, 0), (0, 255, 0), (0, 0, 255)
+
+
+def stripes(size=(300, 100)):
+    """Wide image: red, green and blue vertical thirds."""
+    image = Image.new("RGB", size, GREEN)
+    third = size[0] // 3
+    image.paste(RED, (0, 0, third, size[1]))
+    image.paste(BLUE, (size[0] - third, 0, size[0], size[1]))
+    return image
+
+
+def jpeg(image, **kwargs):
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=95, **kwargs)
+    return buf.getvalue()
+
+
+def close_to(pixel, colour, tolerance=40):
+    return all(abs(int(a) - b) <= tolerance for a, b in zip(pixel, colour))
+
+
+def test_cover_scale_and_box():
+    assert cover_scale((300, 100), (100, 100)) == 1.0
+    assert cover_scale((300, 100), (600, 100)) == 2.0
+    assert cover_box((300, 100), (100, 100)) == (100.0, 0.0, 200.0, 100.0)
+    assert cover_box((100, 300), (200, 100)) == (0.0, 125.0, 100.0, 175.0)
+    assert cover_box((300, 100), (100, 100), centering=(0.0, 0.5)) == (0.0, 0.0, 100.0, 100.0)
+
+
+def test_render_variants_crops_to_each_size():
+    variants = render_variants(jpeg(stripes()), {"square": (60, 60), "wide": (150, 50)})
+    square = Image.open(io.BytesIO(variants["square"])).convert("RGB")
+    wide = Image.open(io.BytesIO(variants["wide"])).convert("RGB")
+
+    assert square.size == (60, 60) and wide.size == (150, 50)
+    # The square keeps only the middle third, the wide one all three
+    assert all(close_to(square.getpixel((x, 30)), GREEN) for x in (2, 30, 57))
+    assert close_to(wide.getpixel((5, 25)), RED) and close_to(wide.getpixel((145, 25)), BLUE)
+
+
+def test_render_variants_follows_exif_rotation():
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    variants = render_variants(jpeg(stripes(), exif=exif), {"tall": (40, 120)})
+    tall = Image.open(io.BytesIO(variants["tall"])).convert("RGB")
+    # Displayed upright the stripes run horizontally and fill the portrait frame
+    assert tall.size == (40, 120)
+    assert close_to(tall.getpixel((20, 5)), RED) and close_to(tall.getpixel((20, 115)), BLUE)
+
+
+def test_fit_image_cover_zoom_and_contain():
+    pixels = numpy.asarray(stripes())
+    cover = fit_image(pixels, (90, 30))
+    assert cover.shape == (30, 90, 3)
+    assert tuple(cover[15, 0]) == RED and tuple(cover[15, 89]) == BLUE
+
+    zoomed = fit_image(pixels, (90, 30), zoom=3.0)
+    assert close_to(zoomed[15, 0], GREEN) and close_to(zoomed[15, 89], GREEN)
+
+    contain = fit_image(stripes(), (60, 60), mode="contain", background=(9, 9, 9))
+    assert tuple(contain[0, 30]) == (9, 9, 9) and tuple(contain[30, 30]) == GREEN
+
+    with pytest.raises(ValueError):
+        fit_image(pixels, (10, 10), mode="stretch")
@@ -0,0 +1,43 @@
+import numpy
+from numpy.testing import assert_allclose
+
+import ken_burns
+from ken_burns import KenBurns, Motion, _resample_numpy, crop_rects
+
+
+def test_zoom_in_shrinks_a_centred_crop():
+    rects = crop_rects((400, 300), (200, 100), Motion.zoom_in(0.1, 2.0), duration=2.0, fps=10)
+    assert rects.shape == (21, 4)
+    # Largest 2:1 crop of 400x300 is 400x200, 1.2x tighter by the end
+    assert_allclose(rects[0], [0, 50, 400, 200])
+    assert_allclose(rects[-1], [400 * (1 - 1 / 1.2) / 2, 150 - 200 / 1.2 / 2, 400 / 1.2, 200 / 1.2])
+    centres = rects[:, :2] + rects[:, 2:] / 2
+    assert_allclose(centres, [[200, 150]] * len(rects))
+    assert numpy.all(numpy.diff(rects[:, 2]) < 0)
+
+
+def test_pan_moves_across_the_room_with_easing():
+    motion = Motion.pan((0.0, 0.5), (1.0, 0.5), zoom=2.0)
+    rects = crop_rects((400, 200), (100, 100), motion, duration=1.0, fps=4)
+    # 200x200 crop at zoom 1, 100x100 at zoom 2, sliding from the left edge to the right
+    assert_allclose(rects[:, 2:], [[100, 100]] * 5)
+    assert_allclose(rects[:, 0], [0, 300 * 0.15625, 150, 300 * 0.84375, 300])
+    assert_allclose(rects[:, 1], [50] * 5)
+
+
+def test_frames_follow_the_rects_with_and_without_cv2(monkeypatch):
+    gradient = numpy.tile(numpy.arange(256, dtype=numpy.uint8)[None, :, None], (64, 1, 3))
+    engine = KenBurns(gradient, (32, 16), Motion.zoom_in(0.5, 2.0), duration=2.0, fps=5)
+    assert_allclose(engine.rect_at(0.3), (engine.rects[1] + engine.rects[2]) / 2)
+    assert_allclose(engine.rect_at(99), engine.rects[-1])
+
+    first = engine.frame(0.0)
+    assert first.shape == (16, 32, 3) and first.dtype == numpy.uint8
+    # Gradient runs left to right, the zoomed crop spans a narrower range of it
+    last = engine.frame(2.0)
+    assert int(last[8, -1, 0]) - int(last[8, 0, 0]) < int(first[8, -1, 0]) - int(first[8, 0, 0])
+
+    monkeypatch.setattr(ken_burns, "cv2", None)
+    fallback = engine.frame(2.0)
+    assert numpy.abs(fallback.astype(int) - last.astype(int)).max() <= 2
+    assert_allclose(_resample_numpy(gradient, (0, 0, 256, 64), (256, 64)), gradient)
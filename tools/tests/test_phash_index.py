@@ -0,0 +1,51 @@
+import random
+
+from PIL import Image
+
+from phash_index import BKTree, PHashIndex, hamming_distance, max_distance_for
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_bk_tree_search_matches_a_linear_scan():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    tree = BKTree()
+    for value in values + values[:10]:
+        tree.add(value)
+    assert len(tree) == len(set(values))
+
+    query = flip(values[0], 1, 9, 40)
+    for radius in (0, 3, 20, 30):
+        expected = sorted((v, hamming_distance(query, v)) for v in set(values)
+                          if hamming_distance(query, v) <= radius)
+        assert sorted(tree.search(query, radius)) == expected
+
+
+def test_add_if_new_uses_an_inclusive_radius(tmp_path):
+    index = PHashIndex(tmp_path / "phash.sqlite3")
+    base = random.Random(1).getrandbits(64)
+    assert index.add_if_new(base, max_distance=3)
+
+    assert not index.add_if_new(flip(base, 0, 1, 2), max_distance=3)  # distance 3
+    assert index.add_if_new(flip(base, 0, 1, 2, 3), max_distance=3)  # distance 4
+    assert index.find_similar(base, 0) == [(base, 0)]
+    assert max_distance_for(0.95) == 3
+
+
+def test_add_if_new_sees_rows_from_another_process(tmp_path):
+    path = tmp_path / "phash.sqlite3"
+    first, second = PHashIndex(path), PHashIndex(path)
+    image = Image.effect_mandelbrot((256, 192), (-2.2, -1.2, 1.0, 1.2), 100)
+    rescaled = image.resize((128, 96)).resize(image.size)
+    mirrored = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+
+    assert first.add_if_new(first.hash(image), max_distance=4, url="a")
+    # The second index only learns about the row through its refresh
+    assert not second.add_if_new(second.hash(rescaled), max_distance=4, url="b")
+    assert second.add_if_new(second.hash(mirrored), max_distance=4, url="c")
+    assert len(second) == 2
@@ -1,16 +1,40 @@
 from base import MediaItem
 from moviepy import AudioFileClip
-from typing import List, Any
+from typing import List, Any, Optional
+from pathlib import Path
+from audio_track import prepare_audio, probe_duration
 
 
 class AudioMedia(MediaItem):
 
+    def __init__(self, file_path: Path):
+        super().__init__(file_path)
+        self._clip: Optional[AudioFileClip] = None
+
     def _load_sync(self):
-        print("Step 3: Loading audio from", self.file_path)
-        return AudioFileClip(str(self.file_path))
+        # Opened once; effects return new clips, so the reader can be shared
+        if self._clip is None:
+            print("Step 3: Loading audio from", self.file_path)
+            self._clip = AudioFileClip(str(self.file_path))
+        return self._clip
+
+    @property
+    def duration(self) -> float:
+        """Length in seconds, probed without decoding the audio."""
+        return probe_duration(self.file_path)
+
+    def track(self, duration: float) -> Path:
+        """AAC file of this audio trimmed/looped and faded to `duration`, encoded once per length."""
+        return prepare_audio(self.file_path, duration)
 
     def apply_effects(self, effects: List[Any]):
         audio = self._load_sync()
         for effect in effects:
             audio = effect.apply(audio)
         return audio
+
+    def close(self) -> None:
+        """Release the shared reader (and its ffmpeg process) if it was opened."""
+        if self._clip is not None:
+            self._clip.close()
+            self._clip = None
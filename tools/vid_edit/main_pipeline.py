@@ -2,13 +2,25 @@ from typing import Optional, List, Any
 from video_composer import VideoComposer
 from media_file import ImageMedia
 from audio import AudioMedia
+from frame_pipe import Progress
 from pathlib import Path
 import random
 import string
-from tools.utils import FileDirectory
 
 
-def process_video_task(image_paths: List[str], audio_path: Optional[str] = None, output_filename: str = ""):
+PREVIEW_EXTENSIONS = {"video": "mp4", "sheet": "jpg", "gif": "gif"}
+
+
+def process_video_task(image_paths: List[str], audio_path: Optional[str] = None, output_filename: str = "",
+                       preview: Optional[str] = None, parameter_id: Optional[int] = None,
+                       progress: Optional[Progress] = None, workers: Optional[int] = None,
+                       overlay_path: Optional[str] = None):
+    """Render the video, or with `preview` ("video", "sheet" or "gif") a quick low-resolution draft.
+
+    `parameter_id` selects the stored render parameter set, the latest one when None.
+    `progress(frames_done, frames_total)` is forwarded to the renderer.
+    `overlay_path` is an image (e.g. a face) shown in a corner of every frame.
+    """
     print("Step 1: Starting video processing pipeline")
 
     # Create media items for images and audio.
@@ -16,15 +28,25 @@ def process_video_task(image_paths: List[str], audio_path: Optional[str] = None,
     audio_item = AudioMedia(Path(audio_path)) if audio_path else None
 
     # Initialize the video composer with media items.
-    composer = VideoComposer(image_items, audio_item)
+    composer = VideoComposer(image_items, audio_item, parameter_id=parameter_id, overlay=overlay_path)
     if not output_filename:
         random_name = ''.join(random.choices(string.ascii_lowercase, k=3))
-        output_filename = f"output_{random_name}.mp4"
+        extension = PREVIEW_EXTENSIONS.get(preview, "mp4")
+        output_filename = f"{'preview' if preview else 'output'}_{random_name}.{extension}"
 
-    # Compose and export the final video.
-    composer.export_video(output_filename)
-    print("Step 13: Video processing completed, output file:", output_filename)
-    return output_filename
+    try:
+        if preview:
+            composer.preview(output_filename, preview)
+            print("Step 13: Preview completed, output file:", output_filename)
+            return output_filename
+
+        # Compose and export the final video.
+        composer.export_video(output_filename, workers, progress)
+        print("Step 13: Video processing completed, output file:", output_filename)
+        return output_filename
+    finally:
+        if audio_item:
+            audio_item.close()
 
 # ----------------------- #
 # Standalone Testing (if not using Celery)
@@ -32,6 +54,8 @@ def process_video_task(image_paths: List[str], audio_path: Optional[str] = None,
 
 
 if __name__ == "__main__":
+    from tools.utils import FileDirectory
+
     BASE_DIR = Path(__file__).resolve().parent.parent
     file_dir = FileDirectory()
     images = file_dir.get_image_files(str(BASE_DIR.joinpath('media', 'faces')), load_clips=False)
@@ -1,21 +1,3 @@
-from moviepy import VideoFileClip, VideoClip
-
-# class VideoComposer:
-#     def __init__(self, media_items: list):
-#         self.media_items = media_items
-
-#     async def load_all(self):
-#         # Load media concurrently using asyncio.gather
-#         tasks = [item.load() for item in self.media_items]
-#         return await asyncio.gather(*tasks)
-
-#     def compose(self):
-#         # Example of composing final video/audio with applied effects.
-#         # For heavy CPU tasks, consider using ProcessPoolExecutor.
-#         with ProcessPoolExecutor() as executor:
-#             # Submit tasks to process media concurrently
-#             futures = [executor.submit(item.apply_effects, []) for item in self.media_items]
-#             results = [future.result() for future in futures]
-#         # Merge results using a library such as moviepy.
-#         print("Composing final video with results")
-#         return results
\ No newline at end of file
+# Parallel rendering lives in tools/segment_render.py: VideoComposer.export_video
+# splits the timeline at image boundaries, renders the segments in a process
+# pool and joins them with ffmpeg's concat demuxer.
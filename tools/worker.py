@@ -1,4 +1,7 @@
 from celery import Celery
+from kombu import Queue
+from celery.signals import worker_process_init, worker_process_shutdown
+import http_client
 
 celery_app = Celery(
     "tasks",
@@ -11,5 +14,18 @@ celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
     result_expires=3600,
-    broker_connection_retry_on_startup=True
+    broker_connection_retry_on_startup=True,
+    # Renders run minutes on every core, keep them off the ingestion queue:
+    #   celery -A worker worker -Q celery -c 8            (image ingestion)
+    #   celery -A worker worker -Q video -P solo --prefetch-multiplier 1   (video rendering)
+    # The video worker must be solo (or threads): prefork children are daemonic
+    # processes, which can't start the segment render pool, so there a render
+    # falls back to a single process.
+    task_queues=[Queue("celery"), Queue("video")],
+    task_routes={"tasks.render_video_task": {"queue": "video"}},
+    task_track_started=True,
 )
+
+# Keep one event loop and one pooled HTTP session per worker process
+worker_process_init.connect(http_client.init_worker_loop, weak=False)
+worker_process_shutdown.connect(http_client.shutdown_worker_loop, weak=False)